@@ -0,0 +1,36 @@
+"""group metadata and rotation columns
+
+Revision ID: 4d8a1f3b7e52
+Revises: e2b7d4c91f06
+Create Date: 2026-10-19 15:24:10.318904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8a1f3b7e52'
+down_revision: Union[str, None] = 'e2b7d4c91f06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('groups', sa.Column('rotation_pass', sa.Float(), nullable=True))
+    op.add_column('group_health', sa.Column('successes_total', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('group_health', sa.Column('last_delivery_at', sa.DateTime(), nullable=True))
+    op.add_column('group_health', sa.Column('participants_count', sa.Integer(), nullable=True))
+    op.add_column('group_health', sa.Column('slowmode_seconds', sa.Integer(), nullable=True))
+    op.add_column('group_health', sa.Column('metadata_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('group_health', 'metadata_updated_at')
+    op.drop_column('group_health', 'slowmode_seconds')
+    op.drop_column('group_health', 'participants_count')
+    op.drop_column('group_health', 'last_delivery_at')
+    op.drop_column('group_health', 'successes_total')
+    op.drop_column('groups', 'rotation_pass')
@@ -0,0 +1,37 @@
+"""new table: account_usage
+
+Revision ID: 7c1e2f9a4b30
+Revises: 445360cd5212
+Create Date: 2026-10-19 10:02:11.412093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e2f9a4b30'
+down_revision: Union[str, None] = '445360cd5212'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'account_usage',
+        sa.Column('guid', sa.Uuid(), nullable=False),
+        sa.Column('tg_account_guid', sa.Uuid(), nullable=False),
+        sa.Column('channel_guid', sa.Uuid(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('guid')
+    )
+    op.create_index('ix_account_usage_tg_account_guid', 'account_usage', ['tg_account_guid'])
+    op.create_index('ix_account_usage_created_at', 'account_usage', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_account_usage_created_at', table_name='account_usage')
+    op.drop_index('ix_account_usage_tg_account_guid', table_name='account_usage')
+    op.drop_table('account_usage')
@@ -0,0 +1,37 @@
+"""new table: group_memberships
+
+Revision ID: 9f3c6a2d8b14
+Revises: 4d8a1f3b7e52
+Create Date: 2026-10-19 16:40:37.552019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f3c6a2d8b14'
+down_revision: Union[str, None] = '4d8a1f3b7e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'group_memberships',
+        sa.Column('guid', sa.Uuid(), nullable=False),
+        sa.Column('phone_number', sa.BigInteger(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('joined_at', sa.DateTime(), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('guid'),
+        sa.UniqueConstraint('phone_number', 'url', name='uq_group_memberships_phone_url')
+    )
+    op.create_index('ix_group_memberships_phone_number', 'group_memberships', ['phone_number'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_group_memberships_phone_number', table_name='group_memberships')
+    op.drop_table('group_memberships')
@@ -0,0 +1,34 @@
+"""new table: leases
+
+Revision ID: a3d9b6e1c2f4
+Revises: 7c1e2f9a4b30
+Create Date: 2026-10-19 11:15:42.907311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d9b6e1c2f4'
+down_revision: Union[str, None] = '7c1e2f9a4b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'leases',
+        sa.Column('guid', sa.Uuid(), nullable=False),
+        sa.Column('resource_key', sa.String(), nullable=False, unique=True),
+        sa.Column('owner', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('guid')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('leases')
@@ -0,0 +1,38 @@
+"""unique index on groups (channel_guid, url)
+
+Revision ID: b8e4c1d6f2a7
+Revises: 9f3c6a2d8b14
+Create Date: 2026-10-19 18:05:12.904311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4c1d6f2a7'
+down_revision: Union[str, None] = '9f3c6a2d8b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Повторно добавленные группы: оставляем одну запись на (channel_guid, url)
+    op.execute(sa.text(
+        """
+        DELETE FROM groups WHERE guid IN (
+            SELECT guid FROM (
+                SELECT guid, ROW_NUMBER() OVER (PARTITION BY channel_guid, url ORDER BY guid) AS rn
+                FROM groups
+            ) ranked
+            WHERE rn > 1
+        )
+        """
+    ))
+    op.create_index('uq_groups_channel_url', 'groups', ['channel_guid', 'url'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_groups_channel_url', table_name='groups')
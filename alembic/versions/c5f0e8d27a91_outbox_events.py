@@ -0,0 +1,42 @@
+"""new table: outbox_events
+
+Revision ID: c5f0e8d27a91
+Revises: a3d9b6e1c2f4
+Create Date: 2026-10-19 12:31:07.118245
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f0e8d27a91'
+down_revision: Union[str, None] = 'a3d9b6e1c2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox_events',
+        sa.Column('guid', sa.Uuid(), nullable=False),
+        sa.Column('topic', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=True),
+        sa.Column('payload', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('claimed_by', sa.String(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('guid')
+    )
+    op.create_index('ix_outbox_events_topic', 'outbox_events', ['topic'])
+    op.create_index('ix_outbox_events_created_at', 'outbox_events', ['created_at'])
+    op.create_index('ix_outbox_events_processed_at', 'outbox_events', ['processed_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_events_processed_at', table_name='outbox_events')
+    op.drop_index('ix_outbox_events_created_at', table_name='outbox_events')
+    op.drop_index('ix_outbox_events_topic', table_name='outbox_events')
+    op.drop_table('outbox_events')
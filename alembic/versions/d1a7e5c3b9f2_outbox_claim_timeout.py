@@ -0,0 +1,28 @@
+"""outbox claim visibility timeout
+
+Revision ID: d1a7e5c3b9f2
+Revises: b8e4c1d6f2a7
+Create Date: 2026-10-19 19:12:40.227105
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1a7e5c3b9f2'
+down_revision: Union[str, None] = 'b8e4c1d6f2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('outbox_events', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+    op.add_column('outbox_events', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('outbox_events', 'attempts')
+    op.drop_column('outbox_events', 'claimed_at')
@@ -0,0 +1,40 @@
+"""new table: group_health
+
+Revision ID: e2b7d4c91f06
+Revises: c5f0e8d27a91
+Create Date: 2026-10-19 14:02:51.604127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7d4c91f06'
+down_revision: Union[str, None] = 'c5f0e8d27a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'group_health',
+        sa.Column('guid', sa.Uuid(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False, unique=True),
+        sa.Column('failure_score', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('failures_total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_failure_kind', sa.String(), nullable=True),
+        sa.Column('last_failure_at', sa.DateTime(), nullable=True),
+        sa.Column('quarantine_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('quarantined_until', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('guid')
+    )
+    op.create_index('ix_group_health_quarantined_until', 'group_health', ['quarantined_until'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_group_health_quarantined_until', table_name='group_health')
+    op.drop_table('group_health')
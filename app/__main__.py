@@ -1,8 +1,8 @@
-import asyncio
 import logging
 
 from aiogram import Dispatcher
 
+from core.service import run_service
 from core.settings import bot
 from app.handlers import setup_routes
 
@@ -21,4 +21,4 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run_service(main, "bot")
\ No newline at end of file
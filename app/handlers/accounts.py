@@ -6,28 +6,19 @@ from aiogram.types import CallbackQuery, Message
 from app import utils
 from app.keyboards import accounts as accounts_keyboard, general as general_keyboard
 from app.states import Account as AccountStates
-from core.models import tg_account as tg_account_db, channel as channel_db
-
-# Импортируем глобальный процессор каналов
-from auto_reposting.channel_processor import channel_processor
+from core.models import tg_account as tg_account_db, channel as channel_db, outbox as outbox_db
+from auto_reposting import bus
 
 router = Router()
 
 
 async def update_channel_workers_if_needed(channel_guid: str = None):
-    """Обновляет воркеры каналов при изменении аккаунтов"""
+    """Сообщает сервису доставки, что аккаунты канала (или всех каналов) изменились"""
     try:
-        if channel_guid:
-            # Проверяем конкретный канал
-            await channel_processor.ensure_worker_for_channel(channel_guid)
-            await channel_processor.remove_worker_if_no_accounts(channel_guid)
-        else:
-            # Проверяем все каналы (при массовых операциях)
-            channels = await channel_db.get_channels()
-            for channel in channels:
-                guid = str(channel.guid)
-                await channel_processor.ensure_worker_for_channel(guid)
-                await channel_processor.remove_worker_if_no_accounts(guid)
+        await outbox_db.publish_event(
+            topic=bus.CHANNEL_ACCOUNTS_CHANGED,
+            payload={"channel_guid": str(channel_guid) if channel_guid else None}
+        )
     except Exception as e:
         print(f"Ошибка при обновлении воркеров: {e}")
 
@@ -141,16 +132,19 @@ async def add_accounts(callback: CallbackQuery, state: FSMContext) -> None:
     await state.set_state(AccountStates.add_without_channel)
 
     await callback.message.edit_text(
-        text="*️⃣ Пришлите zip-файлы для добавления аккаунтов в базу данных, как только закончите пришлите команду /stop :",
+        text="*️⃣ Пришлите zip-архивы с tdata или .session, файлы .session или .txt со StringSession (по одной в строке) для добавления аккаунтов в базу данных, как только закончите пришлите команду /stop :",
         reply_markup=accounts_keyboard.back_to_accounts()
     )
 
 
 @router.message(F.document, AccountStates.add_without_channel)
 async def add_accounts_state(message: Message, state: FSMContext) -> None:
+    progress_message = await message.answer("⏳ Принял архив, начинаю импорт...")
     result = await utils.process_telegram_data(
         document_file_id=message.document.file_id,
         unique_document_file_id=message.document.file_unique_id,
+        progress_message=progress_message,
+        file_name=message.document.file_name,
         channel_guid=None
     )
     if result is not None:
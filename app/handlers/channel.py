@@ -1,4 +1,5 @@
 import asyncio
+import html
 import random
 
 from aiogram import Router, F
@@ -9,32 +10,21 @@ from aiogram.types import CallbackQuery, Message
 from app import utils
 from app.keyboards import channel as channel_keyboard, general as general_keyboard
 from app.states import Channel as ChannelStates, Group as GroupStates, Account as AccountStates
-from auto_reposting import telegram_utils
+from auto_reposting import telegram_utils, bus
 
-from core.models import channel as channel_db, group as group_db, tg_account as tg_account_db
-from core.schemas import group as group_schemas
+from core.models import channel as channel_db, group as group_db, tg_account as tg_account_db, outbox as outbox_db
 from core.schemas import channel as channel_schemas
 
-# Импортируем глобальный процессор каналов
-from auto_reposting.channel_processor import channel_processor
-
 router = Router()
 
 
 async def update_channel_workers_if_needed(channel_guid: str = None):
-    """Обновляет воркеры каналов при изменении аккаунтов"""
+    """Сообщает сервису доставки, что аккаунты канала (или всех каналов) изменились"""
     try:
-        if channel_guid:
-            # Проверяем конкретный канал
-            await channel_processor.ensure_worker_for_channel(channel_guid)
-            await channel_processor.remove_worker_if_no_accounts(channel_guid)
-        else:
-            # Проверяем все каналы (при массовых операциях)
-            channels = await channel_db.get_channels()
-            for channel in channels:
-                guid = str(channel.guid)
-                await channel_processor.ensure_worker_for_channel(guid)
-                await channel_processor.remove_worker_if_no_accounts(guid)
+        await outbox_db.publish_event(
+            topic=bus.CHANNEL_ACCOUNTS_CHANGED,
+            payload={"channel_guid": str(channel_guid) if channel_guid else None}
+        )
     except Exception as e:
         print(f"Ошибка при обновлении воркеров: {e}")
 
@@ -155,25 +145,18 @@ async def add_groups_state(message: Message, state: FSMContext) -> None:
     channel_guid = state_data["channel_guid"]
     await state.clear()
 
-    for i in message.text.split("\n"):
-        i = i.strip()
-        links = [j.strip() for j in i.split(" ")]
-        if not links:
-            links = [i]
-
-        for link in links:
-            if not link or link == "" or link == " ":
-                continue
-
-            if "@" in link:
-                link = f"https://t.me/{link.replace('@', '')}"
-
-            await group_db.create_group(
-                group_in=group_schemas.GroupCreate(channel_guid=channel_guid, url=link)
-            )
+    added, duplicates, invalid = await group_db.bulk_add_groups(channel_guid=channel_guid, urls=message.text.split())
+    if added:
+        try:
+            await outbox_db.publish_event(topic=bus.GROUPS_ADDED, payload={"urls": added, "channel_guid": str(channel_guid)})
+        except Exception as e:
+            print(f"Ошибка при отправке новых групп на проверку: {e}")
 
+    text = f"*️⃣ Добавлено групп: {len(added)}\n♻️ Уже были в канале: {len(duplicates)}"
+    if invalid:
+        text += f"\n⚠️ Не распознаны ({len(invalid)}): " + html.escape(", ".join(invalid[:20]))
     await message.answer(
-        text=f"*️⃣ Успешно добавил группы!",
+        text=text,
         reply_markup=general_keyboard.back(callback_data=f"channel_guid_{channel_guid}"),
         disable_web_page_preview=True
     )
@@ -198,11 +181,10 @@ async def del_groups_state(message: Message, state: FSMContext) -> None:
     channel_guid = state_data["channel_guid"]
 
     await state.clear()
-    for i in message.text.split("\n"):
-        await group_db.delete_group_by_url(channel_guid=channel_guid, url=i)
+    deleted = await group_db.bulk_delete_groups(channel_guid=channel_guid, urls=message.text.split())
 
     await message.answer(
-        text=f"*️⃣ Успешно удалил группы!",
+        text=f"*️⃣ Удалено групп: {deleted}",
         reply_markup=general_keyboard.back(callback_data=f"channel_guid_{channel_guid}"),
         disable_web_page_preview=True
     )
@@ -230,7 +212,7 @@ async def add_accounts_with_channel(callback: CallbackQuery, state: FSMContext)
     channel_guid = callback.data.replace("add_accs_chnl_guid_", "")
     await state.update_data(channel_guid=channel_guid)
     await callback.message.edit_text(
-        text="*️⃣ Пришлите zip-файлы для добавления аккаунтов в канал, как только закончите пришлите команду /stop :",
+        text="*️⃣ Пришлите zip-архивы с tdata или .session, файлы .session или .txt со StringSession (по одной в строке) для добавления аккаунтов в канал, как только закончите пришлите команду /stop :",
         reply_markup=general_keyboard.back(callback_data=f"channel_guid_{channel_guid}"),
     )
 
@@ -249,9 +231,12 @@ async def is_not_text_message(message: Message, state: FSMContext) -> None:
 async def add_accounts_with_channel_state(message: Message, state: FSMContext) -> None:
     state_data = await state.get_data()
     channel_guid = state_data["channel_guid"]
+    progress_message = await message.answer("⏳ Принял архив, начинаю импорт...")
     result = await utils.process_telegram_data(
         document_file_id=message.document.file_id,
         unique_document_file_id=message.document.file_unique_id,
+        progress_message=progress_message,
+        file_name=message.document.file_name,
         channel_guid=channel_guid
     )
     if result is not None:
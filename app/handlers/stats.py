@@ -1,11 +1,15 @@
+import json
 from datetime import datetime, timedelta
 
+import aiofiles
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery
 
 from app.keyboards import stats as stats_keyboard, general as general_keyboard
-from core.models import channel as channel_db, repost as repost_db, tg_account as tg_account_db
+from core import tracing
+from core.models import channel as channel_db, repost as repost_db, tg_account as tg_account_db, group_health as group_health_db
+from core.settings import settings
 
 router = Router()
 
@@ -21,12 +25,11 @@ def format_uptime(seconds: float) -> str:
 
 
 async def get_processor_stats() -> dict:
-    """Получает статистику процессора сообщений"""
+    """Получает статистику процессора сообщений из снимка, который пишет сервис доставки"""
     try:
-        # Пытаемся импортировать процессор из главного файла
-        from auto_reposting.__main__ import message_processor
-        return message_processor.get_stats()
-    except (ImportError, AttributeError):
+        async with aiofiles.open(settings.processor_stats_file, 'r') as file:
+            return json.loads(await file.read())
+    except (OSError, ValueError):
         return {
             'running': False,
             'error': 'Процессор не запущен или недоступен'
@@ -41,6 +44,7 @@ async def stats_menu(callback: CallbackQuery, state: FSMContext) -> None:
     working_accounts_count = len(await tg_account_db.get_tg_accounts_by_status_in_channel(status='WORKING'))
     free_accounts_count = len(await tg_account_db.get_tg_accounts_without_channel())
     muted_accounts_count = len(await tg_account_db.get_tg_accounts_by_status(status='MUTED'))
+    pending_accounts_count = len(await tg_account_db.get_tg_accounts_by_status(status='PENDING'))
     
     # Получаем статистику процессора
     processor_stats = await get_processor_stats()
@@ -52,7 +56,8 @@ async def stats_menu(callback: CallbackQuery, state: FSMContext) -> None:
     info_text += f"👥 Аккаунты:\n"
     info_text += f"  ├ 🔴 Рабочих: {working_accounts_count}\n"
     info_text += f"  ├ 🆓 Свободных: {free_accounts_count}\n"
-    info_text += f"  └ 🔇 В муте: {muted_accounts_count}\n\n"
+    info_text += f"  ├ 🔇 В муте: {muted_accounts_count}\n"
+    info_text += f"  └ 🧪 На проверке: {pending_accounts_count}\n\n"
 
 
     info_text += f"\n📊 Выберите канал для детальной статистики:"
@@ -105,6 +110,13 @@ async def processor_detailed_stats(callback: CallbackQuery, state: FSMContext) -
         stats_text += f"  ├ 📈 Сообщений/час: {messages_per_hour:.1f}\n"
         stats_text += f"  └ ⚡ Сообщений/мин: {messages_per_hour/60:.1f}\n\n"
     
+    # Задержка event loop сервиса доставки
+    event_loop = processor_stats.get('event_loop')
+    if event_loop:
+        stats_text += f"🌀 Задержка event loop:\n"
+        stats_text += f"  ├ p50/p95/p99: {event_loop['p50_ms']}/{event_loop['p95_ms']}/{event_loop['p99_ms']} мс\n"
+        stats_text += f"  └ 🐌 Блокировок: {event_loop['blocks_count']} (макс. {event_loop['max_ms']} мс)\n\n"
+    
     # Статистика воркеров
     workers = processor_stats.get('workers', [])
     if workers:
@@ -136,6 +148,80 @@ async def processor_detailed_stats(callback: CallbackQuery, state: FSMContext) -
     )
 
 
+@router.callback_query(F.data == "stats_slow_tasks")
+async def slow_tasks_stats(callback: CallbackQuery, state: FSMContext) -> None:
+    """Самые долгие из последних задач с разбивкой по этапам"""
+    await state.clear()
+
+    traces = await tracing.read_recent_traces(settings.traces_file)
+    slowest = sorted(traces, key=lambda record: record.get("duration", 0), reverse=True)[:5]
+
+    if not slowest:
+        await callback.message.edit_text(
+            text="🐢 Завершенных задач пока нет",
+            reply_markup=general_keyboard.back(callback_data="stats")
+        )
+        return
+
+    stats_text = f"🐢 Самые долгие задачи (из последних {len(traces)}):\n\n"
+    for record in slowest:
+        attrs = record.get("attrs", {})
+        started = datetime.fromtimestamp(record.get("ts", 0)).strftime("%d.%m %H:%M")
+        stats_text += f"📨 {attrs.get('channel', '?')} #{attrs.get('message_id', '?')} ({started})\n"
+        stats_text += f"  ⏱️ Всего: {format_uptime(record.get('duration', 0))}\n"
+
+        # Собственное время этапов: вложенные этапы не считаются дважды
+        stages = sorted(tracing.stage_breakdown(record).items(), key=lambda item: item[1], reverse=True)
+        for index, (name, seconds) in enumerate(stages):
+            branch = "└" if index == len(stages) - 1 else "├"
+            stats_text += f"  {branch} {name}: {seconds:.1f} сек\n"
+        stats_text += "\n"
+
+    await callback.message.edit_text(
+        text=stats_text,
+        reply_markup=general_keyboard.back(callback_data="stats")
+    )
+
+
+QUARANTINE_KINDS = {
+    "not_found": "не существует",
+    "private": "приватная/удалена",
+    "write_forbidden": "запрещено писать",
+    "banned": "бан аккаунтов",
+    "join_request": "вступление по заявке",
+}
+
+
+@router.callback_query(F.data == "stats_quarantine")
+async def quarantine_stats(callback: CallbackQuery, state: FSMContext) -> None:
+    """Группы, исключенные из рассылки до окончания карантина"""
+    await state.clear()
+
+    quarantined = await group_health_db.get_quarantined_groups()
+    unhealthy_count = await group_health_db.get_unhealthy_groups_count()
+
+    if not quarantined:
+        await callback.message.edit_text(
+            text=f"🩺 Групп на карантине нет\n⚠️ Групп с ошибками: {unhealthy_count}",
+            reply_markup=general_keyboard.back(callback_data="stats")
+        )
+        return
+
+    stats_text = f"🩺 Групп на карантине: {len(quarantined)}\n⚠️ Групп с ошибками: {unhealthy_count}\n\n"
+    for health in quarantined[:30]:
+        kind = QUARANTINE_KINDS.get(health.last_failure_kind, health.last_failure_kind)
+        stats_text += f"🔒 {health.url}\n"
+        stats_text += f"  ├ Причина: {kind} (ошибок: {health.failures_total})\n"
+        stats_text += f"  └ До {health.quarantined_until.strftime('%d.%m %H:%M')} (карантин #{health.quarantine_count})\n"
+    if len(quarantined) > 30:
+        stats_text += f"\n... и еще {len(quarantined) - 30}"
+
+    await callback.message.edit_text(
+        text=stats_text,
+        reply_markup=general_keyboard.back(callback_data="stats")
+    )
+
+
 @router.callback_query(F.data.startswith("stats_channel_guid_"))
 async def channel_detailed_stats(callback: CallbackQuery, state: FSMContext) -> None:
     await state.clear()
@@ -6,8 +6,8 @@ from core.models import channel as channel_db
 def menu(channels: list[channel_db.Channel]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
-    
-    
+    builder.row(InlineKeyboardButton(text="🐢 Медленные задачи", callback_data="stats_slow_tasks"))
+    builder.row(InlineKeyboardButton(text="🩺 Группы на карантине", callback_data="stats_quarantine"))
     
     # Добавляем кнопки для каждого канала
     for channel in channels:
@@ -1,27 +1,33 @@
 import asyncio
 import logging
+import multiprocessing
 import os
 import zipfile
 from asyncio import Future
 from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from shutil import rmtree
+from typing import List, Tuple
 
 import aiofiles
 import aiohttp
 from aiofiles.os import makedirs
 from aiogram.types import CallbackQuery, Message
 from opentele.api import UseCurrentSession, API
+from opentele.exception import OpenTeleException
 from opentele.td import TDesktop
+from opentele.tl import TelegramClient as OpenteleClient
 from pydantic import BaseModel
-from sqlalchemy.exc import IntegrityError
 from telethon import TelegramClient
 from telethon.errors import UserDeactivatedBanError
-from telethon.sessions import StringSession
+from telethon.sessions import Session, StringSession
 
-from core import settings
-from core.models import tg_account as tg_account_db
+from core import clock, settings
+from auto_reposting import bus
+from core.models import outbox as outbox_db, tg_account as tg_account_db
 from core.schemas import tg_account as tg_account_schemas
-from core.settings import bot
+from core.settings import bot, json_settings
 
 
 class TelegramAccount(BaseModel):
@@ -52,6 +58,21 @@ async def get_telegram_account(path_to_tdata: str) -> TelegramAccount:
     return tg_account
 
 
+async def get_telegram_account_from_session(session: str | Session) -> TelegramAccount:
+    """Аккаунт по StringSession или пути к файлу .session. Сессия должна быть уже авторизована - код не запрашиваем"""
+    if isinstance(session, str) and not session.endswith(".session"):
+        session = StringSession(session)
+    client = OpenteleClient(session, api=API.TelegramIOS.Generate())
+    await client.connect()
+    try:
+        if not await client.is_user_authorized():
+            raise ValueError("сессия не авторизована")
+        me = await client.get_me()
+        return TelegramAccount(user_id=me.id, session=StringSession.save(client.session), phone_number=me.phone)
+    finally:
+        await client.disconnect()
+
+
 def find_tdata_directory(root_directory):
     for root, dirs, files in os.walk(root_directory):
         for dir_name in dirs:
@@ -60,10 +81,6 @@ def find_tdata_directory(root_directory):
     return None
 
 
-def _get_telegram_account(path_to_tdata: str) -> TelegramAccount:
-    return asyncio.run(get_telegram_account(path_to_tdata))
-
-
 # async def process_telegram_data(document_file_id: str, unique_document_file_id: str, channel_guid: str | None) -> str:
 #     file_info = await bot.get_file(file_id=document_file_id)
 #     file = await bot.download_file(file_path=file_info.file_path)
@@ -118,70 +135,310 @@ def _get_telegram_account(path_to_tdata: str) -> TelegramAccount:
 
 
 
-async def download_file(session, file_info):
-    async with session.get(f"https://api.telegram.org/file/bot{settings.settings.bot_token.get_secret_value()}/{file_info.file_path}") as response:
-        return await response.read()
-
-
-async def process_tdata_file(dir, channel_guid):
-    tdata_path = find_tdata_directory(dir)
-
-    if not tdata_path:
-        return "*️⃣ Не нашел папку 'tdata'\n"
-    tdata_path.replace("\\", "/")
-
-    try:
-        telegram_account = await asyncio.wait_for(get_telegram_account(path_to_tdata=tdata_path), timeout=3)
-    except UserDeactivatedBanError as e:
-        return f"*️⃣ Не смог авторизоваться, ошибка: {e.__class__.__name__}: {e}\n"
-    except Exception as e:
-        return f"*️⃣ Не смог авторизоваться, ошибка: {e.__class__.__name__}: {e}\n"
-    finally:
-        rmtree(dir)
-
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DEFAULT_IMPORT_WORKERS = 4
+DEFAULT_IMPORT_TIMEOUT = 60  # секунд на один аккаунт (логин по tdata и get_me)
+IMPORT_BATCH_SIZE = 50  # аккаунтов в одном INSERT
+PROGRESS_INTERVAL = 3.0  # не чаще одной правки сообщения с прогрессом за столько секунд
+
+_import_executor: ProcessPoolExecutor | None = None
+_import_workers = 0
+
+
+def _get_import_executor(workers: int) -> ProcessPoolExecutor:
+    """Пул процессов для конвертации tdata: пересоздается при смене числа воркеров"""
+    global _import_executor, _import_workers
+    if _import_executor is None or _import_workers != workers:
+        if _import_executor is not None:
+            _import_executor.shutdown(wait=False, cancel_futures=True)
+        # spawn: дочерний процесс не наследует event loop и соединения бота
+        _import_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _import_workers = workers
+    return _import_executor
+
+
+def _discard_import_executor(executor: ProcessPoolExecutor) -> None:
+    """
+    Зависший воркер занимает слот пула: пул закрывается, а его процессы завершаются
+    (shutdown сам зависший процесс не останавливает). Следующие аккаунты берут новый пул
+    """
+    global _import_executor
+    if _import_executor is executor:
+        _import_executor = None
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        try:
+            process.terminate()
+        except Exception as e:
+            logging.debug(f"Не удалось завершить процесс импорта: {e}")
+
+
+@dataclass
+class ImportItem:
+    """Один аккаунт из присланного файла: папка tdata, файл .session или строка StringSession"""
+    kind: str  # tdata | session_file | string_session | missing
+    source: str
+    label: str
+
+
+def _convert_item(kind: str, source: str, timeout: float) -> Tuple[TelegramAccount | None, str]:
+    """Выполняется в процессе пула. Исключения Telethon плохо переживают pickle - возвращаем текст ошибки"""
+    if kind == "tdata":
+        coroutine = get_telegram_account(source)
+    else:
+        coroutine = get_telegram_account_from_session(source)
     try:
-        await tg_account_db.create_tg_account(
-            tg_account_in=tg_account_schemas.TGAccountCreate(
-                channel_guid=channel_guid,
-                telegram_id=telegram_account.user_id,
-                last_datetime_pause=None,
-                pause_in_seconds=None,
-                phone_number=telegram_account.phone_number,
-                string_session=telegram_account.session,
-                status=tg_account_schemas.TGAccountStatus.working
-            )
-        )
-    except IntegrityError:
-        return f"*️⃣ Аккаунт https://t.me/+{telegram_account.phone_number} уже есть в базе данных"
-
-    return ""
-
-
-async def process_telegram_data(document_file_id: str, unique_document_file_id: str, channel_guid: str | None) -> str:
-    bot_file_info = await bot.get_file(file_id=document_file_id)
-
-    async with aiohttp.ClientSession() as session:
-        file = await download_file(session, bot_file_info)
-
-    root_directory = document_file_id
-    zip_file = f"{root_directory}/{unique_document_file_id}.zip"
-    os.makedirs(root_directory, exist_ok=True)
-
-    async with aiofiles.open(zip_file, 'wb') as f:
-        await f.write(file)
-
+        return asyncio.run(asyncio.wait_for(coroutine, timeout=timeout)), ""
+    except asyncio.TimeoutError:
+        return None, f"TimeoutError: не уложился в {timeout:.0f}с"
+    except (OpenTeleException, Exception) as e:  # исключения opentele наследуют BaseException
+        return None, f"{e.__class__.__name__}: {e}"
+
+
+def _items_from_file(path: str, label: str) -> List[ImportItem]:
+    if path.endswith(".session"):
+        return [ImportItem(kind="session_file", source=path, label=label)]
+    if path.endswith(".txt"):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            lines = [line.strip() for line in f]
+        return [
+            ImportItem(kind="string_session", source=line, label=f"{label}, строка {number}")
+            for number, line in enumerate(lines, 1) if line
+        ]
+    return []
+
+
+def _collect_import_items(root_directory: str, skip: str) -> List[ImportItem]:
+    """Аккаунты из распакованного архива: папки с tdata, файлы .session и списки StringSession (.txt)"""
+    items = []
+    for name in sorted(os.listdir(root_directory)):
+        if name == skip:
+            continue
+        path = os.path.join(root_directory, name)
+        if not os.path.isdir(path):
+            items.extend(_items_from_file(path, name) or [ImportItem(kind="missing", source=path, label=name)])
+            continue
+
+        tdata_path = path if name == "tdata" else find_tdata_directory(path)
+        if tdata_path:
+            items.append(ImportItem(kind="tdata", source=tdata_path, label=name))
+            continue
+        found = []
+        for root, _, files in os.walk(path):
+            for file_name in sorted(files):
+                found.extend(_items_from_file(os.path.join(root, file_name), f"{name}/{file_name}"))
+        items.extend(found or [ImportItem(kind="missing", source=path, label=name)])
+    return items
+
+
+def _extract_archive(zip_file: str, root_directory: str) -> None:
     with zipfile.ZipFile(zip_file, 'r') as zip_ref:
         zip_ref.extractall(root_directory)
 
-    text = "*️⃣ Ошибки которые возникли:\n"
 
-    tasks = []
+class ImportProgress:
+    """Прогресс импорта в сообщении админу. Правки реже PROGRESS_INTERVAL, чтобы не ловить FloodWait бота"""
+
+    def __init__(self, message: Message | None):
+        self.message = message
+        self.total = 0
+        self.done = 0
+        self.added = 0
+        self.duplicates = 0
+        self.failed = 0
+        self._last_update = 0.0
+        self._last_text = ""
+
+    async def set_stage(self, text: str) -> None:
+        await self._edit(text, force=True)
+
+    async def advance(self, converted: bool) -> None:
+        self.done += 1
+        if not converted:
+            self.failed += 1
+        await self._edit(self.summary())
+
+    async def record_insert(self, added: int, duplicates: int) -> None:
+        self.added += added
+        self.duplicates += duplicates
+        await self._edit(self.summary())
+
+    def summary(self) -> str:
+        return (
+            f"⏳ Импорт аккаунтов: {self.done}/{self.total}\n"
+            f"✅ Добавлено: {self.added}\n"
+            f"♻️ Уже в базе: {self.duplicates}\n"
+            f"🧪 Новые аккаунты будут взяты в работу после проверки\n"
+            f"*️⃣ С ошибками: {self.failed}"
+        )
 
-    for dir in os.listdir(root_directory):
-        if dir != f"{unique_document_file_id}.zip":
-            tasks.append(process_tdata_file(f"{root_directory}/{dir}", channel_guid))
+    async def _edit(self, text: str, force: bool = False) -> None:
+        if self.message is None or text == self._last_text:
+            return
+        now = clock.monotonic()
+        if not force and now - self._last_update < PROGRESS_INTERVAL:
+            return
+        self._last_update = now
+        self._last_text = text
+        try:
+            await self.message.edit_text(text)
+        except Exception as e:
+            logging.debug(f"Не удалось обновить прогресс импорта: {e}")
+
+
+async def download_file(session, file_info, destination: str) -> None:
+    """Скачивает файл бота на диск частями, не держа весь архив в памяти"""
+    url = f"https://api.telegram.org/file/bot{settings.settings.bot_token.get_secret_value()}/{file_info.file_path}"
+    async with session.get(url) as response:
+        response.raise_for_status()
+        async with aiofiles.open(destination, 'wb') as f:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                await f.write(chunk)
+
+
+async def convert_import_item(item: ImportItem, workers: int, timeout: float) -> Tuple[TelegramAccount | None, str]:
+    """Аккаунт из tdata или сессии в процессе пула. Возвращает (аккаунт, "") или (None, текст ошибки)"""
+    if item.kind == "missing":
+        return None, f"*️⃣ {item.label}: не нашел папку 'tdata' или файл сессии\n"
+
+    # Пул берется на каждый аккаунт: после зависшего аккаунта остальные идут в новый пул
+    for attempt in range(2):
+        executor = _get_import_executor(workers)
+        try:
+            # Таймаут внутри процесса отменяет логин, внешний (с запасом) - страховка от зависшего процесса
+            telegram_account, error = await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(executor, _convert_item, item.kind, item.source, timeout),
+                timeout=timeout + 15
+            )
+        except asyncio.TimeoutError:
+            _discard_import_executor(executor)
+            telegram_account, error = None, f"TimeoutError: процесс не ответил за {timeout:.0f}с"
+        except (BrokenProcessPool, asyncio.CancelledError) as e:
+            # Пул закрыли из-за соседнего зависшего аккаунта - повторяем в новом пуле
+            if isinstance(e, asyncio.CancelledError) and asyncio.current_task().cancelling():
+                raise  # отменили сам импорт
+            if attempt == 0:
+                continue
+            telegram_account, error = None, f"{e.__class__.__name__}: {e}"
+        except Exception as e:
+            telegram_account, error = None, f"{e.__class__.__name__}: {e}"
+        break
+
+    if telegram_account is None:
+        return None, f"*️⃣ {item.label}: не смог авторизоваться, ошибка: {error}\n"
+    return telegram_account, ""
+
+
+async def save_telegram_accounts(telegram_accounts: List[TelegramAccount], channel_guid: str | None) -> Tuple[List[int], List[int]]:
+    """
+    Пачка аккаунтов одним запросом. Возвращает (новые номера, дубликаты).
+    Новые аккаунты ждут в PENDING, пока сервис доставки их не проверит.
+    """
+    created, duplicates = await tg_account_db.bulk_create_tg_accounts([
+        tg_account_schemas.TGAccountCreate(
+            channel_guid=channel_guid,
+            telegram_id=telegram_account.user_id,
+            last_datetime_pause=None,
+            pause_in_seconds=None,
+            phone_number=telegram_account.phone_number,
+            string_session=telegram_account.session,
+            status=tg_account_schemas.TGAccountStatus.pending
+        )
+        for telegram_account in telegram_accounts
+    ])
+    if created:
+        await outbox_db.publish_event(topic=bus.ACCOUNTS_IMPORTED, payload={"phone_numbers": created})
+    return created, duplicates
+
+
+def _document_extension(file_name: str | None) -> str:
+    extension = os.path.splitext(file_name or "")[1].lower()
+    return extension if extension in (".session", ".txt") else ".zip"
+
+
+async def process_telegram_data(
+        document_file_id: str,
+        unique_document_file_id: str,
+        channel_guid: str | None,
+        progress_message: Message | None = None,
+        file_name: str | None = None
+) -> str:
+    """
+    Импорт аккаунтов из документа: zip-архив (tdata, .session, .txt внутри), файл .session
+    или .txt со StringSession по одной в строке. Загрузка потоком на диск, распаковка в потоке,
+    конвертация в пуле процессов с таймаутом на аккаунт, запись в базу пачками по IMPORT_BATCH_SIZE.
+    """
+    try:
+        workers = max(int(await json_settings.async_get_attribute("tdata_import_workers")), 1)
+        timeout = float(await json_settings.async_get_attribute("tdata_import_timeout"))
+    except:
+        workers = DEFAULT_IMPORT_WORKERS
+        timeout = DEFAULT_IMPORT_TIMEOUT
 
-    for result in await asyncio.gather(*tasks):
-        text += result
+    progress = ImportProgress(progress_message)
+    root_directory = document_file_id
+    extension = _document_extension(file_name)
+    document_path = f"{root_directory}/{unique_document_file_id}{extension}"
+    await makedirs(root_directory, exist_ok=True)
 
-    return text
+    try:
+        await progress.set_stage("⏳ Скачиваю файл...")
+        bot_file_info = await bot.get_file(file_id=document_file_id)
+        async with aiohttp.ClientSession() as session:
+            await download_file(session, bot_file_info, document_path)
+
+        if extension == ".zip":
+            await progress.set_stage("⏳ Распаковываю архив...")
+            try:
+                await asyncio.to_thread(_extract_archive, document_path, root_directory)
+            except zipfile.BadZipFile as e:
+                return f"*️⃣ Не смог распаковать архив: {e}\n"
+            items = await asyncio.to_thread(_collect_import_items, root_directory, os.path.basename(document_path))
+        else:
+            items = await asyncio.to_thread(_items_from_file, document_path, file_name or os.path.basename(document_path))
+
+        progress.total = len(items)
+        await progress.set_stage(progress.summary())
+
+        # Семафор по числу процессов: таймаут считается с начала конвертации, а не с постановки в очередь пула
+        semaphore = asyncio.Semaphore(workers)
+        errors: List[str] = []
+        duplicates: List[int] = []
+        pending: List[TelegramAccount] = []
+
+        async def flush() -> None:
+            batch = pending[:]
+            pending.clear()
+            if not batch:
+                return
+            try:
+                created, existing = await save_telegram_accounts(batch, channel_guid)
+            except Exception as e:
+                logging.exception(f"Ошибка записи пачки аккаунтов: {e}")
+                errors.append(f"*️⃣ Не смог записать {len(batch)} аккаунтов в базу: {e.__class__.__name__}: {e}\n")
+                return
+            duplicates.extend(existing)
+            await progress.record_insert(len(created), len(existing))
+
+        async def import_item(item: ImportItem) -> None:
+            async with semaphore:
+                telegram_account, error = await convert_import_item(item, workers, timeout)
+            if telegram_account is None:
+                errors.append(error)
+            else:
+                pending.append(telegram_account)
+                if len(pending) >= IMPORT_BATCH_SIZE:
+                    await flush()
+            await progress.advance(converted=telegram_account is not None)
+
+        await asyncio.gather(*(import_item(item) for item in items))
+        await flush()
+        await progress.set_stage(progress.summary())
+
+        text = "*️⃣ Ошибки которые возникли:\n"
+        text += "".join(errors)
+        text += "".join(f"*️⃣ Аккаунт https://t.me/+{phone_number} уже есть в базе данных\n" for phone_number in duplicates)
+        return text
+    finally:
+        await asyncio.to_thread(rmtree, root_directory, True)
@@ -1,18 +1,20 @@
 import asyncio
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import List, Dict
 from loguru import logger
 
-from core.models import tg_account as tg_account_db
+from core.models import tg_account as tg_account_db, account_usage as account_usage_db
 from core.schemas import tg_account as tg_account_schemas
-from core.settings import settings
+from core.settings import settings, json_settings
+from core import clock, metrics
 
 
 class PauseRestorer:
     """Класс для автоматического восстановления аккаунтов из пауз"""
     
-    def __init__(self):
-        self.check_interval = 1200  # 20 минут в секундах
+    def __init__(self, check_interval: int = 1200, notify_admin: bool = True):
+        self.check_interval = check_interval  # 20 минут в секундах
+        self.notify_admin = notify_admin
         self.running = False
         self.last_check = None
         self.stats = {
@@ -26,8 +28,9 @@ class PauseRestorer:
         Проверяет и восстанавливает аккаунты с истёкшими паузами
         Возвращает статистику операции
         """
-        check_start = datetime.now()
+        check_start = clock.now()
         self.stats['total_checks'] += 1
+        metrics.pause_checks.inc()
         
         result = {
             'timestamp': check_start,
@@ -45,7 +48,7 @@ class PauseRestorer:
             
             logger.info(f"🔍 Проверяю {len(muted_accounts)} аккаунтов в муте на истёкшие паузы")
             
-            current_time = datetime.now()
+            current_time = clock.now()
             
             for account in muted_accounts:
                 try:
@@ -74,6 +77,7 @@ class PauseRestorer:
                         result['restored_accounts'] += 1
                         result['restored_phones'].append(account.phone_number)
                         self.stats['total_restored'] += 1
+                        metrics.accounts_restored.inc()
                         
                         logger.success(f"✅ Аккаунт +{account.phone_number} восстановлен и готов к работе")
                     else:
@@ -111,9 +115,25 @@ class PauseRestorer:
             result['errors'].append(error_msg)
             return result
     
+    async def cleanup_account_usage(self) -> None:
+        """Удаляет счетчики репостов, вышедшие за скользящее окно"""
+        try:
+            usage_window = await json_settings.async_get_attribute("account_usage_window")
+        except Exception:
+            usage_window = 86400
+
+        try:
+            removed = await account_usage_db.cleanup_account_usage(
+                before=clock.now() - timedelta(seconds=usage_window)
+            )
+            if removed:
+                logger.debug(f"🧹 Удалено устаревших счетчиков репостов: {removed}")
+        except Exception as e:
+            logger.error(f"Ошибка очистки счетчиков репостов: {e}")
+
     async def send_notification_if_needed(self, restore_result: Dict) -> None:
         """Отправляет уведомление админу если восстановлены аккаунты"""
-        if restore_result['restored_accounts'] == 0:
+        if restore_result['restored_accounts'] == 0 or not self.notify_admin:
             return
         
         try:
@@ -150,10 +170,12 @@ class PauseRestorer:
                 
                 # Отправляем уведомление если нужно
                 await self.send_notification_if_needed(result)
+
+                await self.cleanup_account_usage()
                 
                 # Ждём до следующей проверки
                 logger.debug(f"⏰ Следующая проверка через {self.check_interval/60:.0f} минут")
-                await asyncio.sleep(self.check_interval)
+                await clock.sleep(self.check_interval)
                 
             except asyncio.CancelledError:
                 logger.info("🛑 Получен сигнал остановки автовосстановления")
@@ -161,7 +183,7 @@ class PauseRestorer:
             except Exception as e:
                 logger.error(f"Ошибка в цикле автовосстановления: {e}")
                 # При ошибке ждём меньше времени
-                await asyncio.sleep(60)
+                await clock.sleep(60)
         
         self.running = False
         logger.info("🏁 Автовосстановление остановлено")
@@ -0,0 +1,182 @@
+import json
+import math
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from statistics import median
+from typing import Deque, Dict, Iterable, List, Optional, TypeVar
+
+import aiofiles
+from loguru import logger
+
+from core import clock
+from core.settings import settings
+
+T = TypeVar("T")
+
+HALF_LIFE = 6 * 3600  # за 6 часов вес старых событий падает вдвое
+LATENCY_REFERENCE = 2.0  # медиана RPC в секундах, при которой оценка делится на два
+FLOOD_REFERENCE = 600  # секунд FloodWait, при которых оценка падает в e раз
+FROZEN_PENALTY = 0.2  # множитель за каждое (затухающее) событие FROZEN_METHOD_INVALID
+
+
+@dataclass
+class AccountStats:
+    successes: float = 0.0
+    failures: float = 0.0
+    flood_seconds: float = 0.0
+    frozen_events: float = 0.0
+    updated_at: float = 0.0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=50))
+    flood_waits: int = 0  # число FloodWait с запуска процесса, без затухания (не сохраняется)
+    last_flood_wait: float = 0.0  # секунды последнего FloodWait
+    # Задержки по этапам (resolve, join, forward): этапы из разного числа RPC нельзя сравнивать одной медианой
+    stage_latencies: Dict[str, Deque[float]] = field(default_factory=dict)
+
+    def decay(self, now: float) -> None:
+        """Экспоненциальное затухание накопленных значений с момента последнего обновления"""
+        if self.updated_at and now > self.updated_at:
+            factor = 0.5 ** ((now - self.updated_at) / HALF_LIFE)
+            self.successes *= factor
+            self.failures *= factor
+            self.flood_seconds *= factor
+            self.frozen_events *= factor
+        self.updated_at = now
+
+    def to_dict(self) -> dict:
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "flood_seconds": self.flood_seconds,
+            "frozen_events": self.frozen_events,
+            "updated_at": self.updated_at,
+            "latencies": list(self.latencies),
+        }
+
+
+class AccountScorer:
+    """Скользящая оценка аккаунтов: успешность, медиана задержки RPC, FloodWait и заморозки"""
+
+    def __init__(self):
+        self.stats: Dict[str, AccountStats] = {}
+
+    def _get(self, phone_number) -> Optional[AccountStats]:
+        if phone_number is None:
+            return None
+        key = str(phone_number)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = AccountStats()
+        stats.decay(clock.monotonic())
+        return stats
+
+    def record_success(self, phone_number) -> None:
+        stats = self._get(phone_number)
+        if stats:
+            stats.successes += 1
+
+    def record_failure(self, phone_number) -> None:
+        stats = self._get(phone_number)
+        if stats:
+            stats.failures += 1
+
+    def record_latency(self, phone_number, seconds: float, stage: Optional[str] = None) -> None:
+        stats = self._get(phone_number)
+        if stats:
+            stats.latencies.append(seconds)
+            if stage:
+                stats.stage_latencies.setdefault(stage, deque(maxlen=20)).append(seconds)
+
+    def record_flood_wait(self, phone_number, seconds: float) -> None:
+        stats = self._get(phone_number)
+        if stats:
+            stats.flood_seconds += seconds
+            stats.flood_waits += 1
+            stats.last_flood_wait = seconds
+            stats.failures += 1
+
+    def record_frozen(self, phone_number) -> None:
+        stats = self._get(phone_number)
+        if stats:
+            stats.frozen_events += 1
+            stats.failures += 1
+
+    def flood_wait_count(self, phone_number) -> int:
+        stats = self.stats.get(str(phone_number))
+        return stats.flood_waits if stats else 0
+
+    def last_flood_wait(self, phone_number) -> float:
+        stats = self.stats.get(str(phone_number))
+        return stats.last_flood_wait if stats else 0.0
+
+    def median_latency(self, phone_number, stage: Optional[str] = None) -> Optional[float]:
+        """Медиана последних RPC аккаунта, всех или одного этапа (None - замеров еще нет)"""
+        stats = self.stats.get(str(phone_number))
+        if stats is None:
+            return None
+        latencies = stats.stage_latencies.get(stage) if stage else stats.latencies
+        return median(latencies) if latencies else None
+
+    def score(self, phone_number) -> float:
+        """Оценка от 0 до 1. Новый аккаунт без истории получает нейтральные 0.5"""
+        stats = self.stats.get(str(phone_number))
+        if stats is None:
+            return 0.5
+        stats.decay(clock.monotonic())
+
+        success_rate = (stats.successes + 1) / (stats.successes + stats.failures + 2)
+        latency_factor = 1.0
+        if stats.latencies:
+            latency_factor = 1 / (1 + median(stats.latencies) / LATENCY_REFERENCE)
+        flood_factor = math.exp(-stats.flood_seconds / FLOOD_REFERENCE)
+        frozen_factor = FROZEN_PENALTY ** stats.frozen_events
+        return success_rate * latency_factor * flood_factor * frozen_factor
+
+    def rank(self, accounts: Iterable[T]) -> List[T]:
+        """Аккаунты по убыванию оценки (при равенстве сохраняется исходный порядок)"""
+        return sorted(accounts, key=lambda account: -self.score(account.phone_number))
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {phone: {**stats.to_dict(), "score": round(self.score(phone), 4)} for phone, stats in self.stats.items()}
+
+    async def save(self, path: Optional[str] = None) -> None:
+        """Сохраняет оценки, чтобы их видели другие процессы (process_post3) и перезапуски"""
+        path = path or settings.account_scores_file
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            data = {"saved_at": clock.now().timestamp(), "accounts": self.snapshot()}
+            async with aiofiles.open(path, 'w') as file:
+                await file.write(json.dumps(data))
+        except Exception as e:
+            logger.error(f"Ошибка сохранения оценок аккаунтов: {e}")
+
+    async def load(self, path: Optional[str] = None) -> None:
+        path = path or settings.account_scores_file
+        try:
+            async with aiofiles.open(path, 'r') as file:
+                data = json.loads(await file.read())
+        except (OSError, ValueError):
+            return
+
+        # Часы процесса (monotonic) не совпадают между процессами: переносим возраст записи
+        age = max(0.0, clock.now().timestamp() - data.get("saved_at", 0))
+        now = clock.monotonic()
+        for phone, values in data.get("accounts", {}).items():
+            stats = AccountStats(
+                successes=values.get("successes", 0.0),
+                failures=values.get("failures", 0.0),
+                flood_seconds=values.get("flood_seconds", 0.0),
+                frozen_events=values.get("frozen_events", 0.0),
+                latencies=deque(values.get("latencies", []), maxlen=50),
+                flood_waits=self.stats[phone].flood_waits if phone in self.stats else 0,
+                last_flood_wait=self.stats[phone].last_flood_wait if phone in self.stats else 0.0,
+            )
+            stats.updated_at = now
+            stats.decay(now + age)
+            stats.updated_at = now
+            self.stats[phone] = stats
+
+
+account_scorer = AccountScorer()
@@ -0,0 +1,197 @@
+import asyncio
+from typing import Iterable, Optional, Set
+
+from loguru import logger
+from telethon import errors
+from telethon.tl.functions.account import UpdateStatusRequest
+
+from core import clock, metrics
+from core.models import outbox as outbox_db, tg_account as tg_account_db
+from core.schemas import tg_account as tg_account_schemas
+from core.settings import json_settings
+from . import bus, telegram_utils, telegram_utils2
+from .account_scoring import account_scorer
+from .connections import connections
+from .leases import lease_manager, account_lease_key
+
+DEFAULT_CONCURRENCY = 3
+FROZEN_PAUSE = 7 * 86400  # замороженный аккаунт не берем в работу неделю
+RETRY_INTERVAL = 600  # PENDING-аккаунты, которые не удалось проверить (сеть, FloodWait), проверяются снова
+
+
+class AccountValidator:
+    """
+    Проверка импортированных аккаунтов до начала работы: логин и get_me, ответ @SpamBot
+    и безобидный RPC на FROZEN_METHOD_INVALID. WORKING аккаунт получает, только пройдя все проверки.
+    """
+
+    def __init__(self, retry_interval: int = RETRY_INTERVAL):
+        self.retry_interval = retry_interval
+        self.running = False
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._concurrency = 0
+        self._in_progress: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _get_semaphore(self) -> asyncio.Semaphore:
+        try:
+            concurrency = int(await json_settings.async_get_attribute("account_validation_concurrency"))
+        except:
+            concurrency = DEFAULT_CONCURRENCY
+        concurrency = max(concurrency, 1)
+        # После перезапуска сервиса (новый event loop) семафор создается заново
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or concurrency != self._concurrency or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(concurrency)
+            self._semaphore_loop = loop
+            self._concurrency = concurrency
+        return self._semaphore
+
+    @staticmethod
+    async def _set_status(tg_account: tg_account_db.TGAccount, status: tg_account_schemas.TGAccountStatus, **fields) -> None:
+        await tg_account_db.update_tg_account(
+            tg_account=tg_account,
+            tg_account_update=tg_account_schemas.TGAccountUpdate(status=status, **fields)
+        )
+
+    async def _check(self, tg_account: tg_account_db.TGAccount) -> str:
+        """Проверяет аккаунт и выставляет статус. Возвращает результат для метрик и лога"""
+        telegram_client = telegram_utils2.client_factory(tg_account.string_session)
+        async with connections.session(telegram_client):
+            if not await telegram_client.is_user_authorized():
+                await self._set_status(tg_account, tg_account_schemas.TGAccountStatus.deleted)
+                return "unauthorized"
+            await telegram_client.get_me()
+
+            spambot_status = telegram_utils.parse_spambot_response(await telegram_utils.ask_spambot(telegram_client))
+            if spambot_status is not None:
+                await telegram_utils.apply_spambot_status(tg_account, spambot_status)
+                return "spam_limited" if spambot_status == tg_account_schemas.TGAccountStatus.muted else "banned"
+
+            # Замороженный аккаунт читает, но на действия получает FROZEN_METHOD_INVALID
+            try:
+                await telegram_client(UpdateStatusRequest(offline=True))
+            except errors.RPCError as e:
+                if "FROZEN_METHOD_INVALID" not in str(e):
+                    raise
+                account_scorer.record_frozen(tg_account.phone_number)
+                await self._set_status(
+                    tg_account,
+                    tg_account_schemas.TGAccountStatus.muted,
+                    last_datetime_pause=clock.now(),
+                    pause_in_seconds=FROZEN_PAUSE
+                )
+                return "frozen"
+
+        await self._set_status(tg_account, tg_account_schemas.TGAccountStatus.working)
+        return "working"
+
+    async def _check_safely(self, tg_account: tg_account_db.TGAccount) -> str:
+        """_check с разбором ошибок Telegram в результат"""
+        phone_number = tg_account.phone_number
+        try:
+            return await self._check(tg_account)
+        except (errors.UnauthorizedError, errors.PhoneNumberInvalidError) as e:
+            logger.warning(f"🔑 +{phone_number} не прошел проверку авторизации: {type(e).__name__}")
+            await self._set_status(tg_account, tg_account_schemas.TGAccountStatus.deleted)
+            return "unauthorized"
+        except errors.AuthKeyDuplicatedError:
+            # Сессию одновременно использует кто-то еще - это не повод удалять аккаунт
+            logger.warning(f"🔑 +{phone_number}: AUTH_KEY_DUPLICATED, аккаунт остается на проверке")
+            return "auth_key_duplicated"
+        except errors.FloodWaitError as e:
+            account_scorer.record_flood_wait(phone_number, e.seconds or 0)
+            return "flood_wait"  # остается PENDING до следующего прохода
+        except Exception as e:
+            logger.error(f"Ошибка проверки аккаунта +{phone_number}: {e}")
+            return "error"
+
+    async def validate(self, tg_account: tg_account_db.TGAccount) -> Optional[str]:
+        """
+        Проверка одного аккаунта под общим семафором и арендой аккаунта: одну сессию не проверяют
+        два узла сразу. None - аккаунт уже проверяется здесь или занят другим узлом
+        """
+        phone_number = tg_account.phone_number
+        if phone_number in self._in_progress:
+            return None
+        self._in_progress.add(phone_number)
+        try:
+            async with await self._get_semaphore():
+                key = account_lease_key(tg_account.guid)
+                if lease_manager.holds(key) or not await lease_manager.try_acquire(key):
+                    logger.debug(f"🔒 +{phone_number} занят другим узлом, проверю в следующий проход")
+                    return None
+                try:
+                    result = await self._check_safely(tg_account)
+                finally:
+                    await lease_manager.release(key)
+        finally:
+            self._in_progress.discard(phone_number)
+
+        metrics.account_validations.inc(result=result)
+        if result == "working":
+            logger.success(f"✅ Аккаунт +{phone_number} прошел проверку и взят в работу")
+            if tg_account.channel_guid:
+                # Воркер канала подхватит новый рабочий аккаунт
+                await outbox_db.publish_event(
+                    topic=bus.CHANNEL_ACCOUNTS_CHANGED,
+                    payload={"channel_guid": str(tg_account.channel_guid)}
+                )
+        else:
+            logger.warning(f"🧪 Аккаунт +{phone_number} не взят в работу: {result}")
+        return result
+
+    async def validate_accounts(self, tg_accounts: Iterable[tg_account_db.TGAccount]) -> None:
+        pending = [
+            tg_account for tg_account in tg_accounts
+            if tg_account.status == tg_account_schemas.TGAccountStatus.pending.value
+        ]
+        if not pending:
+            return
+        logger.info(f"🧪 Проверяю {len(pending)} новых аккаунтов")
+        await asyncio.gather(*(self.validate(tg_account) for tg_account in pending), return_exceptions=True)
+
+    async def validate_pending(self) -> None:
+        await self.validate_accounts(
+            await tg_account_db.get_tg_accounts_by_status(tg_account_schemas.TGAccountStatus.pending.value)
+        )
+
+    def submit(self, phone_numbers: Iterable[int]) -> Optional[asyncio.Task]:
+        """Проверка только что импортированных аккаунтов в фоне: шина не ждет логинов"""
+        phone_numbers = list(phone_numbers)
+        if not phone_numbers:
+            return None
+
+        async def validate_imported() -> None:
+            await self.validate_accounts(await tg_account_db.get_tg_accounts_by_phone_numbers(phone_numbers))
+
+        task = asyncio.create_task(validate_imported())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run(self) -> None:
+        """
+        Периодический проход по PENDING. Подбирает аккаунты, которые событие шины не проверило:
+        аккаунт был занят другим воркером, проверка упала или событие отброшено после всех попыток
+        """
+        self.running = True
+        while self.running:
+            try:
+                await self.validate_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка проверки новых аккаунтов: {e}")
+            await clock.sleep(self.retry_interval)
+
+    async def stop(self) -> None:
+        self.running = False
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+account_validator = AccountValidator()
@@ -0,0 +1,76 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set, TypeVar
+
+from loguru import logger
+
+from core.models import group_membership as group_membership_db
+
+T = TypeVar("T")
+
+DEFAULT_REPLICAS = 2  # домашних аккаунтов на группу
+
+
+def rendezvous_weight(url: str, account_key: str) -> int:
+    """Вес пары группа-аккаунт для rendezvous hashing (детерминирован между процессами)"""
+    digest = hashlib.blake2b(f"{url}|{account_key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def home_accounts(url: str, accounts: Iterable[T], replicas: int = DEFAULT_REPLICAS) -> List[T]:
+    """Домашние аккаунты группы: replicas аккаунтов с наибольшим весом.
+
+    Когда аккаунт пропадает (пауза, удаление), его группы переходят к следующему по весу,
+    а у остальных групп назначение не меняется - переприсоединений минимум.
+    """
+    ranked = sorted(accounts, key=lambda account: rendezvous_weight(url, str(account.guid)), reverse=True)
+    return ranked[:replicas]
+
+
+class MembershipRegistry:
+    """В каких группах уже состоят аккаунты (номер -> url), с сохранением в БД"""
+
+    def __init__(self):
+        self.members: Dict[int, Set[str]] = {}
+
+    async def ensure_loaded(self, phone_numbers: Iterable[Optional[int]]) -> None:
+        missing = [phone for phone in set(phone_numbers) if phone is not None and phone not in self.members]
+        if not missing:
+            return
+        try:
+            self.members.update(await group_membership_db.get_memberships_by_phones(missing))
+        except Exception as e:
+            logger.error(f"Ошибка загрузки членства в группах: {e}")
+
+    def is_member(self, phone_number: Optional[int], url: str) -> bool:
+        return url in self.members.get(phone_number, ())
+
+    async def record(self, phone_number: Optional[int], url: str) -> None:
+        """Аккаунт вступил в группу или сделал в нее репост"""
+        if phone_number is None:
+            return
+        self.members.setdefault(phone_number, set()).add(url)
+        try:
+            await group_membership_db.upsert_membership(phone_number, url)
+        except Exception as e:
+            logger.error(f"Ошибка записи членства +{phone_number} в {url}: {e}")
+
+    async def forget(self, phone_number: Optional[int], url: str) -> None:
+        """Аккаунт больше не состоит в группе (вышел, исключен, группа недоступна)"""
+        if phone_number is None or not self.is_member(phone_number, url):
+            return
+        self.members[phone_number].discard(url)
+        try:
+            await group_membership_db.delete_membership(phone_number, url)
+        except Exception as e:
+            logger.error(f"Ошибка удаления членства +{phone_number} в {url}: {e}")
+
+
+membership_registry = MembershipRegistry()
+
+
+def route_accounts(url: str, accounts: List[T], replicas: int = DEFAULT_REPLICAS) -> List[T]:
+    """Порядок аккаунтов для доставки в группу: сначала уже состоящие в ней, затем домашние"""
+    homes = home_accounts(url, accounts, replicas)
+    members = [account for account in accounts if membership_registry.is_member(account.phone_number, url)]
+    members.sort(key=lambda account: rendezvous_weight(url, str(account.guid)), reverse=True)
+    return members + [account for account in homes if account not in members]
@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from uuid import UUID
+
+from loguru import logger
+
+from core.models import outbox as outbox_db
+
+# Темы событий шины
+NEW_MESSAGE = "new_message"
+CHANNEL_ACCOUNTS_CHANGED = "channel_accounts_changed"
+FAST_REPOST = "fast_repost"  # задание резидентному воркеру process_post3 --serve
+ACCOUNTS_IMPORTED = "accounts_imported"  # новые аккаунты (PENDING) ждут проверки
+GROUPS_ADDED = "groups_added"  # новые группы ждут получения сущности и метаданных
+
+
+class EventBus:
+    """
+    Потребитель событий из outbox-таблицы. Опрашивает БД и вызывает обработчики по темам.
+    Событие подтверждается после успешного обработчика. Если обработчик вернул задачу (asyncio.Task),
+    событие подтверждается, когда задача завершится без ошибки, а до тех пор его захват продлевается.
+    Неподтвержденное событие доставляется снова после visibility_timeout
+    """
+
+    def __init__(
+            self,
+            owner: str,
+            poll_interval: float = 1.0,
+            batch_size: int = 100,
+            visibility_timeout: int = 300,
+            max_attempts: int = 5
+    ):
+        self.owner = owner
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.handlers: Dict[str, Callable[[dict], Awaitable[Any]]] = {}
+        self.keys_provider: Optional[Callable[[], List[str]]] = None
+        self.running = False
+        self.last_cleanup: Optional[datetime] = None
+        self.last_extend: Optional[datetime] = None
+        self.in_flight: Set[UUID] = set()
+        self.completed: List[UUID] = []
+
+    def subscribe(self, topic: str, handler: Callable[[dict], Awaitable[Any]]) -> None:
+        self.handlers[topic] = handler
+
+    def _defer_ack(self, guid: UUID, task: asyncio.Future) -> None:
+        self.in_flight.add(guid)
+
+        def on_done(done: asyncio.Future) -> None:
+            self.in_flight.discard(guid)
+            # Прерванное задание (остановка воркера) не подтверждаем - его доставят снова
+            if not done.cancelled() and done.exception() is None:
+                self.completed.append(guid)
+
+        task.add_done_callback(on_done)
+
+    async def flush(self) -> None:
+        """Подтверждает завершенные фоновые задания и продлевает захват еще выполняющихся"""
+        if self.completed:
+            completed, self.completed = self.completed, []
+            await outbox_db.complete_events(completed, self.owner)
+
+        now = datetime.now()
+        if self.in_flight and (
+                self.last_extend is None
+                or (now - self.last_extend).total_seconds() >= self.visibility_timeout / 3
+        ):
+            self.last_extend = now
+            await outbox_db.extend_claims(list(self.in_flight), self.owner)
+
+    async def poll_once(self) -> int:
+        """Забирает и обрабатывает одну пачку событий. Возвращает количество событий"""
+        await self.flush()
+        keys = self.keys_provider() if self.keys_provider else None
+        events = await outbox_db.claim_events(
+            topics=list(self.handlers),
+            owner=self.owner,
+            limit=self.batch_size,
+            keys=keys,
+            visibility_timeout=self.visibility_timeout
+        )
+
+        completed = []
+        for event in events:
+            if event.attempts > self.max_attempts:
+                logger.error(f"☠️ Событие {event.topic} не обработано за {self.max_attempts} попыток, отбрасываю: {event.payload}")
+                completed.append(event.guid)
+                continue
+            try:
+                result = await self.handlers[event.topic](event.get_payload())
+            except Exception as e:
+                # Без подтверждения: событие вернется после visibility_timeout
+                logger.error(f"Ошибка обработки события {event.topic} (попытка {event.attempts}): {e}")
+                continue
+            if isinstance(result, asyncio.Future):
+                self._defer_ack(event.guid, result)
+            else:
+                completed.append(event.guid)
+
+        await outbox_db.complete_events(completed, self.owner)
+        return len(events)
+
+    async def _cleanup_if_needed(self) -> None:
+        now = datetime.now()
+        if self.last_cleanup and (now - self.last_cleanup).total_seconds() < 3600:
+            return
+        self.last_cleanup = now
+        removed = await outbox_db.cleanup_events(before=now - timedelta(days=1))
+        if removed:
+            logger.debug(f"🧹 Удалено устаревших событий шины: {removed}")
+
+    async def run(self) -> None:
+        self.running = True
+        logger.info(f"🚌 Шина событий запущена: {', '.join(self.handlers)}")
+
+        while self.running:
+            try:
+                processed = await self.poll_once()
+                await self._cleanup_if_needed()
+                if processed < self.batch_size:
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка в цикле шины событий: {e}")
+                await asyncio.sleep(5)
+
+        self.running = False
+
+    def stop(self) -> None:
+        self.running = False
@@ -1,12 +1,20 @@
 import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Set, Optional, List
 from dataclasses import dataclass
 from loguru import logger
-import random
+import time
 
-from core.models import channel as channel_db, tg_account as tg_account_db
-from auto_reposting import telegram_utils2
+from core import clock, metrics, tracing
+from core.loop_monitor import loop_monitor
+from core.models import channel as channel_db, tg_account as tg_account_db, account_usage as account_usage_db
+from auto_reposting import telegram_utils2, group_selection, affinity, stop_links
+from auto_reposting.account_scoring import account_scorer
+from auto_reposting.client_pool import client_pool
+from auto_reposting.connections import connections
+from auto_reposting.message_snapshot import MessageSnapshot
+from auto_reposting.reactions import reaction_fanout
+from auto_reposting.leases import lease_manager, channel_lease_key, account_lease_key
 from core.settings import json_settings
 
 
@@ -15,6 +23,8 @@ class ChannelTask:
     channel_id: int
     message_id: int
     timestamp: datetime
+    # Снимок поста от слушателя (None - задача пришла без него, сообщение запрашивается заново)
+    snapshot: Optional[MessageSnapshot] = None
 
 
 class ChannelWorker:
@@ -39,6 +49,8 @@ class ChannelWorker:
         
         # Кэш групп для каждого аккаунта
         self.account_groups_cache: Dict[int, Set[str]] = {}  
+        # Аккаунты, поставленные на паузу после доставки по affinity (до следующего обновления списка)
+        self.routed_paused: Set = set()
         
         self.logger = logger.bind(worker_id=worker_id, channel=channel_url)
         
@@ -46,19 +58,29 @@ class ChannelWorker:
         """Запуск воркера"""
         self.running = True
         self.logger.info(f"🚀 Воркер {self.worker_id} запущен для канала {self.channel_url}")
+
+        try:
+            await self.restore_rotation_state()
+        except Exception as e:
+            self.logger.error(f"Ошибка восстановления состояния ротации: {e}")
         
         while self.running:
             try:
-                task = await asyncio.wait_for(
+                task = await clock.wait_for(
                     self.task_queue.get(), 
                     timeout=10.0
                 )
                 
                 self.current_task = task
-                await self._process_channel_task_with_rotation(task)
+                task_started = time.perf_counter()
+                with tracing.trace("channel_task", channel=self.channel_url, message_id=task.message_id):
+                    await self._process_channel_task_with_rotation(task)
+                metrics.task_duration.observe(time.perf_counter() - task_started)
                 self.task_queue.task_done()
                 self.processed_count += 1
                 self.current_task = None
+                metrics.messages_processed.inc(channel=self.channel_url)
+                metrics.queue_depth.set(self.task_queue.qsize(), channel=self.channel_url)
                 
             except asyncio.TimeoutError:
                 continue
@@ -66,11 +88,11 @@ class ChannelWorker:
                 self.logger.error(f"Критическая ошибка в воркере: {e}")
                 self.error_count += 1
                 self.current_task = None
-                await asyncio.sleep(1)
+                await clock.sleep(1)
     
     async def refresh_available_accounts(self):
         """Обновляет список доступных аккаунтов (только если прошло время)"""
-        now = datetime.now()
+        now = clock.now()
         
         # Обновляем список аккаунтов каждые 5 минут или при первом запуске
         if (self.last_accounts_refresh is None or 
@@ -78,6 +100,8 @@ class ChannelWorker:
             
             self.available_accounts = await tg_account_db.get_working_accounts_by_channel(self.channel_guid)
             self.last_accounts_refresh = now
+            self.routed_paused.clear()
+            self._rank_accounts()
             
             self.logger.info(f"🔄 Обновлен список аккаунтов: {len(self.available_accounts)} доступно")
             
@@ -87,6 +111,67 @@ class ChannelWorker:
                 self.current_account_reposts = 0
                 self.logger.info("🔄 Сброшен индекс аккаунтов")
     
+    def _rank_accounts(self):
+        """Текущий аккаунт первым, остальные по убыванию оценки - следующим в ротации будет лучший"""
+        current_guid = self.current_account.guid if self.current_account else None
+        current = [account for account in self.available_accounts if account.guid == current_guid]
+        others = account_scorer.rank(account for account in self.available_accounts if account.guid != current_guid)
+        self.available_accounts = current + others
+        self.current_account_index = 0
+
+    async def _get_usage_window_start(self) -> datetime:
+        """Начало скользящего окна, в котором считаются репосты аккаунтов"""
+        try:
+            usage_window = await json_settings.async_get_attribute("account_usage_window")
+        except:
+            usage_window = 86400
+        return clock.now() - timedelta(seconds=usage_window)
+
+    async def _load_account_usage(self, account) -> int:
+        """Сколько репостов аккаунт уже сделал в текущем окне (из БД)"""
+        try:
+            counts = await account_usage_db.get_account_usage_counts(
+                [account.guid], since=await self._get_usage_window_start()
+            )
+            return counts.get(account.guid, 0)
+        except Exception as e:
+            self.logger.error(f"Ошибка чтения счетчика репостов +{account.phone_number}: {e}")
+            return 0
+
+    async def restore_rotation_state(self):
+        """Восстанавливает индекс и счетчик ротации из БД после перезапуска"""
+        await self.refresh_available_accounts()
+        if not self.available_accounts:
+            return
+
+        guids = [account.guid for account in self.available_accounts]
+        since = await self._get_usage_window_start()
+        last_used_guid = await account_usage_db.get_last_used_account_guid(guids, since=since)
+        if last_used_guid is None:
+            return
+
+        self.current_account_index = guids.index(last_used_guid)
+        account = self.available_accounts[self.current_account_index]
+        # Текущим аккаунт становится только вместе с арендой: без нее им может работать другой узел
+        if not await lease_manager.try_acquire(account_lease_key(account.guid)):
+            self.logger.info(f"🔒 Аккаунт +{account.phone_number} из сохраненной ротации занят другим узлом")
+            return
+        self.current_account = account
+        self.current_account_reposts = await self._load_account_usage(self.current_account)
+
+        self.logger.info(
+            f"♻️ Ротация восстановлена: аккаунт +{self.current_account.phone_number}, "
+            f"репостов в окне: {self.current_account_reposts}"
+        )
+
+    async def _pause_account(self, account, pause_after_rate_reposts: int):
+        """Ставит аккаунт на паузу и обнуляет его сохраненный бюджет"""
+        await tg_account_db.add_pause(account, pause_after_rate_reposts)
+        try:
+            await account_usage_db.reset_account_usage(account.guid)
+        except Exception as e:
+            self.logger.error(f"Ошибка сброса счетчика репостов +{account.phone_number}: {e}")
+
     async def get_current_working_account(self):
         await self.refresh_available_accounts()
         
@@ -109,11 +194,12 @@ class ChannelWorker:
                 self.current_account_reposts > 0):
                 
                 old_account = self.available_accounts[self.current_account_index]
-                await tg_account_db.add_pause(old_account, pause_after_rate_reposts)
+                await self._pause_account(old_account, pause_after_rate_reposts)
                 
                 self.logger.warning(f"⏸️ Аккаунт +{old_account.phone_number} достиг лимита ({self.current_account_reposts}), пауза {pause_after_rate_reposts//60} мин")
             
-            # Переключаемся на следующий аккаунт
+            # Переключаемся на следующий аккаунт (лучший по оценке)
+            self._rank_accounts()
             self.current_account_index += 1
             self.current_account_reposts = 0
         
@@ -127,40 +213,77 @@ class ChannelWorker:
                 self.current_account_index = 0
                 
             candidate_account = self.available_accounts[self.current_account_index]
+
+            # 🔒 Аккаунтом может управлять только один узел. Текущий аккаунт воркер уже держит
+            is_current = self.current_account is not None and candidate_account.guid == self.current_account.guid
+            if not is_current and not await lease_manager.try_acquire(account_lease_key(candidate_account.guid)):
+                self.logger.info(f"🔒 Аккаунт +{candidate_account.phone_number} занят другим узлом, пропускаем")
+                self.current_account_index += 1
+                attempts += 1
+                continue
+
+            # 💾 Новый аккаунт в ротации продолжает свой сохраненный бюджет, а не начинает с нуля
+            if not is_current:
+                self.current_account_reposts = await self._load_account_usage(candidate_account)
+                if self.current_account_reposts >= number_reposts_before_pause:
+                    await self._pause_account(candidate_account, pause_after_rate_reposts)
+                    self.logger.warning(f"⏸️ Аккаунт +{candidate_account.phone_number} уже израсходовал лимит ({self.current_account_reposts}), пауза {pause_after_rate_reposts//60} мин")
+                    await self._release_candidate(candidate_account)
+                    self.current_account_index += 1
+                    self.current_account_reposts = 0
+                    attempts += 1
+                    continue
             
             # Простая проверка - пробуем создать клиент
             test_client = await telegram_utils2.create_tg_client(candidate_account)
             if test_client:
                 try:
                     # Быстрая проверка доступности методов
-                    async with test_client:
+                    async with connections.session(test_client):
                         await test_client.get_me()
                     
+                    if self.current_account and not is_current:
+                        await lease_manager.release(account_lease_key(self.current_account.guid))
                     self.current_account = candidate_account
                     self.logger.info(f"✅ Выбран аккаунт +{candidate_account.phone_number} (попытка {attempts + 1})")
                     return candidate_account
                     
                 except Exception as e:
                     self.logger.warning(f"⚠️ Аккаунт +{candidate_account.phone_number} недоступен: {e}")
+                    await self._release_candidate(candidate_account)
                     # Переходим к следующему
                     self.current_account_index += 1
                     attempts += 1
                     continue
             else:
                 self.logger.warning(f"⚠️ Не удалось создать клиент для +{candidate_account.phone_number}")
+                await self._release_candidate(candidate_account)
                 self.current_account_index += 1
                 attempts += 1
                 continue
         
         # Если никого не нашли - ждем и пробуем снова
         self.logger.error("❌ Все аккаунты недоступны, жду 5 минут")
-        await asyncio.sleep(300)
+        await clock.sleep(300)
         await self.refresh_available_accounts()
         self.current_account_index = 0
         
         return None
 
 
+    async def _release_candidate(self, account: tg_account_db.TGAccount) -> None:
+        """Отпускает аренду аккаунта, не прошедшего проверку. Текущий аккаунт при этом сбрасывается"""
+        if self.current_account is not None and self.current_account.guid == account.guid:
+            self.current_account = None
+        await lease_manager.release(account_lease_key(account.guid))
+
+    def drop_lost_account(self, lost: Set[str]) -> None:
+        """Аренду текущего аккаунта перехватил другой узел - работать им больше нельзя"""
+        if self.current_account is not None and account_lease_key(self.current_account.guid) in lost:
+            self.logger.warning(f"🔓 Аккаунт +{self.current_account.phone_number} перешел другому узлу")
+            self.current_account = None
+            self.current_account_reposts = 0
+
     async def handle_account_error(self, error_message: str):
         if self.current_account:
             self.logger.warning(f"🔄 Ошибка у аккаунта +{self.current_account.phone_number}: {error_message}")
@@ -168,6 +291,7 @@ class ChannelWorker:
             # Если FROZEN_METHOD_INVALID - переключаемся немедленно
             if "FROZEN_METHOD_INVALID" in error_message:
                 self.logger.warning(f"🧊 У аккаунта +{self.current_account.phone_number} заморожены методы, переключаюсь")
+                self._rank_accounts()
                 self.current_account_index += 1
                 self.current_account_reposts = 0  # Сбрасываем счетчик только при принудительном переключении
                 return await self.get_current_working_account()
@@ -179,35 +303,156 @@ class ChannelWorker:
         self.current_account_reposts += 1
         
         if self.current_account:
+            try:
+                await account_usage_db.add_account_usage(self.current_account.guid, self.channel_guid)
+            except Exception as e:
+                self.logger.error(f"Ошибка сохранения счетчика репостов: {e}")
             self.logger.debug(f"📊 Репостов у +{self.current_account.phone_number}: {self.current_account_reposts}")
-    
+
+    async def _try_routed_delivery(self, group, channel, task: ChannelTask, group_logger) -> bool:
+        """
+        Доставка аккаунтом, который уже состоит в группе или является ее домашним (affinity).
+        Текущий аккаунт ротации не меняется. False - доставлять обычным путем через ротацию.
+        """
+        try:
+            replicas = await json_settings.async_get_attribute("group_affinity_replicas")
+            number_reposts_before_pause = await json_settings.async_get_attribute("number_reposts_before_pause")
+            pause_after_rate_reposts = await json_settings.async_get_attribute("pause_after_rate_reposts")
+        except:
+            replicas = affinity.DEFAULT_REPLICAS
+            number_reposts_before_pause = 15
+            pause_after_rate_reposts = 3600
+        if not replicas or len(self.available_accounts) < 2:
+            return False
+
+        await affinity.membership_registry.ensure_loaded(account.phone_number for account in self.available_accounts)
+        current_guid = self.current_account.guid if self.current_account else None
+        routes = affinity.route_accounts(group.url, self.available_accounts, replicas)
+        if any(account.guid == current_guid for account in routes):
+            return False  # текущий аккаунт и так подходит
+
+        for account in routes:
+            key = account_lease_key(account.guid)
+            if account.guid in self.routed_paused:
+                continue
+            if lease_manager.holds(key):
+                continue  # аккаунт занят другим воркером этого узла
+            if await self._load_account_usage(account) >= number_reposts_before_pause:
+                continue
+            if not await lease_manager.try_acquire(key):
+                continue
+
+            try:
+                # Клиент из пула: маршрутизированный репост не делает start()/get_me() на каждую группу
+                async with client_pool.client(account) as telegram_client:
+                    if not telegram_client:
+                        continue
+                    async with connections.session(telegram_client):  # вступление и репост - одним подключением
+                        joined = await telegram_utils2.checking_and_joining_if_possible(
+                            telegram_client=telegram_client,
+                            url=group.url,
+                            channel=channel
+                        )
+                        if not joined:
+                            continue  # следующая реплика группы
+                        delivered = await telegram_utils2.repost_in_group_by_message_id(
+                            message_id=task.message_id,
+                            telegram_client=telegram_client,
+                            telegram_channel_id=channel.telegram_channel_id,
+                            channel_url=channel.url,
+                            group_url=group.url,
+                            snapshot=task.snapshot
+                        )
+
+                if not delivered:
+                    continue
+
+                metrics.routed_deliveries.inc()
+                await account_usage_db.add_account_usage(account.guid, self.channel_guid)
+                if await self._load_account_usage(account) >= number_reposts_before_pause:
+                    await self._pause_account(account, pause_after_rate_reposts)
+                    self.routed_paused.add(account.guid)
+                group_logger.bind(category="repost").success(
+                    "✅ Репост в {group} аккаунтом группы +{phone}", group=group.url, phone=account.phone_number
+                )
+                return True
+            except Exception as e:
+                account_scorer.record_failure(account.phone_number)
+                group_logger.warning(
+                    "⚠️ Репост в {group} аккаунтом группы +{phone} не удался: {error}",
+                    group=group.url, phone=account.phone_number, error=e
+                )
+            finally:
+                await lease_manager.release(key)
+
+        return False
+
+    async def _record_repost(self, channel, task: ChannelTask, group_logger):
+        try:
+            from core.schemas import repost as repost_schemas
+            from core.models import repost as repost_db
+            with tracing.span("db_write"):
+                await repost_db.create_repost(
+                    repost_in=repost_schemas.RepostCreate(
+                        channel_guid=channel.guid,
+                        repost_message_id=task.message_id,
+                        created_at=clock.now().date()
+                    )
+                )
+        except Exception as db_error:
+            group_logger.debug("Ошибка записи в БД: {error}", error=db_error)
+
+    async def _check_stop_links_in_snapshot(self, channel, snapshot: MessageSnapshot, task_logger) -> bool:
+        """Проверяет стоп-ссылки по снимку сообщения (без запроса к Telegram)"""
+        try:
+            matcher = await stop_links.load_matcher()
+            stop_link = matcher.find_in_snapshot(snapshot)
+            if not stop_link:
+                return False
+
+            task_logger.info(f"🚫 В сообщении найдена стоп-ссылка: {stop_link}")
+            current_account = await self.get_current_working_account()
+            if current_account:
+                reaction_fanout.submit(
+                    tg_accounts=[current_account],
+                    message_id=snapshot.id,
+                    channel_url=channel.url,
+                    emoji_reaction=await json_settings.async_get_attribute("reaction")
+                )
+                task_logger.info("❤️ Реакции на сообщение со стоп-ссылкой ставятся в фоне")
+            return True
+
+        except Exception as e:
+            task_logger.error(f"Ошибка при проверке стоп-ссылок: {e}")
+            return False
+
     async def _check_stop_links_in_message(self, telegram_client, channel, message_id, tg_accounts, task_logger) -> bool:
         """Проверяет стоп-ссылки в сообщении"""
         try:
-            stop_links = await json_settings.async_get_attribute("stop_links")
-            if not stop_links:
+            matcher = await stop_links.load_matcher()
+            if matcher.regex is None:
                 return False
 
-            async with telegram_client:
+            async with connections.session(telegram_client):
                 message = await telegram_client.get_messages(channel.telegram_channel_id, ids=message_id)
                 
-                if not message or not message.message:
+                if not message:
                     return False
 
-                for stop_link in stop_links:
-                    if stop_link in message.message:
-                        task_logger.info(f"🚫 В сообщении найдена стоп-ссылка: {stop_link}")
-                        
-                        # Ставим реакции
-                        await telegram_utils2.send_reaction_with_accounts_on_message(
-                            tg_accounts=tg_accounts,
-                            message=message,
-                            channel_url=channel.url,
-                            emoji_reaction=await json_settings.async_get_attribute("reaction")
-                        )
-                        
-                        task_logger.success("❤️ Реакции поставлены на сообщение со стоп-ссылкой")
-                        return True
+                stop_link = matcher.find_in_message(message)
+                if stop_link:
+                    task_logger.info(f"🚫 В сообщении найдена стоп-ссылка: {stop_link}")
+
+                    # Реакции ставим в фоне, очередь канала не ждет
+                    reaction_fanout.submit(
+                        tg_accounts=tg_accounts,
+                        message_id=message.id,
+                        channel_url=channel.url,
+                        emoji_reaction=await json_settings.async_get_attribute("reaction")
+                    )
+
+                    task_logger.info("❤️ Реакции на сообщение со стоп-ссылкой ставятся в фоне")
+                    return True
 
             return False
             
@@ -216,7 +461,7 @@ class ChannelWorker:
             return False
     
     async def _process_channel_task_with_rotation(self, task: ChannelTask):
-        start_time = datetime.now()
+        start_time = clock.now()
         task_logger = self.logger.bind(msg_id=task.message_id)
         
         try:
@@ -226,13 +471,6 @@ class ChannelWorker:
                 task_logger.error(f"Канал {task.channel_id} не найден в БД")
                 return
             
-            # Получаем группы канала
-            from core.models import group as group_db
-            all_groups = await group_db.get_all_groups_by_channel_guid(self.channel_guid)
-            if not all_groups:
-                task_logger.warning("Нет групп для репостинга")
-                return
-            
             # Ограничиваем количество групп
             try:
                 max_groups = await json_settings.async_get_attribute("max_groups_per_post")
@@ -243,19 +481,30 @@ class ChannelWorker:
                 delay_between_groups = 120
                 check_stop_links = True
             
-            selected_groups = random.sample(all_groups, min(max_groups, len(all_groups)))
-            task_logger.info(f"📊 Выбрано {len(selected_groups)} из {len(all_groups)} групп")
+            # Взвешенная ротация по охвату и успешности (без групп на карантине и в медленном режиме)
+            selected_groups, available_count = await group_selection.select_groups_for_channel(self.channel_guid, max_groups)
+            if not selected_groups:
+                task_logger.warning("Нет доступных групп для репостинга")
+                return
+            task_logger.info(f"📊 Выбрано {len(selected_groups)} из {available_count} групп")
             
-            # Проверяем стоп-ссылки (пропускаем если есть проблемы)
-            if check_stop_links:
+            # Проверяем стоп-ссылки: по снимку от слушателя без RPC, иначе запрашиваем сообщение
+            if check_stop_links and task.snapshot is not None:
+                with tracing.span("stop_links"):
+                    stop_links_found = await self._check_stop_links_in_snapshot(channel, task.snapshot, task_logger)
+                if stop_links_found:
+                    task_logger.info("🛑 Найдены стоп-ссылки, обработка завершена")
+                    return
+            elif check_stop_links:
                 current_account = await self.get_current_working_account()
                 if current_account:
                     temp_client = await telegram_utils2.create_tg_client(current_account)
                     if temp_client:
                         try:
-                            stop_links_found = await self._check_stop_links_in_message(
-                                temp_client, channel, task.message_id, [current_account], task_logger
-                            )
+                            with tracing.span("stop_links"):
+                                stop_links_found = await self._check_stop_links_in_message(
+                                    temp_client, channel, task.message_id, [current_account], task_logger
+                                )
                             if stop_links_found:
                                 task_logger.info("🛑 Найдены стоп-ссылки, обработка завершена")
                                 return
@@ -268,112 +517,126 @@ class ChannelWorker:
             successful_reposts = 0
             
             for i, group in enumerate(selected_groups, 1):
-                group_logger = task_logger.bind(group_idx=i, total=len(selected_groups))
+                with tracing.span("group", url=group.url):
+                    group_logger = task_logger.bind(group_idx=i, total=len(selected_groups))
                 
-                try:
-                    # Получаем текущий рабочий аккаунт
-                    working_account = await self.get_current_working_account()
-                    if not working_account:
-                        group_logger.error("❌ Нет доступных аккаунтов")
-                        break
+                    try:
+                        # Получаем текущий рабочий аккаунт
+                        with tracing.span("select_account"):
+                            working_account = await self.get_current_working_account()
+                        if not working_account:
+                            group_logger.error("❌ Нет доступных аккаунтов")
+                            break
                     
-                    group_logger.info(f"🎯 Группа {i}: {group.url} (аккаунт +{working_account.phone_number}, репост #{self.current_account_reposts + 1})")
+                        group_logger.bind(category="group_attempt").info(
+                            "🎯 Группа {group_idx}: {group} (аккаунт +{phone}, репост #{repost_number})",
+                            group_idx=i, group=group.url, phone=working_account.phone_number, repost_number=self.current_account_reposts + 1
+                        )
                     
-                    # 🔄 ПРОБУЕМ НЕСКОЛЬКО АККАУНТОВ ДЛЯ ОДНОЙ ГРУППЫ
-                    repost_success = False
-                    account_attempts = 0
-                    max_account_attempts = min(3, len(self.available_accounts))  # Максимум 3 попытки с разными аккаунтами
+                        # 🏠 Сначала аккаунт, который уже состоит в группе или закреплен за ней
+                        with tracing.span("route"):
+                            repost_success = await self._try_routed_delivery(group, channel, task, group_logger)
+                        if repost_success:
+                            metrics.reposts_total.inc(result="success")
+                            successful_reposts += 1
+                            await self._record_repost(channel, task, group_logger)
+
+                        # 🔄 ПРОБУЕМ НЕСКОЛЬКО АККАУНТОВ ДЛЯ ОДНОЙ ГРУППЫ
+                        account_attempts = 0
+                        max_account_attempts = min(3, len(self.available_accounts))  # Максимум 3 попытки с разными аккаунтами
                     
-                    while not repost_success and account_attempts < max_account_attempts:
-                        # Создаем клиент
-                        telegram_client = await telegram_utils2.create_tg_client(working_account)
-                        if not telegram_client:
-                            group_logger.warning(f"⚠️ Не удалось создать клиент для +{working_account.phone_number}")
-                            # Переключаемся на следующий аккаунт
-                            await self.handle_account_error("Client creation failed")
-                            working_account = await self.get_current_working_account()
-                            account_attempts += 1
-                            continue
-                        
-                        try:
-                            # Вступаем в группу
-                            join_success = await telegram_utils2.checking_and_joining_if_possible(
-                                telegram_client=telegram_client,
-                                url=group.url,
-                                channel=channel
-                            )
-                            
-                            if not join_success:
-                                group_logger.warning(f"⚠️ Не удалось вступить в группу {group.url} с +{working_account.phone_number}")
-                                # Проверяем - если это FROZEN_METHOD_INVALID, переключаемся
-                                await self.handle_account_error("Join failed - possibly FROZEN_METHOD_INVALID")
+                        while not repost_success and account_attempts < max_account_attempts:
+                            # Создаем клиент
+                            telegram_client = await telegram_utils2.create_tg_client(working_account)
+                            if not telegram_client:
+                                group_logger.warning("⚠️ Не удалось создать клиент для +{phone}", phone=working_account.phone_number)
+                                # Переключаемся на следующий аккаунт
+                                await self.handle_account_error("Client creation failed")
                                 working_account = await self.get_current_working_account()
                                 account_attempts += 1
-                            else:
-                                # Делаем репост
-                                repost_result = await telegram_utils2.repost_in_group_by_message_id(
-                                    message_id=task.message_id,
+                                continue
+                        
+                            try:
+                                # Вступление и репост идут через одно подключение
+                                await connections.acquire(telegram_client)
+
+                                # Вступаем в группу
+                                join_success = await telegram_utils2.checking_and_joining_if_possible(
                                     telegram_client=telegram_client,
-                                    telegram_channel_id=channel.telegram_channel_id,
-                                    channel_url=channel.url,
-                                    group_url=group.url
+                                    url=group.url,
+                                    channel=channel
                                 )
+                            
+                                if not join_success:
+                                    metrics.reposts_total.inc(result="join_failed")
+                                    group_logger.bind(category="join").warning("⚠️ Не удалось вступить в группу {group} с +{phone}", group=group.url, phone=working_account.phone_number)
+                                    # Проверяем - если это FROZEN_METHOD_INVALID, переключаемся
+                                    await self.handle_account_error("Join failed - possibly FROZEN_METHOD_INVALID")
+                                    working_account = await self.get_current_working_account()
+                                    account_attempts += 1
+                                else:
+                                    # Делаем репост
+                                    repost_result = await telegram_utils2.repost_in_group_by_message_id(
+                                        message_id=task.message_id,
+                                        telegram_client=telegram_client,
+                                        telegram_channel_id=channel.telegram_channel_id,
+                                        channel_url=channel.url,
+                                        group_url=group.url,
+                                        snapshot=task.snapshot
+                                    )
                                 
-                                if repost_result:
-                                    successful_reposts += 1
-                                    await self.increment_account_reposts()
-                                    repost_success = True
-                                    
-                                    group_logger.success(f"✅ Репост успешен с +{working_account.phone_number} (#{self.current_account_reposts})")
+                                    if repost_result:
+                                        metrics.reposts_total.inc(result="success")
+                                        successful_reposts += 1
+                                        await self.increment_account_reposts()
+                                        repost_success = True
                                     
-                                    # Записываем в БД
-                                    try:
-                                        from core.schemas import repost as repost_schemas
-                                        from core.models import repost as repost_db
-                                        await repost_db.create_repost(
-                                            repost_in=repost_schemas.RepostCreate(
-                                                channel_guid=channel.guid,
-                                                repost_message_id=task.message_id,
-                                                created_at=datetime.now().date()
-                                            )
+                                        group_logger.bind(category="repost").success(
+                                            "✅ Репост успешен с +{phone} (#{repost_number})",
+                                            phone=working_account.phone_number, repost_number=self.current_account_reposts
                                         )
-                                    except Exception as db_error:
-                                        group_logger.debug(f"Ошибка записи в БД: {db_error}")
-                                else:
-                                    group_logger.warning(f"❌ Репост не удался с +{working_account.phone_number}")
-                                    account_attempts += 1
                                     
-                        except Exception as group_error:
-                            error_str = str(group_error)
-                            group_logger.error(f"❌ Ошибка при работе с группой {group.url}: {group_error}")
+                                        # Записываем в БД
+                                        await self._record_repost(channel, task, group_logger)
+                                    else:
+                                        metrics.reposts_total.inc(result="failed")
+                                        group_logger.bind(category="repost").warning("❌ Репост не удался с +{phone}", phone=working_account.phone_number)
+                                        account_attempts += 1
+                                    
+                            except Exception as group_error:
+                                error_str = str(group_error)
+                                group_logger.error(f"❌ Ошибка при работе с группой {group.url}: {group_error}")
+                                metrics.reposts_total.inc(result="error")
                             
-                            # Если FROZEN_METHOD_INVALID - переключаемся на другой аккаунт
-                            if "FROZEN_METHOD_INVALID" in error_str:
-                                await self.handle_account_error(error_str)
-                                working_account = await self.get_current_working_account()
+                                # Если FROZEN_METHOD_INVALID - переключаемся на другой аккаунт
+                                if "FROZEN_METHOD_INVALID" in error_str:
+                                    await self.handle_account_error(error_str)
+                                    working_account = await self.get_current_working_account()
                             
-                            account_attempts += 1
+                                account_attempts += 1
                             
-                        finally:
-                            # ОБЯЗАТЕЛЬНО закрываем клиент
-                            try:
-                                await telegram_client.disconnect()
-                            except:
-                                pass
+                            finally:
+                                # ОБЯЗАТЕЛЬНО закрываем клиент
+                                try:
+                                    await connections.close(telegram_client)
+                                except:
+                                    pass
                     
-                    if not repost_success:
-                        group_logger.warning(f"⚠️ Не удалось сделать репост в {group.url} после {account_attempts} попыток")
+                        if not repost_success:
+                            group_logger.warning("⚠️ Не удалось сделать репост в {group} после {attempts} попыток", group=group.url, attempts=account_attempts)
                     
-                    # Пауза между группами
-                    if i < len(selected_groups):
-                        await asyncio.sleep(delay_between_groups)
+                        # Пауза между группами
+                        if i < len(selected_groups):
+                            with tracing.span("sleep"):
+                                await clock.sleep(delay_between_groups)
                             
-                except Exception as group_error:
-                    group_logger.error(f"Критическая ошибка при обработке группы {group.url}: {group_error}")
-                    await asyncio.sleep(delay_between_groups // 2)
+                    except Exception as group_error:
+                        group_logger.error(f"Критическая ошибка при обработке группы {group.url}: {group_error}")
+                        with tracing.span("sleep"):
+                            await clock.sleep(delay_between_groups // 2)
             
             # Финальная статистика
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = (clock.now() - start_time).total_seconds()
             success_rate = (successful_reposts / len(selected_groups) * 100) if selected_groups else 0
             
             task_logger.success(f"🎉 Обработка завершена: {successful_reposts}/{len(selected_groups)} ({success_rate:.1f}%) за {processing_time:.1f}с")
@@ -382,23 +645,29 @@ class ChannelWorker:
                 task_logger.info(f"📊 Общих репостов у аккаунта +{self.current_account.phone_number}: {self.current_account_reposts}")
                 
         except Exception as e:
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = (clock.now() - start_time).total_seconds()
             task_logger.error(f"❌ Критическая ошибка: {e}")
             self.error_count += 1
     
-    async def add_task(self, channel_id: int, message_id: int) -> bool:
+    async def add_task(self, channel_id: int, message_id: int, snapshot: Optional[MessageSnapshot] = None) -> bool:
         """Добавить задачу в очередь канала"""
         try:
             task = ChannelTask(
                 channel_id=channel_id,
                 message_id=message_id,
-                timestamp=datetime.now()
+                timestamp=clock.now(),
+                snapshot=snapshot
             )
             
             self.task_queue.put_nowait(task)
             
             queue_size = self.task_queue.qsize()
-            self.logger.info(f"➕ Сообщение {message_id} добавлено в очередь. Размер: {queue_size}")
+            metrics.messages_queued.inc(channel=self.channel_url)
+            metrics.queue_depth.set(queue_size, channel=self.channel_url)
+            self.logger.bind(category="queue").info(
+                "➕ Сообщение {message_id} добавлено в очередь. Размер: {queue_size}",
+                message_id=message_id, queue_size=queue_size
+            )
             
             return True
             
@@ -452,7 +721,8 @@ class ChannelProcessor:
         self.channel_workers: Dict[str, ChannelWorker] = {}
         self.worker_tasks: Dict[str, asyncio.Task] = {}
         self.running = False
-        self.start_time = datetime.now()
+        self.start_time = clock.now()
+        self.lease_task: Optional[asyncio.Task] = None
         
         # Защита от дублей
         self.processing_messages: Dict[str, Set[tuple]] = {}
@@ -469,8 +739,9 @@ class ChannelProcessor:
             return False
     
     async def start(self):
-        """Запуск воркеров для каналов с аккаунтами"""
+        """Запуск воркеров для каналов с аккаунтами, арендованных этим узлом"""
         self.running = True
+        self.lease_task = asyncio.create_task(self._lease_heartbeat_loop())
         
         channels = await channel_db.get_channels()
         if not channels:
@@ -484,6 +755,10 @@ class ChannelProcessor:
             channel_guid = str(channel.guid)
             
             if await self._channel_has_accounts(channel_guid):
+                if not await lease_manager.try_acquire(channel_lease_key(channel_guid)):
+                    logger.info(f"🔒 Канал {channel.url} обслуживается другим узлом")
+                    continue
+
                 worker = ChannelWorker(
                     channel_guid=channel_guid,
                     channel_url=channel.url,
@@ -511,6 +786,10 @@ class ChannelProcessor:
             
         if not await self._channel_has_accounts(channel_guid):
             return False
+
+        if not await lease_manager.try_acquire(channel_lease_key(channel_guid)):
+            logger.debug(f"🔒 Канал {channel_guid} обслуживается другим узлом")
+            return False
         
         try:
             channel = await channel_db.get_channel_by_guid(channel_guid)
@@ -545,6 +824,13 @@ class ChannelProcessor:
         if await self._channel_has_accounts(channel_guid):
             return False
         
+        if await self._stop_worker(channel_guid):
+            logger.info(f"🗑️ Воркер канала {channel_guid} удален - нет аккаунтов")
+            return True
+        return False
+
+    async def _stop_worker(self, channel_guid: str) -> bool:
+        """Останавливает воркер канала и освобождает аренды канала и его аккаунта"""
         try:
             worker = self.channel_workers[channel_guid]
             worker.stop()
@@ -558,15 +844,43 @@ class ChannelProcessor:
             del self.channel_workers[channel_guid]
             if channel_guid in self.processing_messages:
                 del self.processing_messages[channel_guid]
-            
-            logger.info(f"🗑️ Воркер канала {worker.channel_url} удален - нет аккаунтов")
+
+            if worker.current_account:
+                await lease_manager.release(account_lease_key(worker.current_account.guid))
+            await lease_manager.release(channel_lease_key(channel_guid))
             return True
             
         except Exception as e:
             logger.error(f"Ошибка удаления воркера канала {channel_guid}: {e}")
             return False
+
+    async def _lease_heartbeat_loop(self):
+        """Продлевает аренды узла и подхватывает каналы, брошенные другими узлами"""
+        while self.running:
+            try:
+                await clock.sleep(lease_manager.heartbeat_interval)
+
+                lost = await lease_manager.heartbeat()
+                for channel_guid, worker in list(self.channel_workers.items()):
+                    if channel_lease_key(channel_guid) in lost:
+                        logger.warning(f"🔓 Канал {channel_guid} перешел другому узлу, останавливаю воркер")
+                        await self._stop_worker(channel_guid)
+                    else:
+                        worker.drop_lost_account(lost)
+
+                for channel in await channel_db.get_channels():
+                    channel_guid = str(channel.guid)
+                    if channel_guid not in self.channel_workers:
+                        await self.ensure_worker_for_channel(channel_guid)
+                    else:
+                        await self.remove_worker_if_no_accounts(channel_guid)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка продления аренд: {e}")
     
-    async def add_message(self, channel_id: int, message_id: int) -> bool:
+    async def add_message(self, channel_id: int, message_id: int, snapshot: Optional[MessageSnapshot] = None) -> bool:
         """Добавляет сообщение в очередь канала"""
         if not self.running:
             logger.error("❌ Процессор не запущен!")
@@ -579,9 +893,10 @@ class ChannelProcessor:
                 return False
             
             channel_guid = str(channel.guid)
+            metrics.messages_received.inc(channel=channel.url)
             
             if not await self.ensure_worker_for_channel(channel_guid):
-                logger.warning(f"❌ Не удалось создать воркер для канала {channel.url}")
+                logger.warning(f"❌ Не удалось создать воркер для канала {channel.url} (нет аккаунтов или канал у другого узла)")
                 return False
             
             if channel_guid not in self.channel_workers:
@@ -596,7 +911,7 @@ class ChannelProcessor:
             
             # Добавляем в очередь
             worker = self.channel_workers[channel_guid]
-            success = await worker.add_task(channel_id, message_id)
+            success = await worker.add_task(channel_id, message_id, snapshot)
             
             if success:
                 self.processing_messages[channel_guid].add(message_key)
@@ -616,7 +931,7 @@ class ChannelProcessor:
     async def _cleanup_processed_message(self, channel_guid: str, message_key: tuple, delay: int):
         """Удаляет сообщение из защиты от дублей"""
         try:
-            await asyncio.sleep(delay)
+            await clock.sleep(delay)
             if channel_guid in self.processing_messages:
                 self.processing_messages[channel_guid].discard(message_key)
         except Exception as e:
@@ -635,7 +950,7 @@ class ChannelProcessor:
         
         total_processed = sum(worker.processed_count for worker in self.channel_workers.values())
         total_errors = sum(worker.error_count for worker in self.channel_workers.values())
-        uptime = (datetime.now() - self.start_time).total_seconds()
+        uptime = (clock.now() - self.start_time).total_seconds()
         
         workers_stats = [worker.get_stats() for worker in self.channel_workers.values()]
         
@@ -658,6 +973,9 @@ class ChannelProcessor:
             'total_errors': total_errors,
             'success_rate': (total_processed / (total_processed + total_errors) * 100) if (total_processed + total_errors) > 0 else 0,
             'messages_per_hour': (total_processed / (uptime / 3600)) if uptime > 0 else 0,
+            'node_id': lease_manager.owner,
+            'held_leases': len(lease_manager.held),
+            'event_loop': loop_monitor.get_stats(),
             'rotation_stats': {
                 'total_account_reposts': total_account_reposts,
                 'active_accounts': active_accounts
@@ -671,6 +989,9 @@ class ChannelProcessor:
             return
             
         logger.info("🛑 Останавливаю все воркеры...")
+
+        if self.lease_task and not self.lease_task.done():
+            self.lease_task.cancel()
         
         # Останавливаем воркеры
         for worker in self.channel_workers.values():
@@ -679,7 +1000,7 @@ class ChannelProcessor:
         # Ждем очистки очередей
         for channel_guid, worker in self.channel_workers.items():
             try:
-                await asyncio.wait_for(worker.task_queue.join(), timeout=60.0)
+                await clock.wait_for(worker.task_queue.join(), timeout=60.0)
                 logger.debug(f"✅ Очередь канала {worker.channel_url} очищена")
             except asyncio.TimeoutError:
                 logger.warning(f"⚠️ Таймаут очистки очереди канала {worker.channel_url}")
@@ -705,6 +1026,7 @@ class ChannelProcessor:
         self.channel_workers.clear()
         self.worker_tasks.clear()
         self.processing_messages.clear()
+        await lease_manager.release_all()
 
 
 # Глобальный экземпляр процессора
@@ -0,0 +1,100 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+from loguru import logger
+from opentele.tl import TelegramClient
+
+from core import clock
+from core.models import tg_account as tg_account_db
+from . import telegram_utils2
+
+
+@dataclass
+class _PooledClient:
+    client: TelegramClient
+    string_session: str
+    last_used: float
+
+
+class ClientPool:
+    """
+    Держит залогиненные клиенты аккаунтов между вызовами: повторное использование
+    не делает start()/get_me(). Один аккаунт - один клиент, вызовы по аккаунту идут по очереди.
+    """
+
+    def __init__(self, idle_ttl: float = 300.0):
+        self.idle_ttl = idle_ttl
+        self._entries: Dict[int, _PooledClient] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _check_loop(self) -> None:
+        """Клиенты и блокировки привязаны к event loop: после перезапуска сервиса пул начинается заново"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._entries.clear()
+            self._locks.clear()
+            self._loop = loop
+
+    def _evict_idle(self) -> None:
+        now = clock.monotonic()
+        for phone_number, entry in list(self._entries.items()):
+            lock = self._locks.get(phone_number)
+            if now - entry.last_used > self.idle_ttl and not (lock and lock.locked()):
+                self._entries.pop(phone_number, None)
+
+    async def _get_entry(self, tg_account: tg_account_db.TGAccount) -> Optional[_PooledClient]:
+        phone_number = tg_account.phone_number
+        entry = self._entries.get(phone_number)
+        if entry is None or entry.string_session != tg_account.string_session:
+            client = await telegram_utils2.create_tg_client(tg_account)
+            if client is None:
+                self._entries.pop(phone_number, None)
+                return None
+            entry = _PooledClient(client=client, string_session=tg_account.string_session, last_used=clock.monotonic())
+            self._entries[phone_number] = entry
+        entry.last_used = clock.monotonic()
+        return entry
+
+    @asynccontextmanager
+    async def client(self, tg_account: tg_account_db.TGAccount) -> AsyncIterator[Optional[TelegramClient]]:
+        """Клиент аккаунта из пула (или None, если залогиниться не удалось)"""
+        self._check_loop()
+        self._evict_idle()
+        lock = self._locks.setdefault(tg_account.phone_number, asyncio.Lock())
+        async with lock:
+            entry = await self._get_entry(tg_account)
+            if entry is None:
+                yield None
+                return
+            try:
+                yield entry.client
+            finally:
+                entry.last_used = clock.monotonic()
+
+    async def get(self, tg_account: tg_account_db.TGAccount) -> Optional[TelegramClient]:
+        """
+        Клиент аккаунта без блокировки - для вызывающего, который сам не дает
+        использовать аккаунт параллельно (задания process_post3 идут по очереди внутри канала)
+        """
+        self._check_loop()
+        self._evict_idle()
+        entry = await self._get_entry(tg_account)
+        return entry.client if entry else None
+
+    def discard(self, phone_number: int) -> None:
+        """Убирает клиент аккаунта из пула (аккаунт потерял авторизацию или заблокирован)"""
+        self._entries.pop(phone_number, None)
+
+    async def close(self) -> None:
+        for entry in list(self._entries.values()):
+            try:
+                await entry.client.disconnect()
+            except Exception as e:
+                logger.debug(f"Ошибка при отключении клиента из пула: {e}")
+        self._entries.clear()
+
+
+client_pool = ClientPool()
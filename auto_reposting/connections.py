@@ -0,0 +1,88 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from loguru import logger
+from opentele.tl import TelegramClient
+
+from core import metrics
+
+
+@dataclass
+class _Connection:
+    refs: int = 0
+    owned: bool = False  # подключал менеджер - он же и отключит
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ConnectionManager:
+    """
+    Время жизни подключения клиента со счетчиком пользователей. Первый пользователь подключает клиент,
+    последний отключает. Параллельные запросы одного клиента идут через одно живое соединение
+    и не рвут его друг другу, как это делает `async with telegram_client`.
+    """
+
+    def __init__(self):
+        self._connections: "weakref.WeakKeyDictionary[TelegramClient, _Connection]" = weakref.WeakKeyDictionary()
+
+    def _get(self, telegram_client: TelegramClient) -> _Connection:
+        connection = self._connections.get(telegram_client)
+        if connection is None:
+            connection = self._connections[telegram_client] = _Connection()
+        return connection
+
+    def refs(self, telegram_client: TelegramClient) -> int:
+        connection = self._connections.get(telegram_client)
+        return connection.refs if connection else 0
+
+    async def acquire(self, telegram_client: TelegramClient) -> None:
+        """Берет подключение клиента (подключает, если оно еще не открыто)"""
+        connection = self._get(telegram_client)
+        async with connection.lock:
+            if not telegram_client.is_connected():
+                # Авторизация уже проверена при создании клиента - достаточно connect(), без start()
+                await telegram_client.connect()
+                connection.owned = True
+                metrics.client_connections.inc(event="connect")
+            else:
+                if connection.refs == 0:
+                    connection.owned = False  # подключен кем-то другим - не отключаем
+                metrics.client_connections.inc(event="reuse")
+            connection.refs += 1
+
+    async def release(self, telegram_client: TelegramClient) -> None:
+        """Отпускает подключение. Последний пользователь отключает клиент"""
+        connection = self._connections.get(telegram_client)
+        if connection is None:
+            return
+        async with connection.lock:
+            connection.refs = max(connection.refs - 1, 0)
+            if connection.refs or not connection.owned:
+                return
+            connection.owned = False
+            try:
+                await telegram_client.disconnect()
+            except Exception as e:
+                logger.debug(f"Ошибка при отключении клиента: {e}")
+
+    async def close(self, telegram_client: TelegramClient) -> None:
+        """Отключает клиент независимо от пользователей (клиент больше не нужен)"""
+        connection = self._connections.pop(telegram_client, None)
+        if connection is not None:
+            connection.refs = 0
+            connection.owned = False
+        await telegram_client.disconnect()
+
+    @asynccontextmanager
+    async def session(self, telegram_client: TelegramClient) -> AsyncIterator[TelegramClient]:
+        """Подключение на время блока: вложенные и параллельные блоки делят одно соединение"""
+        await self.acquire(telegram_client)
+        try:
+            yield telegram_client
+        finally:
+            await self.release(telegram_client)
+
+
+connections = ConnectionManager()
@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from loguru import logger
+
+from core import metrics
+
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 12
+FLOOD_DECREASE = 0.5  # FloodWait: пакет вдвое меньше
+LATENCY_DECREASE = 0.75
+LATENCY_TOLERANCE = 2.0  # медиана RPC вдвое выше обычной - аккаунт или сеть перегружены
+LATENCY_BASELINE_DRIFT = 0.05  # обычная задержка медленно подтягивается к новой реальности
+FAILURE_THRESHOLD = 0.5  # меньше половины успешных репостов - пауза растет
+DELAY_STEP = 0.1  # аддитивный шаг паузы в долях базовой паузы
+MIN_DELAY_STEP = 1.0
+MIN_DELAY_RATIO = 0.25
+MAX_DELAY_RATIO = 8.0
+MAX_DELAY_FLOOR = 120.0
+FLOOD_MIN_COOLDOWN = 5.0  # ожидание после FloodWait, если Telegram не сообщил время
+
+
+@dataclass
+class PaceState:
+    concurrency: float
+    delay: float
+    base_latency: Optional[float] = None
+    cooldown: float = 0.0  # разовое ожидание перед следующим пакетом (FloodWait)
+    label: Optional[str] = None  # метка аккаунта в метриках (guid, не номер телефона)
+
+
+class AdaptivePacer:
+    """
+    AIMD-регулятор быстрого режима по аккаунтам. Пока нет сигналов перегрузки, после каждого пакета
+    размер пакета растет на 1, а пауза между пакетами сокращается на шаг.
+    FloodWait делит пакет пополам, увеличивает паузу на шаг и один раз выдерживает запрошенное
+    Telegram ожидание. Рост задержки RPC уменьшает пакет, низкая доля успешных репостов увеличивает паузу.
+    """
+
+    def __init__(self, min_concurrency: int = MIN_CONCURRENCY, max_concurrency: int = MAX_CONCURRENCY):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.states: Dict[int, PaceState] = {}
+
+    def _clamp_concurrency(self, value: float) -> float:
+        return min(max(value, self.min_concurrency), self.max_concurrency)
+
+    @staticmethod
+    def _delay_bounds(base_delay: float):
+        return base_delay * MIN_DELAY_RATIO, max(base_delay * MAX_DELAY_RATIO, MAX_DELAY_FLOOR)
+
+    @staticmethod
+    def _delay_step(base_delay: float) -> float:
+        return max(base_delay * DELAY_STEP, MIN_DELAY_STEP)
+
+    def _back_off(self, state: PaceState, base_delay: float, flood_seconds: float = 0.0) -> None:
+        min_delay, max_delay = self._delay_bounds(base_delay)
+        state.concurrency = self._clamp_concurrency(state.concurrency * FLOOD_DECREASE)
+        state.delay = min(max(state.delay + self._delay_step(base_delay), min_delay), max_delay)
+        state.cooldown = max(state.cooldown, flood_seconds or FLOOD_MIN_COOLDOWN)
+
+    def state(
+            self,
+            phone_number: int,
+            initial_concurrency: int,
+            base_delay: float,
+            account_id: Optional[str] = None
+    ) -> PaceState:
+        """Состояние аккаунта. Новый аккаунт начинает с initial_concurrency и базовой паузы"""
+        state = self.states.get(phone_number)
+        if state is None:
+            state = self.states[phone_number] = PaceState(
+                concurrency=self._clamp_concurrency(initial_concurrency),
+                delay=base_delay
+            )
+        if account_id is not None:
+            state.label = account_id
+        # Базовая пауза могла измениться в настройках
+        min_delay, max_delay = self._delay_bounds(base_delay)
+        state.delay = min(max(state.delay, min_delay), max_delay)
+        self._export(phone_number, state)
+        return state
+
+    def batch_size(
+            self,
+            phone_number: int,
+            initial_concurrency: int,
+            base_delay: float,
+            account_id: Optional[str] = None
+    ) -> int:
+        return int(self.state(phone_number, initial_concurrency, base_delay, account_id).concurrency)
+
+    def delay(self, phone_number: int) -> float:
+        """Пауза перед следующим пакетом. Ожидание после FloodWait выдерживается один раз"""
+        state = self.states.get(phone_number)
+        if state is None:
+            return 0.0
+        delay = max(state.delay, state.cooldown)
+        state.cooldown = 0.0
+        return delay
+
+    def record_batch(
+            self,
+            phone_number: int,
+            base_delay: float,
+            attempted: int,
+            succeeded: int,
+            flood_waits: int,
+            latency: Optional[float],
+            flood_seconds: float = 0.0
+    ) -> str:
+        """Обновляет темп аккаунта по итогам пакета. Возвращает принятое решение"""
+        state = self.states[phone_number]
+        min_delay, max_delay = self._delay_bounds(base_delay)
+        step = self._delay_step(base_delay)
+
+        latency_high = False
+        if latency is not None:
+            if state.base_latency is None or latency < state.base_latency:
+                state.base_latency = latency
+            else:
+                latency_high = latency > state.base_latency * LATENCY_TOLERANCE
+                state.base_latency += (latency - state.base_latency) * LATENCY_BASELINE_DRIFT
+
+        if flood_waits:
+            decision = "flood"
+            self._back_off(state, base_delay, flood_seconds)
+        elif latency_high:
+            decision = "latency"
+            state.concurrency = self._clamp_concurrency(state.concurrency * LATENCY_DECREASE)
+        elif attempted and succeeded / attempted < FAILURE_THRESHOLD:
+            decision = "failures"
+            state.delay = min(state.delay + step, max_delay)
+        else:
+            decision = "increase"
+            state.concurrency = self._clamp_concurrency(state.concurrency + 1)
+            state.delay = max(state.delay - step, min_delay)
+
+        metrics.fast_pacing_decisions.inc(decision=decision)
+        self._export(phone_number, state)
+        logger.debug(
+            f"🎚️ +{phone_number}: {decision} -> пакет {int(state.concurrency)}, пауза {state.delay:.1f}с "
+            f"(успешно {succeeded}/{attempted}, FloodWait {flood_waits}, RPC {latency or 0:.2f}с)"
+        )
+        return decision
+
+    def record_error(self, phone_number: int, base_delay: float) -> None:
+        """Пакет упал целиком - сбрасываем темп как при FloodWait"""
+        state = self.states.get(phone_number)
+        if state is None:
+            return
+        self._back_off(state, base_delay)
+        metrics.fast_pacing_decisions.inc(decision="error")
+        self._export(phone_number, state)
+
+    def retire(self, phone_number: int) -> None:
+        """Аккаунт вышел из ротации: убираем его серии из метрик. Темп аккаунта помним до следующего раза"""
+        state = self.states.get(phone_number)
+        if state is None or state.label is None:
+            return
+        metrics.fast_concurrency.remove(account=state.label)
+        metrics.fast_batch_delay.remove(account=state.label)
+
+    @staticmethod
+    def _export(phone_number: int, state: PaceState) -> None:
+        # Без метки (guid) серию не публикуем: номер телефона на /metrics не выводим
+        if state.label is None:
+            return
+        metrics.fast_concurrency.set(int(state.concurrency), account=state.label)
+        metrics.fast_batch_delay.set(round(state.delay, 2), account=state.label)
+
+
+fast_pacer = AdaptivePacer()
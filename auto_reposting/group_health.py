@@ -0,0 +1,92 @@
+from datetime import timedelta
+from typing import Optional
+
+from loguru import logger
+from telethon import errors
+
+from core import clock, metrics
+from core.models import group_health as group_health_db
+
+HALF_LIFE = 3 * 86400  # за 3 дня вес старых ошибок падает вдвое
+QUARANTINE_THRESHOLD = 2.0  # затухающий счет ошибок, при котором группа уходит на карантин
+BASE_QUARANTINE = 6 * 3600  # первый карантин, дальше удваивается
+MAX_QUARANTINE = 7 * 86400
+
+# Вид ошибки -> вес. Ошибки аккаунта (FloodWait, FROZEN_METHOD_INVALID) сюда не попадают
+FAILURE_WEIGHTS = {
+    "not_found": 1.0,  # username не существует
+    "private": 1.0,  # группа приватная или удалена
+    "write_forbidden": 1.0,  # писать в группу нельзя
+    "banned": 0.5,  # забанен конкретный аккаунт, другие могут пройти
+    "join_request": 0.5,  # вступление только по заявке
+}
+
+
+def classify_group_error(error: BaseException) -> Optional[str]:
+    """Вид ошибки, которая говорит о состоянии группы, или None"""
+    if isinstance(error, (errors.UsernameNotOccupiedError, errors.UsernameInvalidError, ValueError)):
+        return "not_found"
+    if isinstance(error, (errors.ChannelPrivateError, errors.ChannelInvalidError, errors.ChannelPublicGroupNaError)):
+        return "private"
+    if isinstance(error, (
+            errors.ChatWriteForbiddenError, errors.ChatRestrictedError, errors.ChatAdminRequiredError,
+            errors.ChatSendMediaForbiddenError, errors.ChatGuestSendForbiddenError
+    )):
+        return "write_forbidden"
+    if isinstance(error, (errors.UserBannedInChannelError, errors.ChannelBannedError)):
+        return "banned"
+    if isinstance(error, errors.InviteRequestSentError):
+        return "join_request"
+    return None
+
+
+def _apply_failure(health: group_health_db.GroupHealth, kind: str) -> None:
+    now = clock.now()
+    if health.last_failure_at and now > health.last_failure_at:
+        age = (now - health.last_failure_at).total_seconds()
+        health.failure_score *= 0.5 ** (age / HALF_LIFE)
+
+    health.failure_score += FAILURE_WEIGHTS.get(kind, 0.0)
+    health.failures_total += 1
+    health.last_failure_kind = kind
+    health.last_failure_at = now
+    health.updated_at = now
+
+    in_quarantine = health.quarantined_until is not None and health.quarantined_until > now
+    # Округление: две ошибки подряд не должны недотянуть до порога из-за затухания за доли секунды
+    if round(health.failure_score, 2) >= QUARANTINE_THRESHOLD and not in_quarantine:
+        seconds = min(BASE_QUARANTINE * 2 ** health.quarantine_count, MAX_QUARANTINE)
+        health.quarantined_until = now + timedelta(seconds=seconds)
+        health.quarantine_count += 1
+
+
+async def record_failure(url: str, error: BaseException) -> None:
+    """Учитывает ошибку группы. Ошибки, не связанные с группой, игнорируются"""
+    kind = classify_group_error(error)
+    if kind is None:
+        return
+
+    metrics.group_failures.inc(kind=kind)
+    try:
+        was_quarantined = {}
+
+        def updater(health: group_health_db.GroupHealth) -> None:
+            was_quarantined["count"] = health.quarantine_count
+            _apply_failure(health, kind)
+
+        health = await group_health_db.update_group_health(url, updater)
+        if health.quarantine_count > was_quarantined["count"]:
+            metrics.groups_quarantined.inc()
+            logger.warning(
+                f"🩺 Группа {url} на карантине до {health.quarantined_until:%d.%m %H:%M} "
+                f"({kind}, счет {health.failure_score:.1f}, карантин #{health.quarantine_count})"
+            )
+    except Exception as e:
+        logger.error(f"Ошибка записи здоровья группы {url}: {e}")
+
+
+async def record_success(url: str) -> None:
+    try:
+        await group_health_db.record_group_delivery(url)
+    except Exception as e:
+        logger.error(f"Ошибка записи доставки в группу {url}: {e}")
@@ -0,0 +1,173 @@
+import asyncio
+from datetime import timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from loguru import logger
+from telethon import errors
+from telethon.tl.functions.channels import GetFullChannelRequest
+
+from core import clock
+from core.models import group_health as group_health_db, group as group_db, tg_account as tg_account_db
+from . import group_health
+from .account_scoring import account_scorer
+from .client_pool import client_pool
+from .connections import connections
+from .leases import lease_manager, account_lease_key
+
+
+class GroupMetadataRefresher:
+    """Фоновое обновление метаданных групп (участники, медленный режим) для выбора групп"""
+
+    def __init__(self, interval: int = 1800, batch_size: int = 20, max_age: int = 86400, delay_between_groups: float = 3.0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.delay_between_groups = delay_between_groups
+        self.running = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _pick_account(
+            self,
+            channel_guid: Optional[str] = None,
+            exclude: Iterable[UUID] = ()
+    ) -> Optional[tg_account_db.TGAccount]:
+        """
+        Лучший по оценке рабочий аккаунт, который сейчас никем не занят.
+        Сначала аккаунты канала: их клиенты из пула потом делают репосты в эти группы
+        """
+        exclude = set(exclude)
+        accounts = []
+        if channel_guid:
+            try:
+                accounts = await tg_account_db.get_tg_accounts_by_channel_guid_and_status(str(channel_guid), "WORKING")
+            except Exception as e:
+                logger.debug(f"Не удалось получить аккаунты канала {channel_guid}: {e}")
+        if not accounts:
+            accounts = await tg_account_db.get_tg_accounts_by_status("WORKING")
+
+        for account in account_scorer.rank(accounts):
+            if account.guid in exclude:
+                continue
+            if not await tg_account_db.has_pause_paused(account):
+                continue
+            key = account_lease_key(account.guid)
+            if lease_manager.holds(key):
+                continue  # аккаунт занят воркером этого узла
+            if await lease_manager.try_acquire(key):
+                return account
+        return None
+
+    async def _fetch(self, client, url: str) -> Tuple[Optional[int], Optional[int]]:
+        entity = await client.get_entity(url)
+        if getattr(entity, "broadcast", False) or getattr(entity, "megagroup", None) is not None:
+            full = await client(GetFullChannelRequest(channel=entity))
+            full_chat = full.full_chat
+            return getattr(full_chat, "participants_count", None), getattr(full_chat, "slowmode_seconds", None)
+        return getattr(entity, "participants_count", None), None
+
+    async def _refresh(self, urls: List[str], account: tg_account_db.TGAccount) -> int:
+        """Получает сущности и метаданные групп арендованным аккаунтом и снимает аренду. Возвращает число обновленных"""
+        refreshed = 0
+        try:
+            # Клиент из пула: сущности групп остаются в его кэше для следующих репостов этим аккаунтом
+            async with client_pool.client(account) as client:
+                if client is None:
+                    return 0
+
+                async with connections.session(client):
+                    for url in urls:
+                        try:
+                            participants, slowmode = await self._fetch(client, url)
+                            await group_health_db.update_group_metadata(url, participants, slowmode)
+                            refreshed += 1
+                        except errors.FloodWaitError as e:
+                            logger.warning(f"FloodWait при обновлении метаданных групп (+{account.phone_number}): {e}")
+                            account_scorer.record_flood_wait(account.phone_number, getattr(e, "seconds", 0) or 0)
+                            break
+                        except Exception as e:
+                            if group_health.classify_group_error(e):
+                                await group_health.record_failure(url, e)
+                            else:
+                                logger.debug(f"Не удалось получить метаданные {url}: {e}")
+                        await clock.sleep(self.delay_between_groups)
+        finally:
+            await lease_manager.release(account_lease_key(account.guid))
+
+        logger.info(f"📏 Обновлены метаданные {refreshed}/{len(urls)} групп (аккаунт +{account.phone_number})")
+        return refreshed
+
+    async def refresh_once(self) -> int:
+        """Обновляет метаданные пачки самых устаревших групп. Возвращает число обновленных"""
+        urls = await group_db.get_urls_with_stale_metadata(
+            older_than=clock.now() - timedelta(seconds=self.max_age),
+            limit=self.batch_size
+        )
+        if not urls:
+            return 0
+        account = await self._pick_account()
+        if account is None:
+            logger.debug("Нет свободного аккаунта для обновления метаданных групп")
+            return 0
+        return await self._refresh(urls, account)
+
+    async def refresh_urls(self, urls: Iterable[str], channel_guid: Optional[str] = None) -> int:
+        """
+        Обновляет метаданные указанных групп пачками по batch_size.
+        Каждая пачка идет со следующего аккаунта: разрешение имен не ложится на один аккаунт
+        """
+        urls = list(dict.fromkeys(urls))
+        refreshed = 0
+        used: Set[UUID] = set()
+        for start in range(0, len(urls), self.batch_size):
+            account = await self._pick_account(channel_guid, exclude=used)
+            if account is None and used:
+                used.clear()  # все аккаунты уже получили по пачке - идем по второму кругу
+                account = await self._pick_account(channel_guid)
+            if account is None:
+                logger.debug("Нет свободного аккаунта для получения метаданных новых групп")
+                break
+            used.add(account.guid)
+            refreshed += await self._refresh(urls[start:start + self.batch_size], account)
+        return refreshed
+
+    def submit(self, urls: Iterable[str], channel_guid: Optional[str] = None) -> Optional[asyncio.Task]:
+        """
+        Новые группы разрешаются в фоне сразу после добавления: несуществующие и закрытые
+        уходят в карантин, а метаданные готовы до первого репоста. Что не успели - заберет периодический проход
+        """
+        urls = list(urls)
+        if not urls:
+            return None
+
+        async def refresh_added() -> None:
+            try:
+                await self.refresh_urls(urls, channel_guid)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка получения метаданных новых групп: {e}")
+
+        task = asyncio.create_task(refresh_added())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run(self) -> None:
+        self.running = True
+        while self.running:
+            try:
+                await self.refresh_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обновления метаданных групп: {e}")
+            await clock.sleep(self.interval)
+
+    def stop(self) -> None:
+        self.running = False
+        for task in list(self._tasks):
+            task.cancel()
+
+
+group_metadata_refresher = GroupMetadataRefresher()
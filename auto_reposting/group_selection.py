@@ -0,0 +1,84 @@
+import heapq
+import math
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from core import clock
+from core.models import group as group_db
+from core.models.group_health import GroupHealth
+
+DEFAULT_PARTICIPANTS = 1000  # для групп, метаданные которых еще не загружены
+
+
+def group_weight(health: Optional[GroupHealth]) -> float:
+    """Ожидаемый охват одной доставки: log10(участники) x историческая успешность"""
+    participants = DEFAULT_PARTICIPANTS
+    successes = failures = 0
+    if health is not None:
+        if health.participants_count is not None:
+            participants = health.participants_count
+        successes = health.successes_total or 0
+        failures = health.failures_total or 0
+
+    reach = math.log10(participants + 10)
+    success_rate = (successes + 1) / (successes + failures + 2)
+    return reach * success_rate
+
+
+def in_slowmode(health: Optional[GroupHealth], now: datetime) -> bool:
+    """Медленный режим еще не дает отправить следующее сообщение"""
+    if health is None or not health.slowmode_seconds or health.last_delivery_at is None:
+        return False
+    return (now - health.last_delivery_at).total_seconds() < health.slowmode_seconds
+
+
+def select_groups(
+        candidates: List[Tuple[group_db.Group, Optional[GroupHealth]]],
+        limit: Optional[int],
+        now: datetime
+) -> Tuple[List[group_db.Group], Dict[UUID, float]]:
+    """Взвешенная справедливая ротация (stride scheduling).
+
+    У каждой группы есть rotation_pass - ее виртуальное время. В пост попадают k групп
+    с наименьшим pass, после чего pass выбранной группы сдвигается на 1 / weight:
+    группы с большим охватом получают посты пропорционально чаще, но каждая группа
+    рано или поздно снова окажется первой. Новые группы идут раньше всех.
+
+    Возвращает выбранные группы (крупные первыми - если бюджет аккаунтов закончится
+    посреди поста, он уйдет на самый большой охват) и новые значения pass.
+    """
+    passes = [group.rotation_pass for group, _ in candidates if group.rotation_pass is not None]
+    # Группа, вернувшаяся после карантина, не должна "отыгрывать" пропущенное время
+    virtual_time = min(passes) if passes else 0.0
+
+    scored = []
+    for index, (group, health) in enumerate(candidates):
+        if in_slowmode(health, now):
+            continue
+        weight = group_weight(health)
+        if group.rotation_pass is None:
+            priority = (float("-inf"), -weight)
+        else:
+            priority = (max(group.rotation_pass, virtual_time), -weight)
+        scored.append((priority, weight, index, group))
+
+    if limit is None or limit >= len(scored):
+        selected = scored
+    else:
+        selected = heapq.nsmallest(limit, scored)
+
+    new_passes = {}
+    for _, weight, _, group in selected:
+        start = virtual_time if group.rotation_pass is None else max(group.rotation_pass, virtual_time)
+        new_passes[group.guid] = start + 1 / max(weight, 1e-6)
+    selected = sorted(selected, key=lambda item: (-item[1], item[2]))
+    return [group for _, _, _, group in selected], new_passes
+
+
+async def select_groups_for_channel(channel_guid: str, limit: Optional[int] = None) -> Tuple[List[group_db.Group], int]:
+    """Выбирает группы для поста и сдвигает их ротацию. Возвращает (выбранные, всего доступных)"""
+    candidates = await group_db.get_selection_candidates(channel_guid)
+    selected, new_passes = select_groups(candidates, limit, clock.now())
+    await group_db.update_rotation_passes(new_passes)
+    return selected, len(candidates)
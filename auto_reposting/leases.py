@@ -0,0 +1,112 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from loguru import logger
+
+from core import clock
+from core.models import lease as lease_db
+from core.settings import settings
+
+
+def channel_lease_key(channel_guid: str) -> str:
+    return f"channel:{channel_guid}"
+
+
+def account_lease_key(account_guid) -> str:
+    return f"account:{account_guid}"
+
+
+def fast_channel_lease_key(telegram_channel_id) -> str:
+    """Посты канала в быстром режиме: одновременно их обрабатывает один резидентный воркер"""
+    return f"fast_channel:{telegram_channel_id}"
+
+
+class LeaseManager:
+    """
+    Аренды текущего узла: захват, продление по heartbeat и освобождение.
+    Внутри узла аренда считает держателей (слушатель и воркер канала в одном процессе могут
+    держать один аккаунт): строка в БД удаляется, только когда ее отпустил последний держатель
+    """
+
+    def __init__(self, owner: str, ttl: int, heartbeat_interval: int):
+        self.owner = owner
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.held: Dict[str, int] = {}
+
+    def holds(self, resource_key: str) -> bool:
+        return resource_key in self.held
+
+    async def try_acquire(self, resource_key: str) -> bool:
+        """Захватывает ресурс если он свободен, истек или уже наш"""
+        try:
+            acquired = await lease_db.acquire_lease(resource_key, self.owner, self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка захвата аренды {resource_key}: {e}")
+            return False
+
+        if acquired:
+            self.held[resource_key] = self.held.get(resource_key, 0) + 1
+        else:
+            self.held.pop(resource_key, None)  # аренду перехватил другой узел
+        return acquired
+
+    async def release(self, resource_key: str) -> None:
+        """Отпускает одно владение. Аренда освобождается в БД, когда держателей не осталось"""
+        holders = self.held.get(resource_key, 0)
+        if holders > 1:
+            self.held[resource_key] = holders - 1
+            return
+        if not holders:
+            return  # не держим (уже отпущена или потеряна)
+        del self.held[resource_key]
+        try:
+            await lease_db.release_lease(resource_key, self.owner)
+        except Exception as e:
+            logger.error(f"Ошибка освобождения аренды {resource_key}: {e}")
+
+    async def release_all(self) -> None:
+        self.held.clear()
+        try:
+            await lease_db.release_all_leases(self.owner)
+        except Exception as e:
+            logger.error(f"Ошибка освобождения аренд узла {self.owner}: {e}")
+
+    async def heartbeat(self) -> Set[str]:
+        """Продлевает все аренды узла. Возвращает ключи, которые были перехвачены другим узлом"""
+        if not self.held:
+            return set()
+
+        resource_keys = set(self.held)
+        try:
+            renewed = await lease_db.renew_leases(list(resource_keys), self.owner, self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка продления аренд: {e}")
+            return set()
+
+        lost = resource_keys - renewed
+        for resource_key in lost:
+            self.held.pop(resource_key, None)
+        for resource_key in lost:
+            logger.warning(f"🔓 Аренда {resource_key} потеряна узлом {self.owner}")
+        return lost
+
+    async def run_heartbeat(self, on_lost: Optional[Callable[[Set[str]], Awaitable[None]]] = None) -> None:
+        """Фоновое продление аренд для сервисов без процессора каналов (слушатель)"""
+        while True:
+            try:
+                await clock.sleep(self.heartbeat_interval)
+                lost = await self.heartbeat()
+                if lost and on_lost is not None:
+                    await on_lost(lost)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка продления аренд: {e}")
+
+
+lease_manager = LeaseManager(
+    owner=settings.get_node_id(),
+    ttl=settings.lease_ttl,
+    heartbeat_interval=settings.lease_heartbeat_interval
+)
@@ -0,0 +1,198 @@
+import asyncio
+from typing import List, Optional, Set
+
+from loguru import logger
+from telethon import errors
+from telethon.tl.functions.channels import LeaveChannelRequest
+
+from core import clock, metrics
+from core.models import (
+    group as group_db,
+    group_health as group_health_db,
+    group_membership as group_membership_db,
+    tg_account as tg_account_db
+)
+from core.settings import json_settings
+from . import affinity, group_health, telegram_utils2
+from .leases import lease_manager, account_lease_key
+
+DEFAULT_MAX_JOINED_CHATS = 450  # лимит Telegram для обычного аккаунта - 500 каналов и супергрупп
+TARGET_RATIO = 0.9  # после очистки остается не больше 90% порога
+
+
+class MembershipManager:
+    """Выходит из лишних групп у аккаунтов, которые приближаются к лимиту CHANNELS_TOO_MUCH"""
+
+    def __init__(self, interval: int = 6 * 3600, max_leaves_per_run: int = 20, delay_between_leaves: float = 2.0):
+        self.interval = interval
+        self.max_leaves_per_run = max_leaves_per_run
+        self.delay_between_leaves = delay_between_leaves
+        self.running = False
+        self.full_accounts: Set[int] = set()
+        # Создается в run(): Event привязан к event loop, а run_service перезапускает сервис в новом
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def flag_full(self, phone_number: Optional[int]) -> None:
+        """Аккаунт получил CHANNELS_TOO_MUCH - чистим его вне очереди"""
+        if phone_number is None:
+            return
+        self.full_accounts.add(phone_number)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _max_joined_chats(self) -> int:
+        try:
+            return await json_settings.async_get_attribute("max_joined_chats")
+        except:
+            return DEFAULT_MAX_JOINED_CHATS
+
+    async def _joined_count(self, client, phone_number: int) -> int:
+        """
+        Сколько каналов и супергрупп у аккаунта на самом деле - только они идут в лимит CHANNELS_TOO_MUCH
+        (личные чаты, боты и обычные группы не считаются). Если диалоги получить не удалось - по нашим записям
+        """
+        try:
+            joined = 0
+            async for dialog in client.iter_dialogs(ignore_migrated=True):
+                if dialog.is_channel:
+                    joined += 1
+            return joined
+        except errors.FloodWaitError:
+            raise
+        except Exception as e:
+            logger.debug(f"Не удалось получить диалоги +{phone_number}: {e}")
+        return len(affinity.membership_registry.members.get(phone_number, ()))
+
+    async def _leave_candidates(self, account: tg_account_db.TGAccount) -> List[str]:
+        """
+        Группы, из которых можно выйти, в порядке очереди:
+        удаленные из бота -> на карантине -> не домашние для аккаунта (давно не использованные первыми).
+        Активные группы, за которыми аккаунт закреплен (affinity), не трогаем.
+        """
+        memberships = await group_membership_db.get_memberships(account.phone_number)
+        if not memberships:
+            return []
+
+        channel_urls: Set[str] = set()
+        channel_accounts = []
+        if account.channel_guid:
+            channel_urls = {group.url for group in await group_db.get_all_groups_by_channel_guid(str(account.channel_guid))}
+            channel_accounts = await tg_account_db.get_working_accounts_by_channel(str(account.channel_guid))
+        if all(other.guid != account.guid for other in channel_accounts):
+            channel_accounts.append(account)
+        quarantined = {health.url for health in await group_health_db.get_quarantined_groups()}
+        try:
+            replicas = await json_settings.async_get_attribute("group_affinity_replicas")
+        except:
+            replicas = affinity.DEFAULT_REPLICAS
+
+        stale, dead, foreign = [], [], []
+        for membership in memberships:
+            url = membership.url
+            if url not in channel_urls:
+                stale.append(url)
+            elif url in quarantined:
+                dead.append(url)
+            elif all(home.guid != account.guid for home in affinity.home_accounts(url, channel_accounts, replicas)):
+                foreign.append(url)
+        return stale + dead + foreign
+
+    async def _leave(self, client, phone_number: int, url: str) -> bool:
+        try:
+            entity = await client.get_entity(url)
+            await client(LeaveChannelRequest(entity))
+        except errors.UserNotParticipantError:
+            pass
+        except errors.FloodWaitError:
+            raise
+        except Exception as e:
+            if not group_health.classify_group_error(e):
+                logger.warning(f"Не удалось выйти из {url} (+{phone_number}): {e}")
+                return False
+        await affinity.membership_registry.forget(phone_number, url)
+        metrics.groups_left.inc()
+        return True
+
+    async def cleanup_account(self, account: tg_account_db.TGAccount, force: bool = False) -> Optional[int]:
+        """
+        Проверяет число чатов аккаунта и при превышении порога выходит из лишних групп.
+        Возвращает число групп, из которых вышел, или None если аккаунт сейчас занят.
+        """
+        key = account_lease_key(account.guid)
+        if lease_manager.holds(key) or not await lease_manager.try_acquire(key):
+            return None  # аккаунтом сейчас работает воркер - проверим в следующий раз
+
+        left = 0
+        try:
+            client = await telegram_utils2.create_tg_client(account)
+            if client is None:
+                return 0
+
+            max_joined = await self._max_joined_chats()
+            async with client:
+                await affinity.membership_registry.ensure_loaded([account.phone_number])
+                joined = await self._joined_count(client, account.phone_number)
+                if joined < max_joined and not force:
+                    return 0
+
+                target = int(max_joined * TARGET_RATIO)
+                to_leave = min(max(joined - target, 1), self.max_leaves_per_run)
+                logger.warning(f"🚪 У +{account.phone_number} {joined} чатов (порог {max_joined}), выходим из {to_leave}")
+
+                for url in (await self._leave_candidates(account))[:to_leave]:
+                    if await self._leave(client, account.phone_number, url):
+                        left += 1
+                    await clock.sleep(self.delay_between_leaves)
+        except errors.FloodWaitError as e:
+            logger.warning(f"FloodWait при выходе из групп (+{account.phone_number}): {e}")
+        finally:
+            await lease_manager.release(key)
+
+        if left:
+            logger.info(f"🚪 +{account.phone_number} вышел из {left} групп")
+        return left
+
+    async def run_once(self) -> int:
+        full = set(self.full_accounts)
+        self.full_accounts.clear()
+
+        left = 0
+        for account in await tg_account_db.get_tg_accounts_by_status("WORKING"):
+            if not await tg_account_db.has_pause_paused(account):
+                continue
+            force = account.phone_number in full
+            try:
+                result = await self.cleanup_account(account, force=force)
+                if result is None and force:
+                    self.full_accounts.add(account.phone_number)
+                left += result or 0
+            except Exception as e:
+                logger.error(f"Ошибка очистки групп +{account.phone_number}: {e}")
+        return left
+
+    async def run(self) -> None:
+        self.running = True
+        self._wakeup = asyncio.Event()
+        while self.running:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка менеджера членства в группах: {e}")
+
+            self._wakeup.clear()
+            # Переполненные аккаунты, которые были заняты воркером, пробуем снова через 5 минут
+            timeout = min(self.interval, 300) if self.full_accounts else self.interval
+            try:
+                await clock.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        self.running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+
+membership_manager = MembershipManager()
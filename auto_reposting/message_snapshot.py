@@ -0,0 +1,62 @@
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class MessageSnapshot:
+    """Компактный снимок поста, сделанный слушателем: воркеру не нужно заново запрашивать сообщение"""
+    id: int
+    text: str = ""
+    entity_urls: List[str] = field(default_factory=list)
+    button_urls: List[str] = field(default_factory=list)
+    grouped_id: Optional[int] = None
+    media_type: Optional[str] = None
+
+    @property
+    def has_media(self) -> bool:
+        return self.media_type is not None
+
+    def parts(self) -> List[str]:
+        """Все места, где может прятаться ссылка: текст, скрытые ссылки сущностей и кнопки"""
+        return [self.text, *self.entity_urls, *self.button_urls]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional["MessageSnapshot"]:
+        if not data or data.get("id") is None:
+            return None
+        return cls(
+            id=data["id"],
+            text=data.get("text") or "",
+            entity_urls=list(data.get("entity_urls") or []),
+            button_urls=list(data.get("button_urls") or []),
+            grouped_id=data.get("grouped_id"),
+            media_type=data.get("media_type"),
+        )
+
+    @classmethod
+    def from_message(cls, message) -> "MessageSnapshot":
+        entity_urls = [
+            entity.url for entity in getattr(message, "entities", None) or []
+            if getattr(entity, "url", None)
+        ]
+
+        button_urls = []
+        reply_markup = getattr(message, "reply_markup", None)
+        for row in getattr(reply_markup, "rows", None) or []:
+            for button in getattr(row, "buttons", None) or []:
+                url = getattr(button, "url", None)
+                if url:
+                    button_urls.append(url)
+
+        media = getattr(message, "media", None)
+        return cls(
+            id=message.id,
+            text=getattr(message, "message", None) or "",
+            entity_urls=entity_urls,
+            button_urls=button_urls,
+            grouped_id=getattr(message, "grouped_id", None),
+            media_type=type(media).__name__ if media is not None else None,
+        )
@@ -0,0 +1,167 @@
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from telethon.errors import FloodWaitError
+from telethon.tl.types import InputPeerChannel, ReactionEmoji
+
+from core import metrics
+from core.models import tg_account as tg_account_db
+from core.settings import json_settings
+from . import telegram_utils, telegram_utils2
+from .account_scoring import account_scorer
+from .client_pool import ClientPool, client_pool
+from .connections import connections
+
+REACTIONS = {
+    "love": "❤️",
+    "ask": "🙏",
+    "like": "👍"
+}
+DEFAULT_CONCURRENCY = 3
+MAX_ACCOUNTS = 5  # больше реакций от одного поста не ставим
+
+
+class ReactionFanout:
+    """
+    Реакции от нескольких аккаунтов: параллельно под общим семафором,
+    с клиентами из пула и кэшем access hash канала для каждого аккаунта.
+    """
+
+    def __init__(self, pool: ClientPool = client_pool, max_accounts: int = MAX_ACCOUNTS):
+        self.pool = pool
+        self.max_accounts = max_accounts
+        # (номер аккаунта, url канала) -> канал с access hash этого аккаунта
+        self.peers: Dict[Tuple[int, str], InputPeerChannel] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._concurrency = 0
+        self._tasks: Set[asyncio.Task] = set()
+        metrics.reactions_pending.set_function(lambda: len(self._tasks))
+
+    async def _get_semaphore(self) -> asyncio.Semaphore:
+        try:
+            concurrency = int(await json_settings.async_get_attribute("reaction_concurrency"))
+        except:
+            concurrency = DEFAULT_CONCURRENCY
+        concurrency = max(concurrency, 1)
+        # Новое значение из настроек действует для следующих реакций, текущие дорабатывают со старым.
+        # После перезапуска сервиса (новый event loop) семафор создается заново
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or concurrency != self._concurrency or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(concurrency)
+            self._semaphore_loop = loop
+            self._concurrency = concurrency
+        return self._semaphore
+
+    async def _react_from_account(
+            self,
+            semaphore: asyncio.Semaphore,
+            tg_account: tg_account_db.TGAccount,
+            message_id: int,
+            channel_url: str,
+            reaction: ReactionEmoji
+    ) -> bool:
+        key = (tg_account.phone_number, channel_url)
+        async with semaphore:
+            async with self.pool.client(tg_account) as telegram_client:
+                if telegram_client is None:
+                    logger.warning(f"Не удалось создать клиент для реакции +{tg_account.phone_number}")
+                    metrics.reactions_total.inc(result="no_client")
+                    return False
+
+                try:
+                    async with connections.session(telegram_client):
+                        peer = self.peers.get(key)
+                        if peer is None:
+                            peer = await telegram_utils2.resolve_input_channel(telegram_client, channel_url)
+                            self.peers[key] = peer
+                        success = await telegram_utils2.send_reaction_by_telegram_client(
+                            telegram_client=telegram_client,
+                            message_id=message_id,
+                            peer=peer,
+                            reaction=reaction
+                        )
+                except FloodWaitError as e:
+                    logger.warning(f"FloodWait при установке реакции от +{tg_account.phone_number}")
+                    metrics.reactions_total.inc(result="flood_wait")
+                    metrics.floodwait_seconds.inc(e.seconds or 0, account=str(tg_account.phone_number))
+                    account_scorer.record_flood_wait(tg_account.phone_number, e.seconds or 0)
+                    try:
+                        await telegram_utils.check_ban_in_spambot(telegram_client=telegram_client)
+                    except:
+                        pass
+                    return False
+                except Exception as e:
+                    # Возможно устарел access hash или клиент - в следующий раз получим заново
+                    self.peers.pop(key, None)
+                    self.pool.discard(tg_account.phone_number)
+                    logger.error(f"Ошибка при установке реакции от +{tg_account.phone_number}: {e}")
+                    metrics.reactions_total.inc(result="error")
+                    return False
+
+        if success:
+            logger.info(f"✅ Реакция поставлена от +{tg_account.phone_number}")
+            metrics.reactions_total.inc(result="success")
+        else:
+            logger.warning(f"❌ Не удалось поставить реакцию от +{tg_account.phone_number}")
+            metrics.reactions_total.inc(result="invalid")
+        return success
+
+    async def react(
+            self,
+            tg_accounts: List[tg_account_db.TGAccount],
+            message_id: int,
+            channel_url: str,
+            emoji_reaction: str
+    ) -> int:
+        """Ставит реакции и ждет завершения. Возвращает число поставленных реакций"""
+        reaction = ReactionEmoji(emoticon=REACTIONS.get(emoji_reaction, "❤️"))
+        selected_accounts = tg_accounts[:self.max_accounts]
+        if not selected_accounts:
+            return 0
+
+        semaphore = await self._get_semaphore()
+        logger.info(f"🎯 Ставлю реакции от {len(selected_accounts)} аккаунтов")
+        results = await asyncio.gather(
+            *(
+                self._react_from_account(semaphore, tg_account, message_id, channel_url, reaction)
+                for tg_account in selected_accounts
+            ),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при установке реакции: {result}")
+        return sum(1 for result in results if result is True)
+
+    def submit(
+            self,
+            tg_accounts: List[tg_account_db.TGAccount],
+            message_id: int,
+            channel_url: str,
+            emoji_reaction: str
+    ) -> asyncio.Task:
+        """Ставит реакции в фоне: очередь канала не ждет логинов и запросов"""
+        task = asyncio.create_task(self.react(tg_accounts, message_id, channel_url, emoji_reaction))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Ждет фоновые реакции (при остановке процесса)"""
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Прервано {len(pending)} фоновых рассылок реакций")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def close(self, timeout: Optional[float] = 30.0) -> None:
+        await self.drain(timeout)
+        await self.pool.close()
+
+
+reaction_fanout = ReactionFanout()
@@ -0,0 +1,101 @@
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from core.models import group as group_db
+from core.settings import json_settings
+from .message_snapshot import MessageSnapshot
+
+# Ссылка на чат (до первого сегмента пути) или @упоминание (не трогаем e-mail и пути вида /@name)
+_CHAT_LINK = re.compile(
+    r"(?:https?://)?(?:www\.)?(?:t|telegram)\.(?:me|dog)/(?:joinchat/[\w-]+|\+[\w-]+|[\w-]*)"
+    r"|(?<![\w/@.])@\w{4,}",
+    re.IGNORECASE
+)
+_LINK_PREFIX = re.compile(r"^(?:https?://)?(?:www\.)?(?:t|telegram)\.(?:me|dog)/", re.IGNORECASE)
+
+
+def _normalize_chat_link(link: str) -> str:
+    """Ссылка на чат в виде group_db.normalize_url без схемы: t.me/name, t.me/+Hash"""
+    url = group_db.normalize_url(link)
+    if url is not None:
+        return url.replace("https://", "", 1)
+    # Не ссылка на группу (t.me/c/123, короткое имя) - только единый префикс
+    return _LINK_PREFIX.sub("t.me/", link).lower()
+
+
+def normalize(value: str) -> str:
+    """
+    Приводит ссылки и упоминания к виду group_db.normalize_url (t.me/name в нижнем регистре,
+    хэш приглашения t.me/+Hash и joinchat - без изменения регистра), остальной текст - в нижний регистр
+    """
+    value = value.strip()
+    parts, position = [], 0
+    for match in _CHAT_LINK.finditer(value):
+        parts.append(value[position:match.start()].lower())
+        parts.append(_normalize_chat_link(match.group(0)))
+        position = match.end()
+    parts.append(value[position:].lower())
+    return "".join(parts)
+
+
+def _normalize_pattern(stop_link: str) -> str:
+    return normalize(stop_link).rstrip("/")
+
+
+class StopLinkMatcher:
+    """Все стоп-ссылки одним регулярным выражением: один проход по тексту, ссылкам сущностей и кнопкам"""
+
+    def __init__(self, stop_links: Iterable[str]):
+        self.originals: Dict[str, str] = {}
+        for stop_link in stop_links:
+            pattern = _normalize_pattern(str(stop_link))
+            if pattern:
+                self.originals.setdefault(pattern, stop_link)
+
+        alternatives = []
+        # Длинные первыми, чтобы t.me/name_long не совпал как t.me/name
+        for pattern in sorted(self.originals, key=len, reverse=True):
+            escaped = re.escape(pattern)
+            # t.me/name не должен совпадать внутри t.me/name2
+            if pattern[-1].isalnum() or pattern[-1] == "_":
+                escaped += r"(?!\w)"
+            alternatives.append(escaped)
+        self.regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def search(self, parts: Iterable[str]) -> Optional[str]:
+        """Первая найденная стоп-ссылка (в исходном виде из настроек) или None"""
+        if self.regex is None:
+            return None
+        haystack = "\n".join(normalize(part) for part in parts if part)
+        match = self.regex.search(haystack)
+        if match is None:
+            return None
+        return self.originals.get(match.group(0), match.group(0))
+
+    def find_in_message(self, message) -> Optional[str]:
+        return self.search(MessageSnapshot.from_message(message).parts())
+
+    def find_in_snapshot(self, snapshot: MessageSnapshot) -> Optional[str]:
+        return self.search(snapshot.parts())
+
+
+_cache: Tuple[Optional[Tuple[str, ...]], Optional[StopLinkMatcher]] = (None, None)
+
+
+def get_matcher(stop_links: Iterable[str]) -> StopLinkMatcher:
+    """Матчер пересобирается только когда меняется список стоп-ссылок"""
+    global _cache
+    key = tuple(stop_links)
+    cached_key, matcher = _cache
+    if matcher is None or cached_key != key:
+        matcher = StopLinkMatcher(key)
+        _cache = (key, matcher)
+    return matcher
+
+
+async def load_matcher() -> StopLinkMatcher:
+    try:
+        stop_links = await json_settings.async_get_attribute("stop_links") or []
+    except:
+        stop_links = []
+    return get_matcher(stop_links)
@@ -1,55 +1,72 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from loguru import logger
 from opentele.tl import TelegramClient
 
 from telethon import errors
-from telethon.errors import UserAlreadyParticipantError, ReactionInvalidError, FloodWaitError
+from telethon.errors import UserAlreadyParticipantError, FloodWaitError
 from telethon.sessions import StringSession
 from telethon.tl.functions.channels import JoinChannelRequest
 from telethon.tl.functions.contacts import UnblockRequest
-from telethon.tl.functions.messages import GetHistoryRequest, ForwardMessagesRequest, SendReactionRequest
-from telethon.tl.types import PeerChannel, Message, ReactionEmoji, InputPeerChannel
+from telethon.tl.functions.messages import GetHistoryRequest, ForwardMessagesRequest
+from telethon.tl.types import PeerChannel, Message
 
 from core.models import tg_account as tg_account_db, channel as channel_db, group as group_db
 from core.schemas import tg_account as tg_account_schemas
 from core.settings import bot, settings
 from . import exc
+from .connections import connections
 
 
 
+SPAMBOT_TEMPORARY_BAN_PAUSE = 432000  # 5 дней
+
+
+def parse_spambot_response(text: str) -> Optional[tg_account_schemas.TGAccountStatus]:
+    """Статус по ответу @SpamBot: MUTED - временные ограничения, DELETED - ограничен навсегда, None - чист"""
+    text = (text or "").lower()
+    if "utc" in text:
+        return tg_account_schemas.TGAccountStatus.muted
+    if "while the account is limited" in text:
+        return tg_account_schemas.TGAccountStatus.deleted
+    return None
+
+
+async def ask_spambot(telegram_client: TelegramClient) -> str:
+    """Текст ответа @SpamBot на /start (клиент должен быть подключен)"""
+    await telegram_client(UnblockRequest('@SpamBot'))
+    async with telegram_client.conversation('@SpamBot') as conv:
+        await conv.send_message('/start')
+        msg = await conv.get_response()
+    return msg.text or ""
+
+
+async def apply_spambot_status(tg_account: tg_account_db.TGAccount, status: tg_account_schemas.TGAccountStatus) -> None:
+    if status == tg_account_schemas.TGAccountStatus.muted:
+        tg_account_update = tg_account_schemas.TGAccountUpdate(
+            status=status,
+            last_datetime_pause=datetime.now(),
+            pause_in_seconds=SPAMBOT_TEMPORARY_BAN_PAUSE
+        )
+    else:
+        tg_account_update = tg_account_schemas.TGAccountUpdate(status=status)
+    await tg_account_db.update_tg_account(tg_account=tg_account, tg_account_update=tg_account_update)
+
+
 async def check_ban_in_spambot(telegram_client: TelegramClient) -> None:
-    async with telegram_client:
+    async with connections.session(telegram_client):
         me = await telegram_client.get_me()
         phone_number = me.phone
-        await telegram_client(UnblockRequest('@SpamBot'))
-
-        async with telegram_client.conversation('@SpamBot') as conv:
-            await conv.send_message('/start')
-            msg = await conv.get_response()
-
-            tg_account = await tg_account_db.get_tg_account_by_phone_number(phone_number=phone_number)
-
-            if "utc" in msg.text.lower():
-                await tg_account_db.update_tg_account(
-                    tg_account=tg_account,
-                    tg_account_update=tg_account_schemas.TGAccountUpdate(
-                        status=tg_account_schemas.TGAccountStatus.muted,
-                        last_datetime_pause=datetime.now(),
-                        pause_in_seconds=432000
-                    )
-                )
-                raise exc.TemporarilyBanned(f"Временный бан https://t.me/+{phone_number}")
-
-            elif "while the account is limited" in msg.text.lower():
-                await tg_account_db.update_tg_account(
-                    tg_account=tg_account,
-                    tg_account_update=tg_account_schemas.TGAccountUpdate(
-                        status=tg_account_schemas.TGAccountStatus.deleted
-                    )
-                )
-                raise exc.PermanentlyBanned(f"Навсегда в бане https://t.me/+{phone_number}")
+        status = parse_spambot_response(await ask_spambot(telegram_client))
+        if status is None:
+            return
+
+        tg_account = await tg_account_db.get_tg_account_by_phone_number(phone_number=phone_number)
+        await apply_spambot_status(tg_account, status)
+        if status == tg_account_schemas.TGAccountStatus.muted:
+            raise exc.TemporarilyBanned(f"Временный бан https://t.me/+{phone_number}")
+        raise exc.PermanentlyBanned(f"Навсегда в бане https://t.me/+{phone_number}")
 
 
 async def create_tg_client(tg_account: tg_account_db.TGAccount) -> TelegramClient:
@@ -294,43 +311,12 @@ async def send_reaction_with_accounts_on_message(
         channel_url: str,
         emoji_reaction: str
 ) -> None:
-    reaction = ReactionEmoji(emoticon="❤️")
-    if emoji_reaction == "ask":
-        reaction = ReactionEmoji(emoticon="🙏")
-    elif emoji_reaction == "like":
-        reaction = ReactionEmoji(emoticon="👍")
-
-    telegram_clients = []
-    for tg_account in tg_accounts:
-        try:
-            telegram_account_client = await create_tg_client(tg_account=tg_account)
-        except Exception as e:
-            logger.exception(f"{e.__class__.__name__}: {e}")
-            continue
-        telegram_clients.append(telegram_account_client)
+    # Рассылка реакций живет в reactions.py (параллельно, с пулом клиентов)
+    from .reactions import reaction_fanout
+    await reaction_fanout.react(
+        tg_accounts=tg_accounts,
+        message_id=message.id,
+        channel_url=channel_url,
+        emoji_reaction=emoji_reaction
+    )
 
-    for tg_client in telegram_clients:
-        is_flood_wait = False
-        async with tg_client:
-            channel = await tg_client.get_entity(channel_url)
-            try:
-                await tg_client(SendReactionRequest(
-                    peer=InputPeerChannel(
-                        channel_id=channel.id,
-                        access_hash=channel.access_hash
-                    ),
-                    msg_id=message.id,
-                    reaction=[reaction])
-                )
-            except ReactionInvalidError as e:
-                logger.info(f"{e.__class__.__name__}: {e}")
-            except FloodWaitError:
-                is_flood_wait = True
-            except Exception as e:
-                logger.exception(f"{e.__class__.__name__}: {e}")
-
-        if is_flood_wait:
-            try:
-                await check_ban_in_spambot(telegram_client=tg_client)
-            except Exception as e:
-                logger.exception(e)
\ No newline at end of file
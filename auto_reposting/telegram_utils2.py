@@ -1,4 +1,6 @@
-from typing import List, Optional, Tuple
+import weakref
+from contextlib import contextmanager
+from typing import Awaitable, Callable, List, Optional, Tuple
 
 from loguru import logger
 from opentele.tl import TelegramClient
@@ -8,19 +10,84 @@ from telethon.errors import UserAlreadyParticipantError, ReactionInvalidError, F
 from telethon.sessions import StringSession
 from telethon.tl.functions.channels import JoinChannelRequest
 from telethon.tl.functions.messages import  ForwardMessagesRequest, SendReactionRequest
-from telethon.tl.types import  Message, ReactionEmoji, InputPeerChannel
+from telethon.tl.types import ReactionEmoji, InputPeerChannel
 
+from core import clock, log, metrics, tracing
 from core.models import tg_account as tg_account_db, channel as channel_db, group as group_db
 from core.schemas import tg_account as tg_account_schemas
 from . import exc, telegram_utils
+from . import group_health
+from .account_scoring import account_scorer
+from .affinity import membership_registry
+from .connections import connections
+from .message_snapshot import MessageSnapshot
+
+# Созданные клиенты -> номер аккаунта (для метрик и подсчета активных подключений)
+_client_accounts: "weakref.WeakKeyDictionary[TelegramClient, int]" = weakref.WeakKeyDictionary()
+metrics.active_connections.set_function(
+    lambda: sum(1 for client in list(_client_accounts) if client.is_connected())
+)
+
+
+def _default_client_factory(string_session: str) -> TelegramClient:
+    return TelegramClient(StringSession(string_session))
+
+
+# Фабрика клиентов по string session (симулятор из benchmarks/ подставляет сюда фейковый клиент)
+client_factory: Callable[[str], TelegramClient] = _default_client_factory
+
+
+def set_client_factory(factory: Optional[Callable[[str], TelegramClient]] = None) -> None:
+    """Подменяет фабрику клиентов. Без аргумента возвращает настоящий TelegramClient"""
+    global client_factory
+    client_factory = factory or _default_client_factory
+
+
+def _account_label(telegram_client: TelegramClient) -> str:
+    return str(_client_accounts.get(telegram_client, "unknown"))
+
+
+def _record_flood_wait(telegram_client: TelegramClient, error: errors.FloodWaitError) -> None:
+    seconds = getattr(error, "seconds", 0) or 0
+    metrics.floodwait_seconds.inc(seconds, account=_account_label(telegram_client))
+    account_scorer.record_flood_wait(_client_accounts.get(telegram_client), seconds)
+
+
+def _record_account_error(telegram_client: TelegramClient, error: Exception) -> None:
+    """Ошибка, которая говорит о состоянии аккаунта, а не группы"""
+    phone_number = _client_accounts.get(telegram_client)
+    if "FROZEN_METHOD_INVALID" in str(error):
+        account_scorer.record_frozen(phone_number)
+    else:
+        account_scorer.record_failure(phone_number)
+
+
+async def _record_error(telegram_client: TelegramClient, url: str, error: Exception) -> None:
+    """Относит ошибку к группе (здоровье группы) или к аккаунту (оценка аккаунта)"""
+    if group_health.classify_group_error(error):
+        await group_health.record_failure(url, error)
+        await membership_registry.forget(_client_accounts.get(telegram_client), url)
+    else:
+        _record_account_error(telegram_client, error)
+
+
+@contextmanager
+def _rpc_stage(telegram_client: TelegramClient, name: str):
+    """Этап RPC: трасса, метрика и задержка в оценку аккаунта"""
+    started = clock.monotonic()
+    with tracing.stage(name):
+        yield
+    account_scorer.record_latency(_client_accounts.get(telegram_client), clock.monotonic() - started, stage=name)
 
 
 async def create_tg_client(tg_account: tg_account_db.TGAccount) -> Optional[TelegramClient]:
     """Создает Telegram клиент с правильной обработкой ошибок и освобождением памяти"""
     client = None
     try:
-        client = TelegramClient(StringSession(tg_account.string_session))
-        await client.start(phone="1")
+        client = client_factory(tg_account.string_session)
+        _client_accounts[client] = tg_account.phone_number
+        with tracing.stage("login", account=tg_account.phone_number):
+            await client.start(phone="1")
         
         if not await client.is_user_authorized():
             logger.warning(f"Аккаунт +{tg_account.phone_number} не авторизован")
@@ -44,6 +111,7 @@ async def create_tg_client(tg_account: tg_account_db.TGAccount) -> Optional[Tele
                 return None
             except errors.FloodWaitError as e:
                 logger.warning(f"FloodWait для +{tg_account.phone_number}: {e}")
+                _record_flood_wait(client, e)
                 return None
             except Exception as e:
                 logger.error(f"Неожиданная ошибка при проверке аккаунта +{tg_account.phone_number}: {e}")
@@ -65,6 +133,8 @@ async def create_tg_client(tg_account: tg_account_db.TGAccount) -> Optional[Tele
         return None
     except errors.FloodWaitError as e:
         logger.warning(f"FloodWait при создании клиента для +{tg_account.phone_number}: {e}")
+        metrics.floodwait_seconds.inc(e.seconds or 0, account=str(tg_account.phone_number))
+        account_scorer.record_flood_wait(tg_account.phone_number, e.seconds or 0)
         if client:
             try:
                 await client.disconnect()
@@ -83,9 +153,14 @@ async def create_tg_client(tg_account: tg_account_db.TGAccount) -> Optional[Tele
 
 async def get_authorized_tg_client_with_check_pause(
         accounts: List[tg_account_db.TGAccount],
-        start_index: int = 0
+        start_index: int = 0,
+        client_getter: Optional[Callable[[tg_account_db.TGAccount], Awaitable[Optional[TelegramClient]]]] = None
 ) -> Tuple[Optional[TelegramClient], int]:
-    """Получает авторизованный клиент с проверкой пауз - ТОЧНО ТАКАЯ ЖЕ логика"""
+    """
+    Получает авторизованный клиент с проверкой пауз.
+    client_getter - откуда брать клиент (например, пул уже залогиненных), по умолчанию новый логин.
+    """
+    client_getter = client_getter or create_tg_client
     current_index = start_index
     
     while current_index < len(accounts):
@@ -106,7 +181,7 @@ async def get_authorized_tg_client_with_check_pause(
 
         # Пытаемся создать клиент
         try:
-            tg_client = await create_tg_client(tg_account)
+            tg_client = await client_getter(tg_account)
             if tg_client is not None:
                 logger.info(f"Авторизован аккаунт: +{tg_account.phone_number}")
                 return tg_client, current_index
@@ -126,37 +201,57 @@ async def get_authorized_tg_client_with_check_pause(
 
 async def checking_and_joining_if_possible(telegram_client: TelegramClient, url: str, channel: channel_db.Channel) -> bool:
     """Проверяет группу и присоединяется к ней если возможно - ТОЧНО ТАКАЯ ЖЕ логика"""
+    # Аккаунт уже состоит в группе - resolve и JoinChannelRequest не нужны
+    phone_number = _client_accounts.get(telegram_client)
+    await membership_registry.ensure_loaded([phone_number])
+    if membership_registry.is_member(phone_number, url):
+        metrics.joins_skipped.inc()
+        return True
+
     try:
-        async with telegram_client:
+        async with connections.session(telegram_client):
             try:
-                group = await telegram_client.get_entity(url)
+                with _rpc_stage(telegram_client, "resolve"):
+                    group = await telegram_client.get_entity(url)
             except (errors.UsernameNotOccupiedError, errors.ChannelPrivateError, errors.ChannelInvalidError, ValueError) as e:
                 logger.error(f"Группа {url} недоступна: {type(e).__name__} - {e}")
-                #await group_db.delete_group_by_url(channel_guid=channel.guid, url=url)
+                await group_health.record_failure(url, e)
                 return False
             except Exception as e:
                 logger.error(f"Неожиданная ошибка при получении группы {url}: {e}")
                 return False
 
             try:
-                await telegram_client(JoinChannelRequest(group))
-                logger.info(f"Успешно присоединился к группе {url}")
+                with _rpc_stage(telegram_client, "join"):
+                    await telegram_client(JoinChannelRequest(group))
+                log.category("join").info("Успешно присоединился к группе {url}", url=url)
+                await membership_registry.record(phone_number, url)
                 return True
             except UserAlreadyParticipantError:
-                logger.info(f"Уже участник группы {url}")
+                log.category("already_member").info("Уже участник группы {url}", url=url)
+                await membership_registry.record(phone_number, url)
                 return True
             except (errors.UsernameNotOccupiedError, errors.ChannelPrivateError, errors.ChannelInvalidError, ValueError) as e:
                 logger.error(f"Не могу присоединиться к группе {url}: {type(e).__name__} - {e}")
-                #await group_db.delete_group_by_url(channel_guid=channel.guid, url=url)
+                await group_health.record_failure(url, e)
                 return False
-            except errors.InviteRequestSentError:
+            except errors.InviteRequestSentError as e:
                 logger.info(f"Отправлен запрос на вступление в группу {url}")
+                account_scorer.record_failure(_client_accounts.get(telegram_client))
+                await group_health.record_failure(url, e)
+                return False
+            except errors.ChannelsTooMuchError:
+                logger.warning(f"🚪 +{phone_number} состоит в слишком многих каналах, не могу вступить в {url}")
+                from .membership_manager import membership_manager
+                membership_manager.flag_full(phone_number)
                 return False
             except errors.FloodWaitError as e:
                 logger.warning(f"FloodWait при вступлении в группу {url}: {e}")
+                _record_flood_wait(telegram_client, e)
                 raise  # Передаем FloodWait наверх
             except Exception as e:
                 logger.error(f"Неожиданная ошибка при вступлении в группу {url}: {e}")
+                await _record_error(telegram_client, url, e)
                 return False
                 
     except Exception as e:
@@ -169,126 +264,71 @@ async def repost_in_group_by_message_id(
         telegram_client: TelegramClient,
         telegram_channel_id: int,
         channel_url: str,
-        group_url: str
+        group_url: str,
+        snapshot: Optional[MessageSnapshot] = None
 ) -> bool:
-    """Делает репост сообщения в группу - ТОЧНО ТАКАЯ ЖЕ логика"""
+    """
+    Делает репост сообщения в группу.
+    Со снимком от слушателя сообщение не запрашивается - пересылаем из канала по id.
+    """
     try:
-        async with telegram_client:
-            telegram_group = await telegram_client.get_entity(group_url)
-            await telegram_client.get_entity(channel_url)
-            message = await telegram_client.get_messages(telegram_channel_id, ids=message_id)
-            
-            if not message:
-                logger.error(f"Сообщение {message_id} не найдено в канале {telegram_channel_id}")
-                return False
+        async with connections.session(telegram_client):
+            with _rpc_stage(telegram_client, "resolve"):
+                telegram_group = await telegram_client.get_entity(group_url)
+                telegram_channel = await telegram_client.get_entity(channel_url)
+                if snapshot is None:
+                    message = await telegram_client.get_messages(telegram_channel_id, ids=message_id)
+                    if not message:
+                        logger.error(f"Сообщение {message_id} не найдено в канале {telegram_channel_id}")
+                        return False
+                    from_peer = message.peer_id
+                else:
+                    from_peer = telegram_channel
             
-            await telegram_client(ForwardMessagesRequest(
-                from_peer=message.peer_id, 
-                id=[message.id], 
-                to_peer=telegram_group
-            ))
-            logger.info(f"Успешно сделан репост в группу {group_url}")
+            with _rpc_stage(telegram_client, "forward"):
+                await telegram_client(ForwardMessagesRequest(
+                    from_peer=from_peer, 
+                    id=[message_id], 
+                    to_peer=telegram_group
+                ))
+            log.category("repost").info("Успешно сделан репост в группу {url}", url=group_url)
+            account_scorer.record_success(_client_accounts.get(telegram_client))
+            await group_health.record_success(group_url)
+            await membership_registry.record(_client_accounts.get(telegram_client), group_url)
             return True
             
+    except errors.FloodWaitError as e:
+        logger.error(f"FloodWait при репосте в группу {group_url}: {e}")
+        _record_flood_wait(telegram_client, e)
+        return False
     except Exception as e:
         logger.error(f"Ошибка при репосте в группу {group_url}: {e}")
+        await _record_error(telegram_client, group_url, e)
         return False
 
 
+async def resolve_input_channel(telegram_client: TelegramClient, channel_url: str) -> InputPeerChannel:
+    """Канал с access hash этого аккаунта (клиент должен быть подключен)"""
+    with _rpc_stage(telegram_client, "resolve"):
+        channel = await telegram_client.get_entity(channel_url)
+    return InputPeerChannel(channel_id=channel.id, access_hash=channel.access_hash)
+
+
 async def send_reaction_by_telegram_client(
         telegram_client: TelegramClient,
-        message: Message,
-        channel_url: str,
+        message_id: int,
+        peer: InputPeerChannel,
         reaction: ReactionEmoji
 ) -> bool:
-    """Ставит реакцию на сообщение - УЛУЧШЕНА с автоматическим отключением"""
+    """Ставит реакцию на сообщение (клиент должен быть подключен, FloodWait пробрасывается)"""
     try:
-        async with telegram_client:
-            channel = await telegram_client.get_entity(channel_url)
+        with _rpc_stage(telegram_client, "react"):
             await telegram_client(SendReactionRequest(
-                peer=InputPeerChannel(
-                    channel_id=channel.id,
-                    access_hash=channel.access_hash
-                ),
-                msg_id=message.id,
+                peer=peer,
+                msg_id=message_id,
                 reaction=[reaction]
             ))
-            return True
+        return True
     except ReactionInvalidError:
         logger.info("Недопустимая реакция")
         return False
-    except Exception as e:
-        logger.error(f"Ошибка при установке реакции: {e}")
-        return False
-
-
-async def send_reaction_with_accounts_on_message(
-        tg_accounts: List[tg_account_db.TGAccount],
-        message: Message,
-        channel_url: str,
-        emoji_reaction: str
-) -> None:
-    """Ставит реакции от нескольких аккаунтов - УЛУЧШЕНА с правильным управлением памятью"""
-    
-    # Список всех клиентов для гарантированного закрытия
-    all_reaction_clients = []
-    
-    try:
-        # Определяем реакцию
-        reaction_map = {
-            "love": "❤️",
-            "ask": "🙏", 
-            "like": "👍"
-        }
-        reaction = ReactionEmoji(emoticon=reaction_map.get(emoji_reaction, "❤️"))
-
-        # Ограничиваем количество аккаунтов для реакций (избегаем перегрузки)
-        max_reactions = min(len(tg_accounts), 5)
-        selected_accounts = tg_accounts[:max_reactions]
-
-        logger.info(f"🎯 Ставлю реакции от {len(selected_accounts)} аккаунтов")
-
-        for tg_account in selected_accounts:
-            telegram_client = None
-            try:
-                telegram_client = await create_tg_client(tg_account)
-                
-                if telegram_client is None:
-                    logger.warning(f"Не удалось создать клиент для реакции +{tg_account.phone_number}")
-                    continue
-
-                # Добавляем в список для обязательного закрытия
-                all_reaction_clients.append(telegram_client)
-
-                success = await send_reaction_by_telegram_client(
-                    telegram_client=telegram_client,
-                    message=message,
-                    channel_url=channel_url,
-                    reaction=reaction
-                )
-                
-                if success:
-                    logger.info(f"✅ Реакция поставлена от +{tg_account.phone_number}")
-                else:
-                    logger.warning(f"❌ Не удалось поставить реакцию от +{tg_account.phone_number}")
-                
-            except FloodWaitError:
-                logger.warning(f"FloodWait при установке реакции от +{tg_account.phone_number}")
-                try:
-                    await telegram_utils.check_ban_in_spambot(telegram_client=telegram_client)
-                except:
-                    pass
-            except Exception as e:
-                logger.error(f"Ошибка при установке реакции от +{tg_account.phone_number}: {e}")
-
-    finally:
-        # ОБЯЗАТЕЛЬНО закрываем все клиенты реакций
-        logger.info(f"🔌 Закрываю {len(all_reaction_clients)} клиентов реакций...")
-        for client in all_reaction_clients:
-            if client:
-                try:
-                    await client.disconnect()
-                    logger.debug("🔌 Клиент реакций отключен")
-                except Exception as e:
-                    logger.debug(f"Ошибка при отключении клиента реакций: {e}")
-        logger.info("✅ Все клиенты реакций закрыты")
\ No newline at end of file
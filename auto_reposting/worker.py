@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+
+import aiofiles
+from loguru import logger
+
+from auto_pause_restorer import start_pause_restorer, stop_pause_restorer
+from auto_reposting import bus
+from auto_reposting.account_scoring import account_scorer
+from auto_reposting.account_validation import account_validator
+from auto_reposting.channel_processor import channel_processor
+from auto_reposting.group_metadata import group_metadata_refresher
+from auto_reposting.membership_manager import membership_manager
+from auto_reposting.message_snapshot import MessageSnapshot
+from auto_reposting.reactions import reaction_fanout
+from auto_reposting.leases import lease_manager
+from core import metrics, tracing
+from core.models import channel as channel_db
+from core.service import run_service
+from core.settings import settings
+
+
+async def handle_new_message(payload: dict) -> None:
+    channel_id = payload["channel_id"]
+    message_id = payload["message_id"]
+    snapshot = MessageSnapshot.from_dict(payload.get("snapshot"))
+
+    success = await channel_processor.add_message(channel_id, message_id, snapshot)
+    if success:
+        stats = channel_processor.get_stats()
+        logger.info(f"✅ Сообщение {message_id} добавлено в очередь. Очередь: {stats['total_queue_size']}, Обработано всего: {stats['total_processed']}")
+    else:
+        logger.warning(f"⚠️ Сообщение {message_id} не добавлено")
+
+
+async def handle_channel_accounts_changed(payload: dict) -> None:
+    """Создает/удаляет воркеры каналов после изменения аккаунтов в админке"""
+    channel_guid = payload.get("channel_guid")
+    if channel_guid:
+        channel_guids = [channel_guid]
+    else:
+        channel_guids = [str(channel.guid) for channel in await channel_db.get_channels()]
+
+    for guid in channel_guids:
+        await channel_processor.ensure_worker_for_channel(guid)
+        await channel_processor.remove_worker_if_no_accounts(guid)
+
+
+async def handle_accounts_imported(payload: dict) -> None:
+    """Новые аккаунты проверяются в фоне и попадают в работу только после проверки"""
+    account_validator.submit(payload.get("phone_numbers") or [])
+
+
+async def handle_groups_added(payload: dict) -> None:
+    """Сущности и метаданные новых групп получаются в фоне, до первого репоста в них"""
+    group_metadata_refresher.submit(payload.get("urls") or [], payload.get("channel_guid"))
+
+
+def create_event_bus() -> bus.EventBus:
+    event_bus = bus.EventBus(owner=lease_manager.owner)
+    event_bus.subscribe(bus.NEW_MESSAGE, handle_new_message)
+    event_bus.subscribe(bus.CHANNEL_ACCOUNTS_CHANGED, handle_channel_accounts_changed)
+    event_bus.subscribe(bus.ACCOUNTS_IMPORTED, handle_accounts_imported)
+    event_bus.subscribe(bus.GROUPS_ADDED, handle_groups_added)
+    # Сообщения канала забирает только узел, у которого есть воркер этого канала
+    event_bus.keys_provider = lambda: list(channel_processor.channel_workers)
+    return event_bus
+
+
+async def dump_stats_loop(interval: int = 15) -> None:
+    """Периодически сохраняет статистику процессора и завершенные трассы в файлы для админ-бота"""
+    directory = os.path.dirname(settings.processor_stats_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    while True:
+        try:
+            stats = channel_processor.get_stats()
+            async with aiofiles.open(settings.processor_stats_file, 'w') as file:
+                await file.write(json.dumps(stats, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.error(f"Ошибка сохранения статистики процессора: {e}")
+        if tracing.exporter is not None:
+            await tracing.exporter.flush()
+        await account_scorer.save()
+        await asyncio.sleep(interval)
+
+
+async def run_worker() -> None:
+    """Сервис доставки: воркеры каналов, автовосстановление пауз и потребитель шины"""
+    await metrics.start_metrics_server(settings.metrics_host, settings.metrics_port)
+    tracing.configure(settings.traces_file)
+    await account_scorer.load()
+
+    logger.info("🚀 Запуск процессора каналов...")
+    await channel_processor.start()
+    logger.success("✅ Процессор каналов запущен")
+
+    logger.info("🔄 Запуск автовосстановления пауз...")
+    pause_restorer_task = asyncio.create_task(start_pause_restorer())
+
+    event_bus = create_event_bus()
+    bus_task = asyncio.create_task(event_bus.run())
+    stats_task = asyncio.create_task(dump_stats_loop())
+    metadata_task = asyncio.create_task(group_metadata_refresher.run())
+    membership_task = asyncio.create_task(membership_manager.run())
+    validation_task = asyncio.create_task(account_validator.run())
+
+    try:
+        await bus_task
+    finally:
+        logger.info("🧹 Остановка сервиса доставки...")
+        event_bus.stop()
+        stats_task.cancel()
+        group_metadata_refresher.stop()
+        metadata_task.cancel()
+        membership_manager.stop()
+        membership_task.cancel()
+        await account_validator.stop()
+        validation_task.cancel()
+        await tracing.exporter.flush()
+
+        logger.info("🛑 Остановка процессора сообщений...")
+        await channel_processor.stop()
+        await reaction_fanout.close()
+
+        logger.info("🛑 Остановка автовосстановления пауз...")
+        stop_pause_restorer()
+        try:
+            await asyncio.wait_for(pause_restorer_task, timeout=5.0)
+        except asyncio.TimeoutError:
+            logger.warning("Таймаут при остановке автовосстановления")
+            pause_restorer_task.cancel()
+
+
+async def main() -> None:
+    logger.info(f"🚀 Запущен сервис доставки (узел {lease_manager.owner})")
+    await run_worker()
+
+
+if __name__ == "__main__":
+    run_service(main, "worker")
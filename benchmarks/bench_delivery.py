@@ -0,0 +1,234 @@
+"""Бенчмарк доставки на симуляторе Telegram (без реальных аккаунтов).
+
+Запуск:
+    python -m benchmarks.bench_delivery --channels 2 --groups 20 --accounts 3 --messages 2
+    python -m benchmarks.bench_delivery --mode fast --latency 0.02 --flood-rate 0.01 --json
+
+Гоняет ChannelProcessor (--mode processor) и/или process_post3.process_group_reposting_fast
+(--mode fast) на временной SQLite базе и печатает: репостов в минуту, p50/p99 времени
+от постановки сообщения до последнего репоста и количество RPC на один репост.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from statistics import quantiles
+from typing import Dict, List, Tuple
+
+_work_dir = tempfile.mkdtemp(prefix="repost_bench_")
+# База и настройки бенчмарка подставляются до импорта core (settings читаются при импорте)
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_work_dir}/bench.sqlite3"
+os.environ["JSON_SETTINGS_FILE"] = f"{_work_dir}/json_settings.json"
+os.environ.setdefault("METRICS_PORT", "0")
+
+from loguru import logger
+
+from benchmarks.fake_telegram import FakeTelegram, FakeTelegramConfig
+from auto_reposting import telegram_utils, telegram_utils2
+from auto_reposting.message_snapshot import MessageSnapshot
+from core import clock
+from core.models import Base, Channel, Group, TGAccount
+from core.models.base import engine, async_session_maker
+from core.settings import settings
+
+
+def write_json_settings(args, **overrides) -> None:
+    bench_settings = {
+        "number_reposts_before_pause": args.reposts_before_pause,
+        "pause_after_rate_reposts": args.pause_after_rate_reposts,
+        "pause_between_reposts": args.pause_between_reposts,
+        "stop_links": [],
+        "check_stop_links": False,
+        "reaction": "like",
+        "start_time": "00:00",
+        "end_time": "23:59",
+        "delay_between_reposts": 0,
+        "delay_between_groups": args.delay_between_groups,
+        "max_groups_per_post": args.groups,
+        "account_usage_window": 86400,
+        **overrides,
+    }
+    with open(settings.json_settings_file, "w") as file:
+        json.dump(bench_settings, file)
+
+
+async def seed_database(args) -> List[Tuple[Channel, List[TGAccount], List[Group]]]:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+    fixtures = []
+    async with async_session_maker() as session:
+        for channel_index in range(args.channels):
+            channel = Channel(url=f"https://t.me/bench_channel_{channel_index}", telegram_channel_id=1000 + channel_index)
+            session.add(channel)
+            await session.flush()
+
+            accounts = [
+                TGAccount(
+                    channel_guid=channel.guid,
+                    telegram_id=channel_index * 1000 + account_index,
+                    phone_number=79000000000 + channel_index * 1000 + account_index,
+                    string_session=f"bench-{channel_index}-{account_index}",
+                    status="WORKING"
+                )
+                for account_index in range(args.accounts)
+            ]
+            groups = [
+                Group(channel_guid=channel.guid, url=f"https://t.me/bench_group_{channel_index}_{group_index}")
+                for group_index in range(args.groups)
+            ]
+            session.add_all(accounts + groups)
+            fixtures.append((channel, accounts, groups))
+        await session.commit()
+    return fixtures
+
+
+def message_ids(args, channel_index: int) -> List[int]:
+    # id уникальны между каналами, чтобы репосты разных каналов не смешивались
+    return [channel_index * 100000 + message_index + 1 for message_index in range(args.messages)]
+
+
+def summarize(mode: str, fake: FakeTelegram, enqueued: Dict[int, float], elapsed: float) -> dict:
+    last_repost: Dict[int, float] = {}
+    for forward in fake.forwards:
+        last_repost[forward["message_id"]] = max(last_repost.get(forward["message_id"], 0.0), forward["at"])
+
+    latencies = sorted(last_repost[message_id] - started for message_id, started in enqueued.items() if message_id in last_repost)
+    if len(latencies) >= 2:
+        percentiles = quantiles(latencies, n=100, method="inclusive")
+        p50, p99 = percentiles[49], percentiles[98]
+    else:
+        p50 = p99 = latencies[0] if latencies else 0.0
+
+    reposts = len(fake.forwards)
+    return {
+        "mode": mode,
+        "messages": len(enqueued),
+        "reposts": reposts,
+        "elapsed_seconds": round(elapsed, 2),
+        "posts_per_minute": round(reposts / elapsed * 60, 1) if elapsed > 0 else 0.0,
+        "p50_time_to_last_repost": round(p50, 3),
+        "p99_time_to_last_repost": round(p99, 3),
+        "rpcs_per_repost": round(fake.total_rpcs / reposts, 2) if reposts else None,
+        "rpc_counts": dict(fake.rpc_counts),
+        "errors": dict(fake.errors),
+    }
+
+
+async def run_processor(args, fake: FakeTelegram, fixtures) -> dict:
+    from auto_reposting.channel_processor import channel_processor
+
+    enqueued: Dict[int, float] = {}
+    started = clock.monotonic()
+    await channel_processor.start()
+    try:
+        for channel_index, (channel, _, _) in enumerate(fixtures):
+            for message_id in message_ids(args, channel_index):
+                enqueued[message_id] = clock.monotonic()
+                await channel_processor.add_message(channel.telegram_channel_id, message_id, MessageSnapshot(id=message_id))
+
+        await asyncio.gather(*(worker.task_queue.join() for worker in channel_processor.channel_workers.values()))
+        elapsed = clock.monotonic() - started
+    finally:
+        await channel_processor.stop()
+    return summarize("processor", fake, enqueued, elapsed)
+
+
+async def run_fast(args, fake: FakeTelegram, fixtures) -> dict:
+    import process_post3
+
+    enqueued: Dict[int, float] = {}
+
+    async def channel_loop(channel_index: int, channel, accounts, groups) -> None:
+        for message_id in message_ids(args, channel_index):
+            enqueued[message_id] = clock.monotonic()
+            await process_post3.process_group_reposting_fast(
+                channel=channel,
+                tg_accounts=accounts,
+                groups=groups,
+                telegram_message_id=message_id
+            )
+
+    started = clock.monotonic()
+    await asyncio.gather(*(
+        channel_loop(channel_index, channel, accounts, groups)
+        for channel_index, (channel, accounts, groups) in enumerate(fixtures)
+    ))
+    return summarize("fast", fake, enqueued, clock.monotonic() - started)
+
+
+async def _skip_admin_message(chat_id: int, text: str) -> bool:
+    logger.debug(f"[admin] {text}")
+    return True
+
+
+async def run(args) -> List[dict]:
+    write_json_settings(args)
+    # Уведомления админу в симуляции не отправляются
+    telegram_utils.send_message = _skip_admin_message
+
+    results = []
+    modes = ["processor", "fast"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        fake = FakeTelegram(FakeTelegramConfig(
+            latency=args.latency,
+            jitter=args.jitter,
+            flood_wait_rate=args.flood_rate,
+            frozen_rate=args.frozen_rate,
+            seed=args.seed,
+        ))
+        telegram_utils2.set_client_factory(fake.client_factory)
+        fixtures = await seed_database(args)
+        runner = run_processor if mode == "processor" else run_fast
+        results.append(await runner(args, fake, fixtures))
+    telegram_utils2.set_client_factory()
+    return results
+
+
+def print_results(results: List[dict]) -> None:
+    for result in results:
+        print(f"\n📊 {result['mode']}: {result['messages']} сообщений, {result['reposts']} репостов за {result['elapsed_seconds']}с")
+        print(f"  ├ 🚀 Репостов/мин: {result['posts_per_minute']}")
+        print(f"  ├ ⏱️ До последнего репоста p50/p99: {result['p50_time_to_last_repost']}с / {result['p99_time_to_last_repost']}с")
+        print(f"  ├ 📡 RPC на репост: {result['rpcs_per_repost']}")
+        print(f"  └ ⚠️ Ошибки симулятора: {result['errors'] or 'нет'}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк доставки на симуляторе Telegram")
+    parser.add_argument("--mode", choices=["processor", "fast", "both"], default="both")
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--groups", type=int, default=20, help="групп на канал")
+    parser.add_argument("--accounts", type=int, default=3, help="аккаунтов на канал")
+    parser.add_argument("--messages", type=int, default=2, help="сообщений на канал")
+    parser.add_argument("--latency", type=float, default=0.02, help="средняя задержка RPC, с")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    parser.add_argument("--frozen-rate", type=float, default=0.0)
+    parser.add_argument("--delay-between-groups", type=int, default=0)
+    parser.add_argument("--pause-between-reposts", type=int, default=0, help="базовая пауза между пакетами быстрого режима, с")
+    parser.add_argument("--reposts-before-pause", type=int, default=1000)
+    parser.add_argument("--pause-after-rate-reposts", type=int, default=900)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="вывести результаты в JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import random
+import zlib
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from telethon import errors
+from telethon.tl.types import PeerChannel
+
+from core import clock
+
+# Методы, на которые симулятор может ответить FROZEN_METHOD_INVALID (как у замороженных аккаунтов)
+FROZEN_METHODS = ("JoinChannelRequest", "ForwardMessagesRequest")
+
+
+@dataclass
+class FakeTelegramConfig:
+    latency: float = 0.05  # средняя задержка одного RPC, секунды
+    jitter: float = 0.5  # разброс задержки в долях от latency
+    flood_wait_rate: float = 0.0  # вероятность FloodWait на любой RPC
+    flood_wait_seconds: int = 30
+    frozen_rate: float = 0.0  # вероятность FROZEN_METHOD_INVALID на вступление/репост
+    # метод -> (не больше N вызовов, за окно в секундах) на один аккаунт, сверх лимита - FloodWait
+    rate_limits: Dict[str, Tuple[int, float]] = field(default_factory=lambda: {
+        "JoinChannelRequest": (20, 60.0),
+        "ForwardMessagesRequest": (30, 60.0),
+    })
+    # Модель банов: репосты аккаунта сверх ban_hourly_limit за час с вероятностью ban_probability
+    # замораживают аккаунт навсегда (0 - выключено)
+    ban_hourly_limit: int = 0
+    ban_probability: float = 0.2
+    seed: int = 0
+
+
+def _entity_id(url: str) -> int:
+    return zlib.crc32(url.encode()) & 0x7FFFFFFF
+
+
+class FakeTelegram:
+    """Общее состояние "сервера" Telegram для всех фейковых клиентов симуляции"""
+
+    def __init__(self, config: Optional[FakeTelegramConfig] = None):
+        self.config = config or FakeTelegramConfig()
+        self.random = random.Random(self.config.seed)
+        self.rpc_counts: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.members: Dict[str, Set[str]] = defaultdict(set)  # url группы -> сессии
+        self.forwards: List[dict] = []
+        self.reactions: List[dict] = []
+        self._calls: Dict[Tuple[str, str], Deque[float]] = defaultdict(deque)
+        self._hourly_forwards: Dict[str, Deque[float]] = defaultdict(deque)
+        self.banned: Set[str] = set()
+
+    def client_factory(self, string_session: str) -> "FakeTelegramClient":
+        return FakeTelegramClient(self, string_session)
+
+    @property
+    def total_rpcs(self) -> int:
+        return sum(self.rpc_counts.values())
+
+    def entity(self, url: str) -> SimpleNamespace:
+        entity_id = _entity_id(url)
+        return SimpleNamespace(id=entity_id, access_hash=entity_id * 31, url=url, megagroup=True)
+
+    def participants_count(self, url: str) -> int:
+        return 100 + _entity_id(url) % 50000
+
+    def _check_rate_limit(self, session: str, method: str, request) -> None:
+        limit = self.config.rate_limits.get(method)
+        if not limit:
+            return
+
+        max_calls, period = limit
+        now = clock.monotonic()
+        calls = self._calls[(session, method)]
+        while calls and now - calls[0] >= period:
+            calls.popleft()
+        if len(calls) >= max_calls:
+            wait = int(period - (now - calls[0])) + 1
+            self.errors["rate_limit"] += 1
+            raise errors.FloodWaitError(request=request, capture=wait)
+        calls.append(now)
+
+    async def rpc(self, session: str, method: str, request=None) -> None:
+        """Учитывает вызов, выдерживает задержку и при необходимости выбрасывает ошибку"""
+        self.rpc_counts[method] += 1
+        config = self.config
+
+        delay = config.latency * (1 + self.random.uniform(-config.jitter, config.jitter))
+        if delay > 0:
+            await clock.sleep(delay)
+
+        if session in self.banned and method in FROZEN_METHODS:
+            raise errors.RPCError(request, "FROZEN_METHOD_INVALID", 400)
+
+        self._check_rate_limit(session, method, request)
+
+        if config.flood_wait_rate and self.random.random() < config.flood_wait_rate:
+            self.errors["flood_wait"] += 1
+            raise errors.FloodWaitError(request=request, capture=config.flood_wait_seconds)
+
+        if method in FROZEN_METHODS and config.frozen_rate and self.random.random() < config.frozen_rate:
+            self.errors["frozen"] += 1
+            raise errors.RPCError(request, "FROZEN_METHOD_INVALID", 400)
+
+    def _register_forward(self, session: str) -> None:
+        limit = self.config.ban_hourly_limit
+        if not limit:
+            return
+
+        now = clock.monotonic()
+        forwards = self._hourly_forwards[session]
+        while forwards and now - forwards[0] >= 3600:
+            forwards.popleft()
+        forwards.append(now)
+        if len(forwards) > limit and self.random.random() < self.config.ban_probability:
+            self.banned.add(session)
+
+
+class FakeTelegramClient:
+    """Подмножество TelegramClient, которое используют воркеры и process_post3"""
+
+    def __init__(self, server: FakeTelegram, string_session: str):
+        self.server = server
+        self.session = string_session
+        self._connected = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.disconnect()
+
+    async def connect(self) -> None:
+        if not self._connected:
+            await self.server.rpc(self.session, "connect")
+            self._connected = True
+
+    async def start(self, phone=None):
+        await self.connect()
+        await self.server.rpc(self.session, "start")
+        return self
+
+    async def disconnect(self) -> None:
+        self._connected = False
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def _rpc(self, method: str, request=None) -> None:
+        """Как в Telethon: запрос без подключения или оборванный disconnect() во время ожидания ответа падает"""
+        if not self._connected:
+            self.server.errors["disconnected"] += 1
+            raise ConnectionError("Cannot send requests while disconnected")
+        await self.server.rpc(self.session, method, request)
+        if not self._connected:
+            self.server.errors["disconnected"] += 1
+            raise ConnectionError("Connection closed while the request was in flight")
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    async def get_me(self):
+        await self._rpc("get_me")
+        return SimpleNamespace(id=_entity_id(self.session), phone=self.session)
+
+    async def get_entity(self, url):
+        await self._rpc("get_entity")
+        return self.server.entity(str(url))
+
+    async def get_dialogs(self, limit=None):
+        await self._rpc("get_dialogs")
+        return SimpleNamespace(total=sum(1 for members in self.server.members.values() if self.session in members))
+
+    async def iter_dialogs(self, limit=None, ignore_migrated=False):
+        await self._rpc("get_dialogs")
+        for url, members in list(self.server.members.items()):
+            if self.session in members:
+                yield SimpleNamespace(is_channel=True, name=url)
+
+    async def get_messages(self, channel_id, ids=None):
+        await self._rpc("get_messages")
+        return SimpleNamespace(id=ids, peer_id=PeerChannel(channel_id), message="", entities=None, reply_markup=None)
+
+    async def __call__(self, request):
+        method = type(request).__name__
+        await self._rpc(method, request)
+
+        if method == "JoinChannelRequest":
+            url = getattr(request.channel, "url", str(request.channel))
+            if self.session in self.server.members[url]:
+                raise errors.UserAlreadyParticipantError(request=request)
+            self.server.members[url].add(self.session)
+        elif method == "LeaveChannelRequest":
+            url = getattr(request.channel, "url", str(request.channel))
+            if self.session not in self.server.members[url]:
+                raise errors.UserNotParticipantError(request=request)
+            self.server.members[url].discard(self.session)
+        elif method == "ForwardMessagesRequest":
+            self.server.forwards.append({
+                "session": self.session,
+                "group": getattr(request.to_peer, "url", None),
+                "message_id": request.id[0],
+                "at": clock.monotonic(),
+            })
+            self.server._register_forward(self.session)
+        elif method == "SendReactionRequest":
+            self.server.reactions.append({"session": self.session, "message_id": request.msg_id})
+        elif method == "GetFullChannelRequest":
+            url = getattr(request.channel, "url", str(request.channel))
+            return SimpleNamespace(full_chat=SimpleNamespace(
+                participants_count=self.server.participants_count(url), slowmode_seconds=0
+            ))
+        elif method == "GetHistoryRequest":
+            return SimpleNamespace(messages=[])
+        return None
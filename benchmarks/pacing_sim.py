@@ -0,0 +1,219 @@
+"""Симуляция суток доставки в виртуальном времени для сравнения стратегий темпа и ротации.
+
+Запуск:
+    python -m benchmarks.pacing_sim --hours 24 --posts-per-day 24 --channels 2 --groups 20 --accounts 5
+    python -m benchmarks.pacing_sim --strategies current,gentle --ban-hourly-limit 20 --json
+    python -m benchmarks.pacing_sim --strategy-file my_strategies.json
+
+ChannelWorker, PauseRestorer, аренды и симулятор Telegram работают на VirtualClock:
+все паузы (delay_between_groups, pause_after_rate_reposts, 300с "все аккаунты недоступны",
+20 минут автовосстановления) проходят мгновенно, а порядок событий детерминирован seed.
+Стратегия - это набор переопределений json_settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from statistics import quantiles
+from typing import Dict, List
+
+# bench_delivery подставляет временную базу и json_settings - импортируется до core
+from benchmarks.bench_delivery import seed_database, write_json_settings, _skip_admin_message
+from benchmarks.fake_telegram import FakeTelegram, FakeTelegramConfig
+from loguru import logger
+
+from auto_pause_restorer import PauseRestorer
+from auto_reposting import telegram_utils, telegram_utils2
+from auto_reposting.channel_processor import ChannelProcessor
+from auto_reposting.message_snapshot import MessageSnapshot
+from auto_reposting.leases import lease_manager
+from core import clock
+
+REPO_JSON_SETTINGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "json_settings.json")
+
+STRATEGIES: Dict[str, dict] = {
+    # Значения из json_settings.json репозитория
+    "current": {},
+    "gentle": {"delay_between_groups": 180, "number_reposts_before_pause": 5, "pause_after_rate_reposts": 3600},
+    "aggressive": {"delay_between_groups": 15, "number_reposts_before_pause": 30, "pause_after_rate_reposts": 600},
+}
+
+
+def load_strategies(args) -> Dict[str, dict]:
+    with open(REPO_JSON_SETTINGS) as file:
+        repo_settings = json.load(file)
+    pacing_keys = ("delay_between_groups", "number_reposts_before_pause", "pause_after_rate_reposts", "max_groups_per_post")
+    current = {key: repo_settings[key] for key in pacing_keys if key in repo_settings}
+
+    strategies = {name: {**current, **overrides} for name, overrides in STRATEGIES.items()}
+    if args.strategy_file:
+        with open(args.strategy_file) as file:
+            for name, overrides in json.load(file).items():
+                strategies[name] = {**current, **overrides}
+
+    if args.strategies:
+        selected = [name.strip() for name in args.strategies.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in strategies]
+        if unknown:
+            raise SystemExit(f"Неизвестные стратегии: {', '.join(unknown)}")
+        strategies = {name: strategies[name] for name in selected}
+    return strategies
+
+
+def arrival_schedule(args, channel_index: int) -> List[float]:
+    """Моменты публикации постов канала в течение симуляции (равномерно случайно, по seed)"""
+    rng = random.Random(args.seed * 1000 + channel_index)
+    duration = args.hours * 3600
+    count = int(args.posts_per_day * args.hours / 24)
+    return sorted(rng.uniform(0, duration) for _ in range(count))
+
+
+async def publish_posts(args, processor: ChannelProcessor, fixtures, enqueued: Dict[int, float]) -> None:
+    events = []
+    for channel_index, (channel, _, _) in enumerate(fixtures):
+        for message_index, at in enumerate(arrival_schedule(args, channel_index)):
+            events.append((at, channel.telegram_channel_id, channel_index * 100000 + message_index + 1))
+
+    for at, telegram_channel_id, message_id in sorted(events):
+        await clock.sleep(at - clock.monotonic())
+        enqueued[message_id] = clock.monotonic()
+        await processor.add_message(telegram_channel_id, message_id, MessageSnapshot(id=message_id))
+
+
+async def simulate(args, name: str, strategy: dict) -> dict:
+    virtual_clock = clock.VirtualClock()
+    clock.set_clock(virtual_clock)
+    fake = FakeTelegram(FakeTelegramConfig(
+        latency=args.latency,
+        jitter=0.5,
+        flood_wait_rate=args.flood_rate,
+        frozen_rate=args.frozen_rate,
+        ban_hourly_limit=args.ban_hourly_limit,
+        ban_probability=args.ban_probability,
+        seed=args.seed,
+    ))
+    telegram_utils2.set_client_factory(fake.client_factory)
+    write_json_settings(args, **strategy)
+    fixtures = await seed_database(args)
+
+    processor = ChannelProcessor()
+    restorer = PauseRestorer(notify_admin=False)
+    enqueued: Dict[int, float] = {}
+    wall_started = time.monotonic()
+
+    await processor.start()
+    background = [
+        asyncio.create_task(restorer.run_continuous_check()),
+        asyncio.create_task(publish_posts(args, processor, fixtures, enqueued)),
+    ]
+    await virtual_clock.run_until(args.hours * 3600)
+
+    restorer.stop()
+    for task in background:
+        task.cancel()
+    stop_task = asyncio.create_task(processor.stop())
+    while not stop_task.done():
+        await virtual_clock.run_until(virtual_clock.time + 60)
+    # Оставшиеся задачи (например, очистка защиты от дублей) спят на часах этой симуляции
+    leftovers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in leftovers:
+        task.cancel()
+    await asyncio.gather(*leftovers, return_exceptions=True)
+
+    result = summarize(name, strategy, fake, enqueued, args)
+    result["wall_seconds"] = round(time.monotonic() - wall_started, 2)
+    clock.set_clock()
+    return result
+
+
+def summarize(name: str, strategy: dict, fake: FakeTelegram, enqueued: Dict[int, float], args) -> dict:
+    last_repost: Dict[int, float] = {}
+    for forward in fake.forwards:
+        last_repost[forward["message_id"]] = max(last_repost.get(forward["message_id"], 0.0), forward["at"])
+    latencies = sorted(last_repost[message_id] - at for message_id, at in enqueued.items() if message_id in last_repost)
+    if len(latencies) >= 2:
+        percentiles = quantiles(latencies, n=100, method="inclusive")
+        p50, p99 = percentiles[49], percentiles[98]
+    else:
+        p50 = p99 = latencies[0] if latencies else 0.0
+
+    total_accounts = args.channels * args.accounts
+    reposts = len(fake.forwards)
+    return {
+        "strategy": name,
+        "settings": strategy,
+        "posts": len(enqueued),
+        "reposts": reposts,
+        "reposts_per_hour": round(reposts / args.hours, 1) if args.hours else 0.0,
+        "reposts_per_post": round(reposts / len(enqueued), 1) if enqueued else 0.0,
+        "p50_minutes_to_last_repost": round(p50 / 60, 1),
+        "p99_minutes_to_last_repost": round(p99 / 60, 1),
+        "banned_accounts": len(fake.banned),
+        "ban_rate": round(len(fake.banned) / total_accounts, 3) if total_accounts else 0.0,
+        "errors": dict(fake.errors),
+    }
+
+
+def print_results(results: List[dict], hours: float) -> None:
+    for result in results:
+        print(f"\n🧪 {result['strategy']} {result['settings']}")
+        print(f"  ├ 📨 Постов: {result['posts']}, репостов за {hours:g}ч: {result['reposts']} ({result['reposts_per_hour']}/ч, {result['reposts_per_post']} на пост)")
+        print(f"  ├ ⏱️ До последнего репоста p50/p99: {result['p50_minutes_to_last_repost']} / {result['p99_minutes_to_last_repost']} мин")
+        print(f"  ├ 🚫 Забанено аккаунтов: {result['banned_accounts']} ({result['ban_rate'] * 100:.1f}%)")
+        print(f"  ├ ⚠️ Ошибки симулятора: {result['errors'] or 'нет'}")
+        print(f"  └ 🖥️ Реальное время симуляции: {result['wall_seconds']}с")
+
+
+async def run(args) -> List[dict]:
+    # Один узел в симуляции: продлевать аренды каждые 30 виртуальных секунд незачем
+    lease_manager.ttl = int(args.hours * 3600 * 2)
+    lease_manager.heartbeat_interval = 3600
+    telegram_utils.send_message = _skip_admin_message
+
+    results = []
+    for name, strategy in load_strategies(args).items():
+        logger.info(f"🧪 Стратегия {name}: {strategy}")
+        results.append(await simulate(args, name, strategy))
+    telegram_utils2.set_client_factory()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Симуляция темпа доставки в виртуальном времени")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--posts-per-day", type=int, default=24, help="постов на канал в сутки")
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--groups", type=int, default=20, help="групп на канал")
+    parser.add_argument("--accounts", type=int, default=5, help="аккаунтов на канал")
+    parser.add_argument("--latency", type=float, default=0.5, help="средняя задержка RPC, виртуальные секунды")
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    parser.add_argument("--frozen-rate", type=float, default=0.0)
+    parser.add_argument("--ban-hourly-limit", type=int, default=20, help="репостов аккаунта в час, после которых возможен бан (0 - без банов)")
+    parser.add_argument("--ban-probability", type=float, default=0.05)
+    parser.add_argument("--strategies", default="", help="через запятую, по умолчанию все")
+    parser.add_argument("--strategy-file", default="", help="JSON {имя: {настройки}} с дополнительными стратегиями")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true")
+    # Поля, которые ожидает write_json_settings из bench_delivery
+    parser.set_defaults(reposts_before_pause=10, pause_after_rate_reposts=900, delay_between_groups=60, pause_between_reposts=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_results(results, args.hours)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class RealClock:
+    """Обычное время: datetime.now() и asyncio.sleep"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+    async def wait_for(self, awaitable: Awaitable[T], timeout: float) -> T:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+
+
+class VirtualClock:
+    """Детерминированное виртуальное время для симуляций.
+
+    Время двигается только когда все задачи event loop либо ждут в sleep/wait_for
+    этих часов, либо завершены. Задачи, которые ждут что-то другое (запрос к БД),
+    считаются активными - часы ждут их по-настоящему, поэтому результат симуляции
+    не зависит от скорости диска.
+    """
+
+    def __init__(self, start: Optional[datetime] = None, stall_timeout: float = 30.0):
+        self.start = start or datetime(2024, 1, 1)
+        self.time = 0.0
+        self.stall_timeout = stall_timeout
+        # (время пробуждения, порядковый номер, future, задача)
+        self._sleepers: List[Tuple[float, int, asyncio.Future, Optional[asyncio.Task]]] = []
+        self._sequence = itertools.count()
+        self._parked: Set[asyncio.Task] = set()
+        self._helpers: Set[asyncio.Task] = set()
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.time)
+
+    def monotonic(self) -> float:
+        return self.time
+
+    def _schedule(self, seconds: float) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        task = asyncio.current_task()
+        heapq.heappush(self._sleepers, (self.time + max(0.0, seconds), next(self._sequence), future, task))
+        if task is not None:
+            self._parked.add(task)
+        return future
+
+    async def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+
+        future = self._schedule(seconds)
+        try:
+            await future
+        finally:
+            self._parked.discard(asyncio.current_task())
+
+    async def wait_for(self, awaitable: Awaitable[T], timeout: float) -> T:
+        task = asyncio.current_task()
+        inner = asyncio.ensure_future(awaitable)
+        self._helpers.add(inner)
+        # Как только результат готов, задача снова активна - часы не уйдут вперед до ее пробуждения
+        inner.add_done_callback(lambda future: future.cancelled() or self._parked.discard(task))
+        timer = self._schedule(timeout)
+        try:
+            await asyncio.wait({inner, timer}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            inner.cancel()
+            raise
+        finally:
+            self._parked.discard(task)
+            self._helpers.discard(inner)
+            timer.cancel()
+
+        if inner.done():
+            return inner.result()
+        inner.cancel()
+        raise asyncio.TimeoutError()
+
+    def _active_tasks(self) -> List[asyncio.Task]:
+        current = asyncio.current_task()
+        return [
+            task for task in asyncio.all_tasks()
+            if task is not current and not task.done()
+            and task not in self._parked and task not in self._helpers
+        ]
+
+    async def _settle(self) -> None:
+        """Дает всем активным задачам дойти до ожидания часов"""
+        idle_iterations = 0
+        started = time.monotonic()
+        while idle_iterations < 3:
+            await asyncio.sleep(0)
+            active = self._active_tasks()
+            if not active:
+                idle_iterations += 1
+                continue
+
+            idle_iterations = 0
+            if time.monotonic() - started > self.stall_timeout:
+                names = ", ".join(task.get_coro().__qualname__ for task in active[:5])
+                raise RuntimeError(f"Виртуальные часы: задачи не засыпают {self.stall_timeout}с ({names})")
+            # Ждем по-настоящему (например, ответ БД из потока aiosqlite)
+            await asyncio.sleep(0.001)
+
+    async def run_until(self, seconds: float) -> None:
+        """Прокручивает виртуальное время до отметки seconds от старта"""
+        while True:
+            await self._settle()
+
+            while self._sleepers and self._sleepers[0][2].done():
+                heapq.heappop(self._sleepers)
+            if not self._sleepers or self._sleepers[0][0] > seconds:
+                self.time = max(self.time, seconds)
+                return
+
+            wake_at = self._sleepers[0][0]
+            self.time = max(self.time, wake_at)
+            while self._sleepers and self._sleepers[0][0] <= wake_at:
+                _, _, future, task = heapq.heappop(self._sleepers)
+                if not future.done():
+                    self._parked.discard(task)
+                    future.set_result(None)
+
+
+_clock = RealClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock=None) -> None:
+    """Подменяет часы процесса. Без аргумента возвращает обычное время"""
+    global _clock
+    _clock = clock or RealClock()
+
+
+def now() -> datetime:
+    return _clock.now()
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+async def sleep(seconds: float) -> None:
+    await _clock.sleep(seconds)
+
+
+async def wait_for(awaitable: Awaitable[T], timeout: float) -> T:
+    return await _clock.wait_for(awaitable, timeout)
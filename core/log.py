@@ -0,0 +1,90 @@
+import sys
+import time
+from typing import Dict, Tuple
+
+from loguru import logger
+
+# Категория -> (сколько строк пропускать, за сколько секунд)
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[int, float]] = {
+    "already_member": (5, 60.0),
+    "join": (30, 60.0),
+    "repost": (60, 60.0),
+    "group_attempt": (60, 60.0),
+    "queue": (30, 60.0),
+}
+
+CONSOLE_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+
+
+class RateLimitFilter:
+    """Пропускает не больше N строк категории за окно, остальное считает и дописывает к следующей строке"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]]):
+        self.limits = dict(limits)
+        # категория -> [начало окна, пропущено в окне, подавлено]
+        self._windows: Dict[str, list] = {}
+
+    def __call__(self, record) -> bool:
+        category = record["extra"].get("category")
+        limit = self.limits.get(category) if category else None
+        if limit is None:
+            return True
+
+        # Один и тот же record проходит через фильтр каждого обработчика - решаем один раз
+        if "sampled" in record["extra"]:
+            return record["extra"]["sampled"]
+
+        record["extra"]["sampled"] = self._decide(record, category, limit)
+        return record["extra"]["sampled"]
+
+    def _decide(self, record, category: str, limit: Tuple[int, float]) -> bool:
+        max_lines, period = limit
+        now = time.monotonic()
+        window = self._windows.get(category)
+        if window is None or now - window[0] >= period:
+            suppressed = window[2] if window else 0
+            self._windows[category] = [now, 1, 0]
+            if suppressed:
+                record["message"] += f" (+{suppressed} похожих за {period:.0f}с скрыто)"
+            return True
+
+        if window[1] < max_lines:
+            window[1] += 1
+            return True
+
+        window[2] += 1
+        return False
+
+
+def category(name: str):
+    """Логгер с категорией для ограничения частоты: log.category("already_member").info(...)"""
+    return logger.bind(category=name)
+
+
+def setup_logging(service_name: str, log_file: str, level: str = "INFO", json_logs: bool = False) -> None:
+    """Консоль + файл через фоновые очереди (enqueue), чтобы запись логов не блокировала event loop"""
+    rate_limit = RateLimitFilter(DEFAULT_RATE_LIMITS)
+    logger.remove()
+    logger.configure(extra={"service": service_name})
+
+    logger.add(
+        sys.stderr,
+        level=level,
+        format=CONSOLE_FORMAT,
+        filter=rate_limit,
+        enqueue=True,
+        serialize=json_logs,
+    )
+    logger.add(
+        log_file,
+        level=level,
+        filter=rate_limit,
+        enqueue=True,
+        serialize=json_logs,
+        rotation="1 day",
+        retention="10 days",
+        compression="zip",
+    )
@@ -0,0 +1,102 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, List, Optional
+
+from loguru import logger
+
+from core import metrics
+from core.settings import settings
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoopMonitor:
+    """Замеряет задержку event loop и ловит блокирующие вызовы сторожевым потоком"""
+
+    def __init__(self, interval: float = 0.5, block_threshold: float = 1.0, samples: int = 1200):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lags: Deque[float] = deque(maxlen=samples)
+        self.blocks: Deque[dict] = deque(maxlen=20)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Запускает замер в текущем loop и сторожевой поток. Повторный вызов перезапускает замер"""
+        self.stop()
+        self._stopped = threading.Event()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+
+        self._watchdog = threading.Thread(target=self._watch, args=(self._stopped,), name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self._heartbeat = now
+            self.lags.append(lag)
+            metrics.loop_lag.observe(lag)
+
+    def _watch(self, stopped: threading.Event) -> None:
+        reported_heartbeat = None
+        check_interval = max(0.05, self.block_threshold / 4)
+
+        while not stopped.wait(check_interval):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.block_threshold or heartbeat == reported_heartbeat:
+                continue
+
+            # Один отчет на одну остановку loop
+            reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "стек недоступен"
+            self.blocks.append({
+                "at": time.time(),
+                "blocked_for": round(blocked_for, 3),
+                "stack": stack,
+            })
+            metrics.loop_blocks.inc()
+            logger.warning(
+                "🐌 Event loop заблокирован {seconds:.2f}с, стек:\n{stack}",
+                seconds=blocked_for, stack=stack
+            )
+
+    def get_stats(self) -> dict:
+        values = sorted(self.lags)
+        last_block = self.blocks[-1] if self.blocks else None
+        return {
+            'samples': len(values),
+            'p50_ms': round(_percentile(values, 50) * 1000, 1),
+            'p95_ms': round(_percentile(values, 95) * 1000, 1),
+            'p99_ms': round(_percentile(values, 99) * 1000, 1),
+            'max_ms': round(values[-1] * 1000, 1) if values else 0.0,
+            'blocks_count': len(self.blocks),
+            'last_block': {k: v for k, v in last_block.items() if k != 'stack'} if last_block else None,
+        }
+
+
+loop_monitor = LoopMonitor(block_threshold=settings.loop_block_threshold)
@@ -0,0 +1,262 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from aiohttp import web
+from loguru import logger
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонный счетчик"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(_Metric):
+    """Текущее значение. Может вычисляться функцией в момент запроса /metrics"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels) -> None:
+        """Убирает серию (объект ушел из работы и не должен висеть на /metrics)"""
+        self._values.pop(self._key(labels), None)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                yield f"{self.name} {self._function()}"
+            except Exception as e:
+                logger.debug(f"Ошибка вычисления метрики {self.name}: {e}")
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами (кумулятивные счетчики считаются при выдаче)"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [счетчики по корзинам + корзина +Inf, сумма]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def _samples(self):
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = Registry()
+
+# Конвейер доставки
+messages_received = Counter("repost_messages_received_total", "Сообщения, полученные процессором", ["channel"])
+messages_queued = Counter("repost_messages_queued_total", "Сообщения, поставленные в очередь канала", ["channel"])
+messages_processed = Counter("repost_messages_processed_total", "Сообщения, обработанные воркером", ["channel"])
+reposts_total = Counter("repost_reposts_total", "Попытки репоста в группы по результату", ["result"])
+queue_depth = Gauge("repost_queue_depth", "Размер очереди канала", ["channel"])
+task_duration = Histogram("repost_task_duration_seconds", "Время обработки одного сообщения", buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 3600))
+
+# Telegram RPC
+stage_latency = Histogram("repost_stage_latency_seconds", "Длительность этапов (login, resolve, join, forward, react)", ["stage"])
+floodwait_seconds = Counter("repost_floodwait_seconds_total", "Секунды FloodWait по аккаунтам", ["account"])
+active_connections = Gauge("repost_active_connections", "Подключенные Telegram-клиенты")
+client_connections = Counter("repost_client_connections_total", "Взятия подключения клиента: новое соединение (connect) или уже открытое (reuse)", ["event"])
+reactions_total = Counter("repost_reactions_total", "Реакции на посты со стоп-ссылками по результату", ["result"])
+reactions_pending = Gauge("repost_reactions_pending", "Рассылки реакций, выполняющиеся в фоне")
+
+# Темп быстрого режима (AIMD)
+fast_concurrency = Gauge("repost_fast_concurrency", "Размер пакета (параллельных репостов) быстрого режима по аккаунтам (guid) в работе", ["account"])
+fast_batch_delay = Gauge("repost_fast_batch_delay_seconds", "Пауза между пакетами быстрого режима по аккаунтам (guid) в работе", ["account"])
+fast_pacing_decisions = Counter("repost_fast_pacing_decisions_total", "Решения регулятора темпа (increase, flood, latency, failures, error)", ["decision"])
+
+# Здоровье групп
+group_failures = Counter("repost_group_failures_total", "Ошибки групп по видам (not_found, private, write_forbidden, banned, join_request)", ["kind"])
+groups_quarantined = Counter("repost_groups_quarantined_total", "Отправки групп на карантин")
+joins_skipped = Counter("repost_joins_skipped_total", "Вступления, пропущенные из-за известного членства")
+groups_left = Counter("repost_groups_left_total", "Выходы аккаунтов из лишних групп")
+routed_deliveries = Counter("repost_routed_deliveries_total", "Доставки, отданные аккаунту-участнику или домашнему аккаунту группы")
+
+# Проверка новых аккаунтов
+account_validations = Counter("repost_account_validations_total", "Проверки импортированных аккаунтов по результату (working, unauthorized, spam_limited, banned, frozen, flood_wait, error)", ["result"])
+
+# Паузы аккаунтов
+pause_checks = Counter("repost_pause_checks_total", "Проверки истекших пауз")
+accounts_restored = Counter("repost_accounts_restored_total", "Аккаунты, восстановленные из паузы")
+
+# Event loop
+loop_lag = Histogram("repost_event_loop_lag_seconds", "Задержка event loop", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+loop_blocks = Counter("repost_event_loop_blocks_total", "Блокировки event loop дольше порога")
+
+# База данных
+db_round_trip = Histogram("repost_db_round_trip_seconds", "Время выполнения SQL-запроса")
+
+
+def instrument_engine(async_engine) -> None:
+    """Вешает замер времени SQL-запросов на движок SQLAlchemy"""
+    sync_engine = async_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_time")
+        if start_times:
+            db_round_trip.observe(time.perf_counter() - start_times.pop())
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+_metrics_runner: Optional[web.AppRunner] = None
+
+
+async def start_metrics_server(host: str, port: int) -> None:
+    """Поднимает локальный HTTP /metrics. Повторный вызов в том же запуске сервиса ничего не делает"""
+    global _metrics_runner
+    if _metrics_runner is not None or not port:
+        return
+
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.error(f"Не удалось запустить /metrics на {host}:{port}: {e}")
+        await runner.cleanup()
+        return
+
+    _metrics_runner = runner
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+
+
+async def stop_metrics_server() -> None:
+    """Останавливает /metrics. После перезапуска сервиса (новый event loop) сервер поднимется заново"""
+    global _metrics_runner
+    runner, _metrics_runner = _metrics_runner, None
+    if runner is None:
+        return
+    try:
+        await runner.cleanup()
+    except Exception as e:
+        logger.debug(f"Ошибка остановки /metrics: {e}")
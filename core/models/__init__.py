@@ -3,7 +3,12 @@ __all__ = (
     "Channel",
     "TGAccount",
     "Group",
-    "Repost"
+    "Repost",
+    "AccountUsage",
+    "Lease",
+    "OutboxEvent",
+    "GroupHealth",
+    "GroupMembership"
 )
 
 from .base import Base
@@ -11,3 +16,8 @@ from .tg_account import TGAccount
 from .channel import Channel
 from .group import Group
 from .repost import Repost
+from .account_usage import AccountUsage
+from .lease import Lease
+from .outbox import OutboxEvent
+from .group_health import GroupHealth
+from .group_membership import GroupMembership
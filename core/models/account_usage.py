@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core import clock
+from core.models.base import Base, async_session_maker
+
+
+class AccountUsage(Base):
+    """Один репост аккаунта. Строки за окно = израсходованный бюджет до паузы"""
+    __tablename__ = "account_usage"
+
+    tg_account_guid: Mapped[UUID] = mapped_column(index=True)
+    channel_guid: Mapped[UUID] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(index=True)
+
+
+async def add_account_usage(tg_account_guid: UUID, channel_guid: str | UUID | None = None, count: int = 1) -> None:
+    """Записывает count репостов аккаунта (пакет быстрого режима пишется одним коммитом)"""
+    if count <= 0:
+        return
+
+    now = clock.now()
+    async with async_session_maker() as session:
+        session.add_all([
+            AccountUsage(
+                tg_account_guid=tg_account_guid,
+                channel_guid=UUID(str(channel_guid)) if channel_guid else None,
+                created_at=now
+            )
+            for _ in range(count)
+        ])
+        await session.commit()
+
+
+async def get_account_usage_counts(tg_account_guids: List[UUID], since: datetime) -> Dict[UUID, int]:
+    """Количество репостов каждого аккаунта начиная с since"""
+    if not tg_account_guids:
+        return {}
+
+    async with async_session_maker() as session:
+        query = select(AccountUsage.tg_account_guid, func.count()).where(
+            AccountUsage.tg_account_guid.in_(tg_account_guids),
+            AccountUsage.created_at >= since
+        ).group_by(AccountUsage.tg_account_guid)
+        result = await session.execute(query)
+        return {guid: count for guid, count in result.all()}
+
+
+async def get_last_used_account_guid(tg_account_guids: List[UUID], since: datetime) -> Optional[UUID]:
+    """Аккаунт, который последним делал репост (на нём остановилась ротация)"""
+    if not tg_account_guids:
+        return None
+
+    async with async_session_maker() as session:
+        query = select(AccountUsage.tg_account_guid).where(
+            AccountUsage.tg_account_guid.in_(tg_account_guids),
+            AccountUsage.created_at >= since
+        ).order_by(AccountUsage.created_at.desc()).limit(1)
+        result = await session.execute(query)
+        return result.scalars().first()
+
+
+async def reset_account_usage(tg_account_guid: UUID) -> None:
+    """Обнуляет бюджет аккаунта (вызывается когда аккаунт уходит на паузу)"""
+    async with async_session_maker() as session:
+        await session.execute(delete(AccountUsage).where(AccountUsage.tg_account_guid == tg_account_guid))
+        await session.commit()
+
+
+async def cleanup_account_usage(before: datetime) -> int:
+    """Удаляет записи старше окна. Возвращает количество удаленных"""
+    async with async_session_maker() as session:
+        result = await session.execute(delete(AccountUsage).where(AccountUsage.created_at < before))
+        await session.commit()
+        return result.rowcount
@@ -4,6 +4,7 @@ from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped, sessionmaker
 
+from core.metrics import instrument_engine
 from core.settings import settings
 
 
@@ -14,6 +15,7 @@ class Base(DeclarativeBase):
 
 
 engine = create_async_engine(settings.database_url.get_secret_value())
+instrument_engine(engine)
 async_session_maker = sessionmaker(
     engine,
     class_=AsyncSession,
@@ -23,6 +25,15 @@ async_session_maker = sessionmaker(
 )
 
 
+def dialect_insert(model):
+    """INSERT с поддержкой ON CONFLICT для текущей СУБД (PostgreSQL или SQLite)"""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
@@ -1,11 +1,14 @@
+import re
 from datetime import datetime
-from typing import List
-from uuid import UUID
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID, uuid4
 
-from sqlalchemy import Enum, select, update, delete
+from sqlalchemy import Enum, Index, select, update, delete, or_, func
 from sqlalchemy.orm import Mapped, mapped_column
 
-from core.models.base import Base, async_session_maker
+from core import clock
+from core.models.base import Base, async_session_maker, dialect_insert
+from core.models.group_health import GroupHealth
 from core.schemas import group as group_schemas
 
 
@@ -14,6 +17,46 @@ class Group(Base):
 
     channel_guid: Mapped[UUID]
     url: Mapped[str]
+    # Виртуальное время ротации группы в канале (stride scheduling), None - еще не выбиралась
+    rotation_pass: Mapped[float] = mapped_column(nullable=True)
+
+    __table_args__ = (Index("uq_groups_channel_url", "channel_guid", "url", unique=True),)
+
+
+# https://telegram.me/name, www.t.me/name, t.me/s/name -> путь после домена
+_GROUP_LINK = re.compile(r"^(?:https?://)?(?:www\.)?(?:t|telegram)\.(?:me|dog)/(?P<path>[^?#\s]+)", re.IGNORECASE)
+_USERNAME = re.compile(r"^[A-Za-z]\w{3,31}$")
+
+
+def normalize_url(value: str) -> Optional[str]:
+    """
+    Приводит ссылку на группу к виду https://t.me/name (имя в нижнем регистре) или https://t.me/+hash.
+    None - строка не похожа на ссылку на группу
+    """
+    value = value.strip().strip(",;")
+    if value.startswith("@"):
+        path = value[1:]
+    else:
+        match = _GROUP_LINK.match(value)
+        if match is None:
+            return None
+        path = match.group("path")
+
+    parts = [part for part in path.split("/") if part]
+    if parts and parts[0].lower() == "s":
+        parts = parts[1:]  # t.me/s/name - веб-превью канала
+    if not parts:
+        return None
+
+    head = parts[0]
+    # Хэш приглашения чувствителен к регистру
+    if head.startswith("+") and len(head) > 1:
+        return f"https://t.me/{head}"
+    if head.lower() == "joinchat" and len(parts) > 1:
+        return f"https://t.me/+{parts[1]}"
+    if _USERNAME.match(head):
+        return f"https://t.me/{head.lower()}"
+    return None
 
 
 async def create_group(group_in: group_schemas.GroupCreate) -> Group:
@@ -31,8 +74,115 @@ async def delete_group_by_url(channel_guid: str, url: int) -> None:
         await session.commit()
 
 
+async def bulk_add_groups(channel_guid: str, urls: Iterable[str]) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Добавляет группы канала одним INSERT ... ON CONFLICT (channel_guid, url) DO NOTHING RETURNING.
+    Ссылки нормализуются и сравниваются с уже добавленными в нормализованном виде.
+    Возвращает (добавленные, уже были в канале или повторялись, нераспознанные строки)
+    """
+    channel_uuid = UUID(str(channel_guid), version=4)
+    normalized: Dict[str, None] = {}
+    duplicates, invalid = [], []
+    for url in urls:
+        normalized_url = normalize_url(url)
+        if normalized_url is None:
+            invalid.append(url)
+        elif normalized_url in normalized:
+            duplicates.append(normalized_url)
+        else:
+            normalized[normalized_url] = None
+
+    async with async_session_maker() as session:
+        result = await session.execute(select(Group.url).where(Group.channel_guid == channel_uuid))
+        existing = {normalize_url(url) or url for url in result.scalars().all()}
+
+        rows = []
+        for url in normalized:
+            if url in existing:
+                duplicates.append(url)
+            else:
+                rows.append({"guid": uuid4(), "channel_guid": channel_uuid, "url": url})
+        if not rows:
+            return [], duplicates, invalid
+
+        query = dialect_insert(Group).values(rows)
+        query = query.on_conflict_do_nothing(index_elements=[Group.channel_guid, Group.url]).returning(Group.url)
+        result = await session.execute(query)
+        added = [row[0] for row in result.all()]
+        await session.commit()
+
+    added_set = set(added)
+    duplicates.extend(row["url"] for row in rows if row["url"] not in added_set)
+    return added, duplicates, invalid
+
+
+async def bulk_delete_groups(channel_guid: str, urls: Iterable[str]) -> int:
+    """
+    Удаляет группы канала одним DELETE. Ссылка совпадает с группой, если совпадает как есть
+    или в нормализованном виде (@name удалит https://t.me/Name). Возвращает число удаленных
+    """
+    channel_uuid = UUID(str(channel_guid), version=4)
+    raw = {url.strip() for url in urls if url.strip()}
+    wanted = {normalize_url(url) for url in raw} - {None}
+    if not raw:
+        return 0
+
+    async with async_session_maker() as session:
+        result = await session.execute(select(Group.guid, Group.url).where(Group.channel_guid == channel_uuid))
+        guids = [guid for guid, url in result.all() if url in raw or normalize_url(url) in wanted]
+        if not guids:
+            return 0
+        await session.execute(delete(Group).where(Group.guid.in_(guids)))
+        await session.commit()
+    return len(guids)
+
+
 async def get_all_groups_by_channel_guid(channel_guid: str) -> List[Group]:
     async with async_session_maker() as session:
         result = await session.execute(select(Group).where(Group.channel_guid == UUID(channel_guid, version=4)))
         return result.scalars().all()
 
+
+
+async def get_selection_candidates(channel_guid: str) -> List[Tuple[Group, Optional[GroupHealth]]]:
+    """Группы канала вне карантина вместе с их здоровьем и метаданными (если есть)"""
+    async with async_session_maker() as session:
+        query = (
+            select(Group, GroupHealth)
+            .outerjoin(GroupHealth, GroupHealth.url == Group.url)
+            .where(
+                Group.channel_guid == UUID(str(channel_guid), version=4),
+                or_(GroupHealth.quarantined_until.is_(None), GroupHealth.quarantined_until <= clock.now())
+            )
+        )
+        result = await session.execute(query)
+        return [(group, health) for group, health in result.all()]
+
+
+async def update_rotation_passes(passes: Dict[UUID, float]) -> None:
+    if not passes:
+        return
+    async with async_session_maker() as session:
+        await session.execute(
+            update(Group),
+            [{"guid": guid, "rotation_pass": rotation_pass} for guid, rotation_pass in passes.items()]
+        )
+        await session.commit()
+
+
+async def get_urls_with_stale_metadata(older_than: datetime, limit: int) -> List[str]:
+    """Url групп без метаданных или с метаданными старше older_than (сначала самые старые)"""
+    async with async_session_maker() as session:
+        query = (
+            select(Group.url)
+            .outerjoin(GroupHealth, GroupHealth.url == Group.url)
+            .where(
+                or_(GroupHealth.metadata_updated_at.is_(None), GroupHealth.metadata_updated_at < older_than),
+                or_(GroupHealth.quarantined_until.is_(None), GroupHealth.quarantined_until <= clock.now())
+            )
+            .group_by(Group.url)
+            .order_by(func.min(GroupHealth.metadata_updated_at).nulls_first())
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return list(result.scalars().all())
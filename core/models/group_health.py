@@ -0,0 +1,116 @@
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core import clock
+from core.models.base import Base, async_session_maker, dialect_insert
+
+
+class GroupHealth(Base):
+    """Здоровье и метаданные группы Telegram (по url, общие для всех каналов)"""
+    __tablename__ = "group_health"
+
+    url: Mapped[str] = mapped_column(unique=True)
+    failure_score: Mapped[float] = mapped_column(default=0.0)
+    failures_total: Mapped[int] = mapped_column(default=0)
+    last_failure_kind: Mapped[str] = mapped_column(nullable=True)
+    last_failure_at: Mapped[datetime] = mapped_column(nullable=True)
+    quarantine_count: Mapped[int] = mapped_column(default=0)
+    quarantined_until: Mapped[datetime] = mapped_column(nullable=True)
+    successes_total: Mapped[int] = mapped_column(default=0)
+    last_delivery_at: Mapped[datetime] = mapped_column(nullable=True)
+    # Метаданные из GetFullChannelRequest, обновляются в фоне
+    participants_count: Mapped[int] = mapped_column(nullable=True)
+    slowmode_seconds: Mapped[int] = mapped_column(nullable=True)
+    metadata_updated_at: Mapped[datetime] = mapped_column(nullable=True)
+    updated_at: Mapped[datetime]
+
+
+async def update_group_health(url: str, updater: Callable[[GroupHealth], None]) -> GroupHealth:
+    """Читает (или создает) запись группы, применяет updater и сохраняет в одной сессии"""
+    async with async_session_maker() as session:
+        result = await session.execute(select(GroupHealth).where(GroupHealth.url == url))
+        health = result.scalar_one_or_none()
+        if health is None:
+            health = GroupHealth(
+                url=url, failure_score=0.0, failures_total=0, quarantine_count=0, successes_total=0, updated_at=clock.now()
+            )
+            session.add(health)
+        updater(health)
+        await session.commit()
+        return health
+
+
+async def record_group_delivery(url: str) -> None:
+    """Успешная доставка: счетчик успехов, время доставки, сброс счета ошибок и карантина"""
+    now = clock.now()
+    query = dialect_insert(GroupHealth).values(
+        url=url,
+        failure_score=0.0,
+        failures_total=0,
+        quarantine_count=0,
+        successes_total=1,
+        last_delivery_at=now,
+        updated_at=now
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[GroupHealth.url],
+        set_={
+            "failure_score": 0.0,
+            "quarantine_count": 0,
+            "quarantined_until": None,
+            "successes_total": GroupHealth.successes_total + 1,
+            "last_delivery_at": now,
+            "updated_at": now
+        }
+    )
+    async with async_session_maker() as session:
+        await session.execute(query)
+        await session.commit()
+
+
+async def update_group_metadata(url: str, participants_count: Optional[int], slowmode_seconds: Optional[int]) -> None:
+    now = clock.now()
+    query = dialect_insert(GroupHealth).values(
+        url=url,
+        failure_score=0.0,
+        failures_total=0,
+        quarantine_count=0,
+        successes_total=0,
+        participants_count=participants_count,
+        slowmode_seconds=slowmode_seconds,
+        metadata_updated_at=now,
+        updated_at=now
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[GroupHealth.url],
+        set_={
+            "participants_count": participants_count,
+            "slowmode_seconds": slowmode_seconds,
+            "metadata_updated_at": now,
+            "updated_at": now
+        }
+    )
+    async with async_session_maker() as session:
+        await session.execute(query)
+        await session.commit()
+
+
+async def get_quarantined_groups(now: Optional[datetime] = None) -> List[GroupHealth]:
+    now = now or clock.now()
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(GroupHealth)
+            .where(GroupHealth.quarantined_until > now)
+            .order_by(GroupHealth.quarantined_until.desc())
+        )
+        return result.scalars().all()
+
+
+async def get_unhealthy_groups_count() -> int:
+    """Группы с ненулевым счетом ошибок (в том числе на карантине)"""
+    async with async_session_maker() as session:
+        result = await session.execute(select(GroupHealth.guid).where(GroupHealth.failure_score > 0))
+        return len(result.all())
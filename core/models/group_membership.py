@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import Dict, List, Set
+
+from sqlalchemy import BigInteger, UniqueConstraint, select, delete
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core import clock
+from core.models.base import Base, async_session_maker, dialect_insert
+
+
+class GroupMembership(Base):
+    """Аккаунт состоит в группе: когда вступил и когда последний раз делал в нее репост"""
+    __tablename__ = "group_memberships"
+    __table_args__ = (UniqueConstraint("phone_number", "url", name="uq_group_memberships_phone_url"),)
+
+    phone_number: Mapped[int] = mapped_column(BigInteger, index=True)
+    url: Mapped[str]
+    joined_at: Mapped[datetime]
+    last_used_at: Mapped[datetime]
+
+
+async def upsert_membership(phone_number: int, url: str) -> None:
+    """Отмечает членство и обновляет время последнего использования"""
+    now = clock.now()
+    query = dialect_insert(GroupMembership).values(
+        phone_number=phone_number,
+        url=url,
+        joined_at=now,
+        last_used_at=now
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[GroupMembership.phone_number, GroupMembership.url],
+        set_={"last_used_at": now}
+    )
+    async with async_session_maker() as session:
+        await session.execute(query)
+        await session.commit()
+
+
+async def delete_membership(phone_number: int, url: str) -> None:
+    async with async_session_maker() as session:
+        await session.execute(
+            delete(GroupMembership).where(GroupMembership.phone_number == phone_number, GroupMembership.url == url)
+        )
+        await session.commit()
+
+
+async def get_memberships_by_phones(phone_numbers: List[int]) -> Dict[int, Set[str]]:
+    if not phone_numbers:
+        return {}
+
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(GroupMembership.phone_number, GroupMembership.url)
+            .where(GroupMembership.phone_number.in_(phone_numbers))
+        )
+        memberships: Dict[int, Set[str]] = {phone_number: set() for phone_number in phone_numbers}
+        for phone_number, url in result.all():
+            memberships[phone_number].add(url)
+        return memberships
+
+
+async def get_memberships(phone_number: int) -> List[GroupMembership]:
+    """Членства аккаунта, давно не использованные первыми"""
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(GroupMembership)
+            .where(GroupMembership.phone_number == phone_number)
+            .order_by(GroupMembership.last_used_at)
+        )
+        return list(result.scalars().all())
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from typing import List, Set
+
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core import clock
+from core.models.base import Base, async_session_maker, dialect_insert
+
+
+class Lease(Base):
+    """Аренда ресурса (канала или аккаунта) одним узлом с истечением по времени"""
+    __tablename__ = "leases"
+
+    resource_key: Mapped[str] = mapped_column(unique=True)
+    owner: Mapped[str]
+    expires_at: Mapped[datetime]
+    heartbeat_at: Mapped[datetime]
+
+
+async def acquire_lease(resource_key: str, owner: str, ttl_seconds: int) -> bool:
+    """
+    Атомарно захватывает или продлевает аренду.
+    Чужая аренда перехватывается только если она истекла.
+    """
+    now = clock.now()
+    query = dialect_insert(Lease).values(
+        resource_key=resource_key,
+        owner=owner,
+        expires_at=now + timedelta(seconds=ttl_seconds),
+        heartbeat_at=now
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[Lease.resource_key],
+        set_={
+            "owner": owner,
+            "expires_at": now + timedelta(seconds=ttl_seconds),
+            "heartbeat_at": now
+        },
+        where=or_(Lease.owner == owner, Lease.expires_at < now)
+    ).returning(Lease.resource_key)
+
+    async with async_session_maker() as session:
+        result = await session.execute(query)
+        acquired = result.first() is not None
+        await session.commit()
+        return acquired
+
+
+async def renew_leases(resource_keys: List[str], owner: str, ttl_seconds: int) -> Set[str]:
+    """Продлевает аренды узла одним запросом. Возвращает ключи, которые удалось продлить"""
+    if not resource_keys:
+        return set()
+
+    now = clock.now()
+    query = update(Lease).where(
+        Lease.resource_key.in_(resource_keys),
+        Lease.owner == owner
+    ).values(
+        expires_at=now + timedelta(seconds=ttl_seconds),
+        heartbeat_at=now
+    ).returning(Lease.resource_key)
+
+    async with async_session_maker() as session:
+        result = await session.execute(query)
+        renewed = set(result.scalars().all())
+        await session.commit()
+        return renewed
+
+
+async def release_lease(resource_key: str, owner: str) -> None:
+    async with async_session_maker() as session:
+        await session.execute(delete(Lease).where(Lease.resource_key == resource_key, Lease.owner == owner))
+        await session.commit()
+
+
+async def release_all_leases(owner: str) -> int:
+    async with async_session_maker() as session:
+        result = await session.execute(delete(Lease).where(Lease.owner == owner))
+        await session.commit()
+        return result.rowcount
+
+
+async def get_active_leases() -> List[Lease]:
+    async with async_session_maker() as session:
+        result = await session.execute(select(Lease).where(Lease.expires_at >= clock.now()))
+        return list(result.scalars().all())
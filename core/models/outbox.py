@@ -0,0 +1,121 @@
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import select, update, delete, or_, and_
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.models.base import Base, async_session_maker
+
+
+class OutboxEvent(Base):
+    """Событие локальной шины между сервисами (бот, слушатель, воркеры)"""
+    __tablename__ = "outbox_events"
+
+    topic: Mapped[str] = mapped_column(index=True)
+    key: Mapped[str] = mapped_column(nullable=True)
+    payload: Mapped[str]
+    created_at: Mapped[datetime] = mapped_column(index=True)
+    claimed_by: Mapped[str] = mapped_column(nullable=True)
+    claimed_at: Mapped[datetime] = mapped_column(nullable=True)
+    attempts: Mapped[int] = mapped_column(default=0, server_default="0")
+    processed_at: Mapped[datetime] = mapped_column(nullable=True, index=True)
+
+    def get_payload(self) -> dict:
+        return json.loads(self.payload)
+
+
+async def publish_event(topic: str, payload: dict, key: str | None = None) -> None:
+    async with async_session_maker() as session:
+        session.add(OutboxEvent(
+            topic=topic,
+            key=key,
+            payload=json.dumps(payload, ensure_ascii=False, default=str),
+            created_at=datetime.now()
+        ))
+        await session.commit()
+
+
+async def claim_events(
+        topics: List[str],
+        owner: str,
+        limit: int = 100,
+        keys: Optional[List[str]] = None,
+        visibility_timeout: int = 300
+) -> List[OutboxEvent]:
+    """
+    Забирает необработанные события. Событие с ключом достается только узлу,
+    у которого этот ключ в keys; событие без ключа - любому узлу.
+    Захват действует visibility_timeout секунд: событие, которое не подтвердили
+    через complete_events (обработчик упал, процесс умер), потом забирается снова.
+    """
+    now = datetime.now()
+    available = and_(
+        OutboxEvent.processed_at.is_(None),
+        or_(OutboxEvent.claimed_at.is_(None), OutboxEvent.claimed_at < now - timedelta(seconds=visibility_timeout))
+    )
+    async with async_session_maker() as session:
+        key_filter = OutboxEvent.key.is_(None)
+        if keys:
+            key_filter = or_(key_filter, OutboxEvent.key.in_(keys))
+
+        query = select(OutboxEvent.guid).where(
+            OutboxEvent.topic.in_(topics),
+            available,
+            key_filter
+        ).order_by(OutboxEvent.created_at).limit(limit)
+        guids = list((await session.execute(query)).scalars().all())
+        if not guids:
+            return []
+
+        query = update(OutboxEvent).where(
+            OutboxEvent.guid.in_(guids),
+            available
+        ).values(
+            claimed_by=owner,
+            claimed_at=now,
+            attempts=OutboxEvent.attempts + 1
+        ).returning(OutboxEvent)
+        result = await session.execute(query)
+        events = sorted(result.scalars().all(), key=lambda event: event.created_at)
+        await session.commit()
+        return events
+
+
+async def complete_events(guids: List[UUID], owner: str) -> None:
+    """Подтверждает обработку захваченных узлом событий"""
+    if not guids:
+        return
+    async with async_session_maker() as session:
+        await session.execute(
+            update(OutboxEvent).where(
+                OutboxEvent.guid.in_(guids),
+                OutboxEvent.claimed_by == owner,
+                OutboxEvent.processed_at.is_(None)
+            ).values(processed_at=datetime.now())
+        )
+        await session.commit()
+
+
+async def extend_claims(guids: List[UUID], owner: str) -> None:
+    """Продлевает захват событий, которые еще обрабатываются (долгие задания)"""
+    if not guids:
+        return
+    async with async_session_maker() as session:
+        await session.execute(
+            update(OutboxEvent).where(
+                OutboxEvent.guid.in_(guids),
+                OutboxEvent.claimed_by == owner,
+                OutboxEvent.processed_at.is_(None)
+            ).values(claimed_at=datetime.now())
+        )
+        await session.commit()
+
+
+async def cleanup_events(before: datetime) -> int:
+    """Удаляет события старше before, в том числе никем не забранные"""
+    async with async_session_maker() as session:
+        result = await session.execute(delete(OutboxEvent).where(OutboxEvent.created_at < before))
+        await session.commit()
+        return result.rowcount
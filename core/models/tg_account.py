@@ -1,11 +1,12 @@
-from uuid import UUID
+from uuid import UUID, uuid4
 from datetime import datetime
-from typing import List
+from typing import List, Tuple
 
 from sqlalchemy import Enum, select, update, delete
 from sqlalchemy.orm import Mapped, mapped_column
 
-from core.models.base import Base, async_session_maker
+from core import clock
+from core.models.base import Base, async_session_maker, dialect_insert
 from core.schemas import tg_account as tg_account_schemas
 
 
@@ -19,7 +20,7 @@ class TGAccount(Base):
     phone_number: Mapped[int] = mapped_column(unique=True)
     string_session: Mapped[str]
     status: Mapped[str] = mapped_column(
-        Enum("WORKING", "MUTED", "DELETED", name="tg_account_status", create_type=False)
+        Enum("WORKING", "MUTED", "DELETED", "PENDING", name="tg_account_status", create_type=False)
     )
 
 
@@ -31,6 +32,35 @@ async def create_tg_account(tg_account_in: tg_account_schemas.TGAccountCreate) -
         return tg_account
 
 
+async def bulk_create_tg_accounts(
+        tg_accounts_in: List[tg_account_schemas.TGAccountCreate]
+) -> Tuple[List[int], List[int]]:
+    """
+    Вставляет пачку аккаунтов одним INSERT ... ON CONFLICT (phone_number) DO NOTHING RETURNING.
+    Возвращает (новые номера, номера, которые уже были в базе или повторялись в пачке)
+    """
+    rows = {}
+    duplicates = []
+    for tg_account_in in tg_accounts_in:
+        if tg_account_in.phone_number in rows:
+            duplicates.append(tg_account_in.phone_number)
+            continue
+        rows[tg_account_in.phone_number] = {"guid": uuid4(), **tg_account_in.model_dump()}
+    if not rows:
+        return [], duplicates
+
+    query = dialect_insert(TGAccount).values(list(rows.values()))
+    query = query.on_conflict_do_nothing(index_elements=[TGAccount.phone_number]).returning(TGAccount.phone_number)
+    async with async_session_maker() as session:
+        result = await session.execute(query)
+        created = [row[0] for row in result.all()]
+        await session.commit()
+
+    created_set = set(created)
+    duplicates.extend(phone_number for phone_number in rows if phone_number not in created_set)
+    return created, duplicates
+
+
 async def get_tg_accounts_by_channel_guid(channel_guid: int | None) -> List[TGAccount]:
     async with async_session_maker() as session:
         if channel_guid is None:
@@ -120,7 +150,7 @@ async def has_pause_paused(tg_account: TGAccount) -> bool:
     if not tg_account.last_datetime_pause or not tg_account.pause_in_seconds:
         return True
         
-    current_time = datetime.now()
+    current_time = clock.now()
     elapsed_time = current_time - tg_account.last_datetime_pause
     
     if elapsed_time.total_seconds() >= tg_account.pause_in_seconds:
@@ -140,7 +170,7 @@ async def has_pause_paused(tg_account: TGAccount) -> bool:
 async def add_pause(tg_account: TGAccount, pause_in_seconds: int) -> None:
     async with async_session_maker() as session:
         query = update(TGAccount).where(TGAccount.guid == tg_account.guid).values(
-            last_datetime_pause=datetime.now(),
+            last_datetime_pause=clock.now(),
             pause_in_seconds=pause_in_seconds,
             status="MUTED"
         )
@@ -182,6 +212,13 @@ async def get_tg_accounts_by_channel_guid_and_status(channel_guid: str, status:
         return list(result.scalars().all())
 
 
+async def get_tg_accounts_by_phone_numbers(phone_numbers: List[int]) -> List[TGAccount]:
+    async with async_session_maker() as session:
+        query = select(TGAccount).where(TGAccount.phone_number.in_(phone_numbers))
+        result = await session.execute(query)
+        return list(result.scalars().all())
+
+
 async def get_tg_account_by_phone_number(phone_number: int) -> TGAccount:
     async with async_session_maker() as session:
         query = select(TGAccount).where(TGAccount.phone_number == phone_number)
@@ -201,7 +238,7 @@ async def get_working_accounts_by_channel(channel_guid: str = None) -> List[TGAc
         accounts = list(result.scalars().all())
         
         working_accounts = []
-        current_time = datetime.now()
+        current_time = clock.now()
         
         for account in accounts:
             # Проверяем есть ли пауза
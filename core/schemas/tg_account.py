@@ -7,6 +7,7 @@ class TGAccountStatus(str, Enum):
     working = "WORKING"
     muted = "MUTED"
     deleted = "DELETED"
+    pending = "PENDING"  # импортирован и ждет проверки, в работу не берется
 
 
 class TGAccountBase(BaseModel):
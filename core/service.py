@@ -0,0 +1,46 @@
+import asyncio
+import gc
+import time
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from core import metrics
+from core.log import setup_logging
+from core.loop_monitor import loop_monitor
+from core.settings import settings
+
+
+async def _run_monitored(main: Callable[[], Awaitable[None]]) -> None:
+    loop_monitor.start()
+    try:
+        await main()
+    finally:
+        loop_monitor.stop()
+        await metrics.stop_metrics_server()
+
+
+def run_service(main: Callable[[], Awaitable[None]], service_name: str, restart_delay: int = 30) -> None:
+    """Запускает сервис с собственным лог-файлом и автоматическим перезапуском после падения"""
+    log_file_name = datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + f"_{service_name}.log"
+    setup_logging(service_name, f"logs/{log_file_name}", level=settings.log_level, json_logs=settings.log_json)
+
+    while True:
+        try:
+            # Очищаем ресурсы перед каждым запуском
+            gc.collect()
+
+            asyncio.run(_run_monitored(main))
+        except KeyboardInterrupt:
+            logger.info(f"🛑 [{service_name}] Получен сигнал остановки")
+            break
+        except Exception as e:
+            logger.exception(f"💥 [{service_name}] ЗАВЕРШИЛСЯ С ОШИБКОЙ: {e.__class__.__name__}: {e}")
+
+        # Ждем перед перезапуском
+        logger.info(f"🔄 [{service_name}] Перезапуск через {restart_delay} секунд...")
+        try:
+            time.sleep(restart_delay)
+        except KeyboardInterrupt:
+            break
@@ -1,4 +1,6 @@
 import json
+import os
+import socket
 import aiofiles
 from typing import List
 
@@ -14,6 +16,18 @@ class Settings(BaseSettings):
     database_url: SecretStr
     json_settings_file: str = "json_settings.json"
     admin_ids: str = ""  # Новое поле для списка админов через запятую
+    node_id: str = ""  # Имя узла для аренды каналов/аккаунтов (по умолчанию hostname-pid)
+    lease_ttl: int = 90
+    lease_heartbeat_interval: int = 30
+    processor_stats_file: str = "logs/processor_stats.json"
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9108  # сервис доставки и объединенный режим; 0 - не поднимать /metrics
+    listener_metrics_port: int = 9109  # сервис-слушатель (отдельный процесс); 0 - не поднимать /metrics
+    traces_file: str = "logs/traces.jsonl"
+    account_scores_file: str = "logs/account_scores.json"
+    log_level: str = "INFO"
+    log_json: bool = False  # JSONL вместо текста (для сбора логов)
+    loop_block_threshold: float = 1.0  # секунды блокировки event loop, после которых пишется стек
 
     class Config:
         env_file = ".env"
@@ -35,6 +49,12 @@ class Settings(BaseSettings):
         except ValueError:
             return []
 
+    def get_node_id(self) -> str:
+        """Возвращает уникальное имя текущего процесса-узла"""
+        if self.node_id:
+            return self.node_id
+        return f"{socket.gethostname()}-{os.getpid()}"
+
     def is_admin(self, user_id: int) -> bool:
         """Проверяет, является ли пользователь админом"""
         return user_id in self.get_admin_list()
@@ -44,11 +64,22 @@ class JSONSettings:
     def __init__(self, json_settings_file: str) -> None:
         self.json_settings_file = json_settings_file
         self.config = {}
+        self._signature = None
 
     async def load_config(self) -> None:
+        # Настройки читаются на каждой группе - перечитываем файл только если он изменился
+        try:
+            stat = os.stat(self.json_settings_file)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature is not None and signature == self._signature:
+            return
+
         async with aiofiles.open(self.json_settings_file, 'r') as file:
             content = await file.read()
             self.config = json.loads(content)
+        self._signature = signature
 
 
     async def save_config(self) -> None:
@@ -0,0 +1,185 @@
+import json
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+import aiofiles
+from loguru import logger
+
+from core import metrics
+
+
+@dataclass
+class Span:
+    """Отрезок времени внутри трассы (задача -> группа -> RPC)"""
+    name: str
+    trace_id: str
+    parent: Optional["Span"] = field(default=None, repr=False)
+    attrs: Dict = field(default_factory=dict)
+    start: float = field(default_factory=time.perf_counter)
+    end: Optional[float] = None
+    error: Optional[str] = None
+    children: List["Span"] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: Optional[float] = None) -> dict:
+        origin = self.start if origin is None else origin
+        data = {
+            "name": self.name,
+            "offset": round(self.start - origin, 4),
+            "duration": round(self.duration, 4),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def stage_breakdown(span_dict: dict) -> Dict[str, float]:
+    """
+    Собственное время по названиям вложенных отрезков (без учета корня): длительность отрезка
+    за вычетом его детей, чтобы "route" не считал заново вложенные join/forward
+    """
+    totals: Dict[str, float] = {}
+    stack = list(span_dict.get("children", []))
+    while stack:
+        child = stack.pop()
+        grandchildren = child.get("children", [])
+        # Параллельные дети могут в сумме превысить родителя - собственное время не меньше нуля
+        self_time = max(child["duration"] - sum(grandchild["duration"] for grandchild in grandchildren), 0.0)
+        totals[child["name"]] = totals.get(child["name"], 0.0) + self_time
+        stack.extend(grandchildren)
+    return totals
+
+
+class TraceExporter:
+    """Последние трассы в памяти + дозапись в JSONL (файл пишется пачками из фоновой задачи)"""
+
+    def __init__(self, path: str, buffer_size: int = 200, max_bytes: int = 5 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.recent: Deque[dict] = deque(maxlen=buffer_size)
+        self._pending: Deque[dict] = deque(maxlen=buffer_size * 10)
+
+    def export(self, span: Span) -> None:
+        record = {
+            "trace_id": span.trace_id,
+            "ts": time.time(),
+            **span.to_dict(),
+        }
+        self.recent.append(record)
+        self._pending.append(record)
+
+    def slowest(self, limit: int = 5) -> List[dict]:
+        return sorted(self.recent, key=lambda record: record["duration"], reverse=True)[:limit]
+
+    async def flush(self) -> None:
+        if not self._pending or not self.path:
+            return
+
+        lines = []
+        while self._pending:
+            lines.append(json.dumps(self._pending.popleft(), ensure_ascii=False, default=str))
+
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            async with aiofiles.open(self.path, 'a') as file:
+                await file.write("\n".join(lines) + "\n")
+        except Exception as e:
+            logger.error(f"Ошибка записи трасс в {self.path}: {e}")
+
+
+exporter: Optional[TraceExporter] = None
+
+
+def configure(path: str, buffer_size: int = 200) -> TraceExporter:
+    global exporter
+    exporter = TraceExporter(path, buffer_size)
+    return exporter
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Вложенный отрезок. Без открытой трассы ничего не записывает"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name=name, trace_id=parent.trace_id, parent=parent, attrs=attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = type(e).__name__
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Корневой отрезок. По завершении трасса уходит в экспортер"""
+    root = Span(name=name, trace_id=uuid.uuid4().hex, attrs=attrs)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = type(e).__name__
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(token)
+        if exporter is not None:
+            exporter.export(root)
+
+
+@contextmanager
+def stage(name: str, **attrs):
+    """Этап Telegram RPC: отрезок трассы + гистограмма repost_stage_latency_seconds"""
+    with metrics.stage_latency.time(stage=name), span(name, **attrs) as current:
+        yield current
+
+
+async def read_recent_traces(path: str, limit: int = 500) -> List[dict]:
+    """Последние трассы из JSONL (для админ-бота, который работает в другом процессе)"""
+    try:
+        async with aiofiles.open(path, 'r') as file:
+            lines = (await file.read()).splitlines()[-limit:]
+    except OSError:
+        return []
+
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
@@ -1,18 +1,37 @@
 import argparse
 import asyncio
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
 
 from loguru import logger
 from opentele.tl import TelegramClient
 from telethon import errors
 
-from auto_reposting import telegram_utils, exc, telegram_utils2
-
+from auto_reposting import bus, telegram_utils, exc, telegram_utils2, group_selection, stop_links
+from auto_reposting.account_scoring import account_scorer
+from auto_reposting.affinity import membership_registry
+from auto_reposting.client_pool import ClientPool
+from auto_reposting.connections import connections
+from auto_reposting.fast_pacing import fast_pacer
+from auto_reposting.leases import lease_manager, account_lease_key, fast_channel_lease_key
+from auto_reposting.reactions import reaction_fanout
+
+from core import clock
+from core.log import setup_logging
 from core.schemas import repost as repost_schemas
 from core.models import tg_account as tg_account_db, channel as channel_db, group as group_db, repost as repost_db
+from core.models import outbox as outbox_db, account_usage as account_usage_db
+from core.service import run_service
 from core.settings import json_settings, settings
 
+DEFAULT_MAX_JOBS = 4
+PENDING_JOBS_PER_SLOT = 4  # сколько каналов на слот может одновременно ждать или выполнять пост
+FAST_CHANNEL_LEASE_RETRY = 5  # секунды между попытками взять канал, занятый другим узлом
+
+# Залогиненные клиенты аккаунтов между заданиями (в резидентном режиме повторный пост не логинится заново)
+job_clients = ClientPool(idle_ttl=3600)
+
 
 async def cleanup_clients(clients_to_cleanup: List[TelegramClient]) -> None:
     """ОБЯЗАТЕЛЬНО отключает все переданные клиенты"""
@@ -20,7 +39,7 @@ async def cleanup_clients(clients_to_cleanup: List[TelegramClient]) -> None:
     for client in clients_to_cleanup:
         if client:
             try:
-                await client.disconnect()
+                await connections.close(client)
                 cleanup_count += 1
                 logger.debug("🔌 Клиент отключен")
             except Exception as e:
@@ -30,6 +49,14 @@ async def cleanup_clients(clients_to_cleanup: List[TelegramClient]) -> None:
         logger.info(f"✅ Отключено {cleanup_count} клиентов")
 
 
+async def hold_connection(telegram_client: TelegramClient) -> None:
+    """Аккаунт держит одно подключение на все свои пакеты. Если подключиться не удалось - пакеты подключатся сами"""
+    try:
+        await connections.acquire(telegram_client)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось заранее подключить клиент: {e}")
+
+
 async def check_stop_link_in_message(
         tg_accounts: List[tg_account_db.TGAccount],
         telegram_client: TelegramClient,
@@ -39,32 +66,32 @@ async def check_stop_link_in_message(
 ) -> bool:
     """Проверяет наличие стоп-ссылок в сообщении и ставит реакции если найдены"""
     try:
-        stop_links = await json_settings.async_get_attribute("stop_links")
-        if not stop_links:
+        matcher = await stop_links.load_matcher()
+        if matcher.regex is None:
             return False
 
-        async with telegram_client:
+        async with connections.session(telegram_client):
             await telegram_client.get_entity(channel_url)
             message = await telegram_client.get_messages(telegram_channel_id, ids=telegram_message_id)
             
-            if not message or not message.message:
+            if not message:
                 return False
 
-            # Проверяем каждую стоп-ссылку
-            for stop_link in stop_links:
-                if stop_link in message.message:
-                    logger.info(f"🚫 В посте найдена стоп-ссылка: {stop_link}")
-                    
-                    # Ставим реакции
-                    await telegram_utils2.send_reaction_with_accounts_on_message(
-                        tg_accounts=tg_accounts,
-                        message=message,
-                        channel_url=channel_url,
-                        emoji_reaction=await json_settings.async_get_attribute("reaction")
-                    )
-                    
-                    logger.success("❤️ Реакции поставлены на сообщение со стоп-ссылкой")
-                    return True
+            # Текст, скрытые ссылки и кнопки - одним проходом
+            stop_link = matcher.find_in_message(message)
+            if stop_link:
+                logger.info(f"🚫 В посте найдена стоп-ссылка: {stop_link}")
+
+                # Реакции ставим в фоне, репостинг не ждет
+                reaction_fanout.submit(
+                    tg_accounts=tg_accounts,
+                    message_id=message.id,
+                    channel_url=channel_url,
+                    emoji_reaction=await json_settings.async_get_attribute("reaction")
+                )
+
+                logger.info("❤️ Реакции на сообщение со стоп-ссылкой ставятся в фоне")
+                return True
 
         return False
         
@@ -80,41 +107,46 @@ async def repost_to_group_batch(
         telegram_client: TelegramClient,
         batch_id: int
 ) -> tuple[int, List[str]]:
-    """🚀 Обрабатывает пакет групп параллельно для ускорения"""
+    """
+    🚀 Обрабатывает пакет групп параллельно для ускорения.
+    Все задачи пакета работают через одно подключение клиента - его держит пакет, а не каждая задача.
+    """
     successful_reposts = 0
     processed_groups = []
     
     logger.info(f"📦 Batch {batch_id}: Начинаю обработку {len(groups_batch)} групп")
     start_time = datetime.now()
     
-    # Создаем задачи для параллельной обработки групп в пакете
-    tasks = []
-    for i, group in enumerate(groups_batch):
-        task = asyncio.create_task(
-            repost_to_single_group(
-                group=group,
-                channel=channel,
-                telegram_message_id=telegram_message_id,
-                telegram_client=telegram_client,
-                group_index=i + 1,
-                batch_id=batch_id
+    async with connections.session(telegram_client):
+        # Создаем задачи для параллельной обработки групп в пакете
+        tasks = []
+        for i, group in enumerate(groups_batch):
+            task = asyncio.create_task(
+                repost_to_single_group(
+                    group=group,
+                    channel=channel,
+                    telegram_message_id=telegram_message_id,
+                    telegram_client=telegram_client,
+                    group_index=i + 1,
+                    batch_id=batch_id
+                )
             )
-        )
-        tasks.append((task, group))
-    
-    # Ждем завершения всех задач в пакете с таймаутом
-    try:
-        results = await asyncio.wait_for(
-            asyncio.gather(*[task for task, _ in tasks], return_exceptions=True),
-            timeout=300.0  # 5 минут на пакет
-        )
-    except asyncio.TimeoutError:
-        logger.error(f"❌ Batch {batch_id}: Таймаут обработки пакета")
-        # Отменяем все незавершенные задачи
-        for task, _ in tasks:
-            if not task.done():
-                task.cancel()
-        return 0, []
+            tasks.append((task, group))
+
+        # Ждем завершения всех задач в пакете с таймаутом
+        try:
+            results = await clock.wait_for(
+                asyncio.gather(*[task for task, _ in tasks], return_exceptions=True),
+                timeout=300.0  # 5 минут на пакет
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"❌ Batch {batch_id}: Таймаут обработки пакета")
+            # Отменяем все незавершенные задачи и ждем их, пока подключение еще открыто
+            for task, _ in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*[task for task, _ in tasks], return_exceptions=True)
+            return 0, []
     
     # Обрабатываем результаты
     for i, (result, (_, group)) in enumerate(zip(results, tasks)):
@@ -178,7 +210,7 @@ async def repost_to_single_group(
             
             if not join_success:
                 if attempt < max_attempts - 1:
-                    await asyncio.sleep(1)  # Короткая пауза перед повтором
+                    await clock.sleep(1)  # Короткая пауза перед повтором
                     continue
                 else:
                     group_logger.warning(f"❌ Не удалось вступить в группу {group.url}")
@@ -197,7 +229,7 @@ async def repost_to_single_group(
                 group_logger.success(f"✅ Репост в {group.url}")
                 return True
             elif attempt < max_attempts - 1:
-                await asyncio.sleep(2)  # Пауза перед повтором репоста
+                await clock.sleep(2)  # Пауза перед повтором репоста
             
         except errors.FloodWaitError as e:
             group_logger.warning(f"⏳ FloodWait в группе {group.url}: {e}")
@@ -208,7 +240,7 @@ async def repost_to_single_group(
         except Exception as e:
             group_logger.error(f"❌ Ошибка при репосте в {group.url}, попытка {attempt + 1}: {e}")
             if attempt < max_attempts - 1:
-                await asyncio.sleep(1)
+                await clock.sleep(1)
     
     group_logger.warning(f"❌ Не удалось сделать репост в {group.url} после {max_attempts} попыток")
     return False
@@ -224,17 +256,209 @@ def calculate_optimal_batch_size(num_groups: int, num_accounts: int) -> int:
         return min(12, max(5, num_groups // (num_accounts * 2))) if num_accounts > 0 else 8
 
 
+class GroupQueue:
+    """Общая очередь групп поста. Аккаунт сначала берет группы, в которых уже состоит (без вступления)"""
+
+    def __init__(self, groups: List[group_db.Group]):
+        self.groups = list(groups)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def take(self, phone_number: int, count: int) -> List[group_db.Group]:
+        chosen = [
+            index for index, group in enumerate(self.groups)
+            if membership_registry.is_member(phone_number, group.url)
+        ][:count]
+        chosen_set = set(chosen)
+        for index in range(len(self.groups)):
+            if len(chosen_set) >= count:
+                break
+            chosen_set.add(index)
+        batch = [self.groups[index] for index in sorted(chosen_set)]
+        self.groups = [group for index, group in enumerate(self.groups) if index not in chosen_set]
+        return batch
+
+
+class AccountSource:
+    """Выдает аккаунты поста полосам: каждый аккаунт достается одной полосе, логины идут параллельно"""
+
+    def __init__(self, accounts: List[tg_account_db.TGAccount]):
+        self.accounts = accounts
+        self.index = 0
+        self.clients: List[TelegramClient] = []
+        self.leased: Set[str] = set()  # аренды выданных полосам аккаунтов
+
+    async def next(self) -> Optional[Tuple[tg_account_db.TGAccount, TelegramClient]]:
+        while self.index < len(self.accounts):
+            tg_account = self.accounts[self.index]
+            self.index += 1
+            # Аккаунт ведет другая полоса, другой пост или другой воркер - пропускаем
+            lease_key = account_lease_key(tg_account.guid)
+            if lease_manager.holds(lease_key) or not await lease_manager.try_acquire(lease_key):
+                logger.debug(f"🔒 Аккаунт +{tg_account.phone_number} занят, пропускаю")
+                continue
+            try:
+                telegram_client, _ = await telegram_utils2.get_authorized_tg_client_with_check_pause(
+                    accounts=[tg_account],
+                    client_getter=job_clients.get
+                )
+            except exc.NoAccounts:
+                await lease_manager.release(lease_key)
+                continue
+            except:
+                await lease_manager.release(lease_key)
+                raise
+            self.leased.add(lease_key)
+            self.clients.append(telegram_client)
+            return tg_account, telegram_client
+        return None
+
+    async def release(self, tg_account: tg_account_db.TGAccount) -> None:
+        """Возвращает аккаунт: другие полосы, посты и воркеры снова могут его взять"""
+        lease_key = account_lease_key(tg_account.guid)
+        if lease_key in self.leased:
+            self.leased.discard(lease_key)
+            await lease_manager.release(lease_key)
+
+    async def release_all(self) -> None:
+        for lease_key in list(self.leased):
+            self.leased.discard(lease_key)
+            await lease_manager.release(lease_key)
+
+
+@dataclass
+class FastRun:
+    """Быстрый репост одного поста: общая очередь групп, аккаунты и настройки темпа"""
+    channel: channel_db.Channel
+    telegram_message_id: int
+    groups: GroupQueue
+    accounts: AccountSource
+    number_reposts_before_pause: int
+    pause_after_rate_reposts: int
+    pause_between_reposts: int
+    initial_batch_size: int
+    successful_reposts: int = 0
+    batches: int = 0
+    accounts_used: int = 0
+
+
+async def run_account_lane(
+        run: FastRun,
+        lane_id: int,
+        first: Optional[Tuple[tg_account_db.TGAccount, TelegramClient]] = None
+) -> None:
+    """
+    Полоса быстрого режима: аккаунт берет пакеты из общей очереди со своим лимитом и темпом.
+    Исчерпав лимит, ставит аккаунт на паузу и продолжает со следующим свободным аккаунтом.
+    """
+    current = first or await run.accounts.next()
+    while current is not None and len(run.groups):
+        tg_account, telegram_client = current
+        phone_number = tg_account.phone_number
+        run.accounts_used += 1
+        logger.info(f"🛣️ Полоса {lane_id}: аккаунт +{phone_number}")
+        await membership_registry.ensure_loaded([phone_number])
+        await hold_connection(telegram_client)
+
+        reposts_done = 0
+        try:
+            while len(run.groups) and reposts_done < run.number_reposts_before_pause:
+                batch_size = fast_pacer.batch_size(
+                    phone_number, run.initial_batch_size, run.pause_between_reposts, account_id=str(tg_account.guid)
+                )
+                # Пакет не должен превышать остаток лимита репостов аккаунта
+                batch_size = max(min(batch_size, run.number_reposts_before_pause - reposts_done), 1)
+                group_batch = run.groups.take(phone_number, batch_size)
+                run.batches += 1
+                batch_idx = run.batches
+                batch_start_time = datetime.now()
+                logger.info(f"🎯 Полоса {lane_id}, пакет {batch_idx}: {len(group_batch)} групп, в очереди {len(run.groups)}")
+
+                try:
+                    flood_waits_before = account_scorer.flood_wait_count(phone_number)
+                    batch_successful, _ = await repost_to_group_batch(
+                        groups_batch=group_batch,
+                        channel=run.channel,
+                        telegram_message_id=run.telegram_message_id,
+                        telegram_client=telegram_client,
+                        batch_id=batch_idx
+                    )
+
+                    reposts_done += batch_successful
+                    run.successful_reposts += batch_successful
+                    try:
+                        # Бюджет аккаунта общий с обычным режимом: ротация учитывает и быстрые репосты
+                        await account_usage_db.add_account_usage(tg_account.guid, run.channel.guid, count=batch_successful)
+                    except Exception as e:
+                        logger.error(f"Ошибка записи репостов +{phone_number}: {e}")
+
+                    batch_time = (datetime.now() - batch_start_time).total_seconds()
+                    logger.info(f"📊 Пакет {batch_idx}: {batch_successful} репостов за {batch_time:.1f}с")
+
+                    # 🎯 АДАПТИВНЫЙ ТЕМП: FloodWait, задержка RPC и доля успешных репостов аккаунта
+                    fast_pacer.record_batch(
+                        phone_number=phone_number,
+                        base_delay=run.pause_between_reposts,
+                        attempted=len(group_batch),
+                        succeeded=batch_successful,
+                        flood_waits=max(account_scorer.flood_wait_count(phone_number) - flood_waits_before, 0),
+                        latency=account_scorer.median_latency(phone_number, stage="forward"),
+                        flood_seconds=account_scorer.last_flood_wait(phone_number)
+                    )
+                    if len(run.groups):  # Не ждем после последнего пакета
+                        adaptive_pause = fast_pacer.delay(phone_number)
+                        logger.info(f"⏱️ Полоса {lane_id}: пауза {adaptive_pause:.1f}с")
+                        await clock.sleep(adaptive_pause)
+
+                except Exception as e:
+                    logger.error(f"❌ Критическая ошибка при обработке пакета {batch_idx}: {e}")
+                    # При критической ошибке регулятор резко снижает темп
+                    fast_pacer.record_error(phone_number, run.pause_between_reposts)
+                    error_pause = max(fast_pacer.delay(phone_number), run.pause_between_reposts)
+                    logger.warning(f"⏸️ Полоса {lane_id}: пауза {error_pause:.1f}с после ошибки")
+                    await clock.sleep(error_pause)
+        finally:
+            fast_pacer.retire(phone_number)
+            try:
+                await connections.release(telegram_client)
+            except:
+                pass
+
+            try:
+                if reposts_done >= run.number_reposts_before_pause:
+                    logger.info(f"🔄 +{phone_number} достиг лимита репостов ({run.number_reposts_before_pause}), меняю аккаунт")
+                    await tg_account_db.add_pause(
+                        tg_account=tg_account,
+                        pause_in_seconds=run.pause_after_rate_reposts
+                    )
+                    try:
+                        await account_usage_db.reset_account_usage(tg_account.guid)
+                    except Exception as e:
+                        logger.error(f"Ошибка сброса счетчика репостов +{phone_number}: {e}")
+                    logger.info(f"⏸️ Аккаунт +{phone_number} на паузе {run.pause_after_rate_reposts // 60} мин")
+            finally:
+                # Аренда снимается после паузы: другой воркер не подхватит аккаунт, уже исчерпавший лимит
+                await run.accounts.release(tg_account)
+
+        current = await run.accounts.next() if len(run.groups) else None
+
+
 async def process_group_reposting_fast(
         channel: channel_db.Channel,
         tg_accounts: List[tg_account_db.TGAccount],
         groups: List[group_db.Group],
         telegram_message_id: int
 ) -> None:
-    all_clients_used = []
+    """
+    🚀 Быстрый режим: группы поста делятся между всеми готовыми аккаунтами сразу.
+    Каждая полоса - один аккаунт со своим лимитом репостов и темпом, K аккаунтов проходят пост примерно в K раз быстрее.
+    """
+    account_source = None
     
     try:
-        # Фильтруем только рабочие аккаунты
-        working_accounts = [acc for acc in tg_accounts if acc.status == "WORKING"]
+        # Фильтруем только рабочие аккаунты, лучшие по оценке - первыми
+        working_accounts = account_scorer.rank(acc for acc in tg_accounts if acc.status == "WORKING")
         if not working_accounts:
             await telegram_utils.send_message(
                 chat_id=settings.admin_chat_id, 
@@ -255,33 +479,19 @@ async def process_group_reposting_fast(
             number_reposts_before_pause = 15
             pause_after_rate_reposts = 3600   
             pause_between_reposts = 25        
+        try:
+            max_lanes = int(await json_settings.async_get_attribute("fast_parallel_accounts"))
+        except:
+            max_lanes = 0
+
+        # 🎯 Начальный размер пакета для аккаунта без истории, дальше его ведет регулятор темпа
+        initial_batch_size = calculate_optimal_batch_size(len(groups), len(working_accounts))
+        logger.info(f"📦 Начальный размер пакета: {initial_batch_size} групп")
 
-        # 🎯 Вычисляем оптимальный размер пакета
-        batch_size = calculate_optimal_batch_size(len(groups), len(working_accounts))
-        logger.info(f"📦 Оптимальный размер пакета: {batch_size} групп")
-        
-        # Разбиваем группы на пакеты
-        group_batches = [groups[i:i + batch_size] for i in range(0, len(groups), batch_size)]
-        logger.info(f"📋 Создано {len(group_batches)} пакетов для обработки")
-
-        account_index = 0
-        telegram_client = None
-        counter_reposts_current_account = 0
-        total_successful_reposts = 0
         start_time = datetime.now()
-        
-        try:
-            # Получаем первый рабочий клиент
-            telegram_client, account_index = await telegram_utils2.get_authorized_tg_client_with_check_pause(
-                accounts=working_accounts,
-                start_index=account_index
-            )
-            if telegram_client:
-                all_clients_used.append(telegram_client)
-            else:
-                raise exc.NoAccounts("Не удалось получить первый клиент")
-                
-        except exc.NoAccounts:
+        account_source = AccountSource(working_accounts)
+        first = await account_source.next()
+        if first is None:
             await telegram_utils.send_message(
                 chat_id=settings.admin_chat_id, 
                 text=f"❌ У канала {channel.url} нет доступных аккаунтов для работы."
@@ -292,7 +502,7 @@ async def process_group_reposting_fast(
         try:
             if await check_stop_link_in_message(
                 tg_accounts=working_accounts, 
-                telegram_client=telegram_client, 
+                telegram_client=first[1], 
                 channel_url=channel.url,
                 telegram_channel_id=channel.telegram_channel_id,
                 telegram_message_id=telegram_message_id
@@ -302,107 +512,52 @@ async def process_group_reposting_fast(
         except Exception as e:
             logger.error(f"Ошибка при проверке стоп-ссылок: {e}")
 
-        # 🚀 ОСНОВНОЙ ЦИКЛ: Обрабатываем пакеты групп параллельно
-        for batch_idx, group_batch in enumerate(group_batches, 1):
-            batch_start_time = datetime.now()
-            logger.info(f"🎯 Пакет {batch_idx}/{len(group_batches)}: Начинаю обработку")
+        # 🚀 ОСНОВНОЙ ЦИКЛ: полоса на аккаунт, полос не больше, чем нужно на стартовые пакеты
+        lanes = min(len(working_accounts), max(-(-len(groups) // initial_batch_size), 1))
+        if max_lanes > 0:
+            lanes = min(lanes, max_lanes)
+        logger.info(f"🛣️ Параллельных аккаунтов: {lanes}")
 
-            # Проверяем, нужна ли смена аккаунта
-            if counter_reposts_current_account >= number_reposts_before_pause:
-                logger.info(f"🔄 Достигнут лимит репостов ({number_reposts_before_pause}), меняю аккаунт")
-                
-                # Ставим текущий аккаунт на паузу
-                current_account = working_accounts[account_index]
-                await tg_account_db.add_pause(
-                    tg_account=current_account,
-                    pause_in_seconds=pause_after_rate_reposts
-                )
-                
-                pause_minutes = pause_after_rate_reposts // 60
-                logger.info(f"⏸️ Аккаунт +{current_account.phone_number} на паузе {pause_minutes} мин")
+        run = FastRun(
+            channel=channel,
+            telegram_message_id=telegram_message_id,
+            groups=GroupQueue(groups),
+            accounts=account_source,
+            number_reposts_before_pause=number_reposts_before_pause,
+            pause_after_rate_reposts=pause_after_rate_reposts,
+            pause_between_reposts=pause_between_reposts,
+            initial_batch_size=initial_batch_size
+        )
+        results = await asyncio.gather(
+            run_account_lane(run, 1, first),
+            *(run_account_lane(run, lane_id) for lane_id in range(2, lanes + 1)),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"❌ Полоса завершилась с ошибкой: {result}")
 
-                # Закрываем текущий клиент
-                if telegram_client:
-                    try:
-                        await telegram_client.disconnect()
-                        logger.debug("🔌 Старый клиент отключен")
-                    except:
-                        pass
-                    telegram_client = None
-
-                # Получаем следующий аккаунт
-                account_index += 1
-                try:
-                    telegram_client, account_index = await telegram_utils2.get_authorized_tg_client_with_check_pause(
-                        accounts=working_accounts,
-                        start_index=account_index
-                    )
-                    if telegram_client:
-                        all_clients_used.append(telegram_client)
-                    else:
-                        raise exc.NoAccounts("Нет следующего клиента")
-                        
-                    counter_reposts_current_account = 0
-                    logger.info(f"🔄 Переключился на аккаунт +{working_accounts[account_index].phone_number}")
-                    
-                except exc.NoAccounts:
-                    logger.warning("🔚 Закончились доступные аккаунты")
-                    
-                    # Отправляем финальную статистику
-                    processing_time = (datetime.now() - start_time).total_seconds()
-                    await telegram_utils.send_message(
-                        chat_id=settings.admin_chat_id, 
-                        text=f"⏹️ Репостинг остановлен - закончились аккаунты\n"
-                              f"📊 Канал: {channel.url}\n"
-                              f"✅ Успешных репостов: {total_successful_reposts}\n"
-                              f"⏱️ Время работы: {processing_time/60:.1f} мин"
-                    )
-                    return
+        total_successful_reposts = run.successful_reposts
+        if len(run.groups):
+            logger.warning(f"🔚 Закончились доступные аккаунты, не обработано {len(run.groups)} групп")
 
-            # 🚀 Обрабатываем пакет групп параллельно
-            try:
-                batch_successful, processed_groups = await repost_to_group_batch(
-                    groups_batch=group_batch,
-                    channel=channel,
-                    telegram_message_id=telegram_message_id,
-                    telegram_client=telegram_client,
-                    batch_id=batch_idx
-                )
-                
-                counter_reposts_current_account += batch_successful
-                total_successful_reposts += batch_successful
-                
-                batch_time = (datetime.now() - batch_start_time).total_seconds()
-                logger.info(f"📊 Пакет {batch_idx}: {batch_successful} репостов за {batch_time:.1f}с")
-                
-                # 🎯 АДАПТИВНАЯ ПАУЗА: зависит от результатов пакета
-                if batch_idx < len(group_batches):  # Не ждем после последнего пакета
-                    if batch_successful > len(group_batch) * 0.7:  # >70% успеха
-                        adaptive_pause = max(pause_between_reposts // 2, 15)  # Короткая пауза
-                        logger.debug(f"✅ Хорошие результаты, короткая пауза: {adaptive_pause}с")
-                    elif batch_successful > 0:  # Есть успехи
-                        adaptive_pause = pause_between_reposts  # Обычная пауза
-                        logger.debug(f"⚖️ Средние результаты, обычная пауза: {adaptive_pause}с")
-                    else:  # Неудачный пакет
-                        adaptive_pause = pause_between_reposts * 2  # Длинная пауза
-                        logger.debug(f"❌ Плохие результаты, длинная пауза: {adaptive_pause}с")
-                    
-                    logger.info(f"⏱️ Пауза {adaptive_pause}с перед пакетом {batch_idx + 1}")
-                    await asyncio.sleep(adaptive_pause)
-                    
-            except Exception as e:
-                logger.error(f"❌ Критическая ошибка при обработке пакета {batch_idx}: {e}")
-                # При критической ошибке делаем увеличенную паузу
-                error_pause = pause_between_reposts * 3
-                logger.warning(f"⏸️ Пауза {error_pause}с после ошибки")
-                await asyncio.sleep(error_pause)
+            # Отправляем финальную статистику
+            processing_time = (datetime.now() - start_time).total_seconds()
+            await telegram_utils.send_message(
+                chat_id=settings.admin_chat_id, 
+                text=f"⏹️ Репостинг остановлен - закончились аккаунты\n"
+                      f"📊 Канал: {channel.url}\n"
+                      f"✅ Успешных репостов: {total_successful_reposts}\n"
+                      f"⏱️ Время работы: {processing_time/60:.1f} мин"
+            )
+            return
 
         # 📊 Финальная статистика и уведомление
         total_time = (datetime.now() - start_time).total_seconds()
         success_rate = (total_successful_reposts / len(groups) * 100) if groups else 0
         speed = (total_successful_reposts / (total_time / 60)) if total_time > 0 else 0
         
-        logger.success(f"🏁 ЗАВЕРШЕНО: {total_successful_reposts}/{len(groups)} репостов ({success_rate:.1f}%)")
+        logger.success(f"🏁 ЗАВЕРШЕНО: {total_successful_reposts}/{len(groups)} репостов ({success_rate:.1f}%), аккаунтов: {run.accounts_used}")
         logger.info(f"⏱️ Время: {total_time/60:.1f} мин, скорость: {speed:.1f} репостов/мин")
         
         # Отправляем уведомление админу
@@ -421,6 +576,9 @@ async def process_group_reposting_fast(
 
     finally:
         # ОБЯЗАТЕЛЬНО закрываем ВСЕ использованные клиенты
+        all_clients_used = account_source.clients if account_source else []
+        if account_source:
+            await account_source.release_all()  # например, аккаунт проверки стоп-ссылок при раннем выходе
         logger.info(f"🔌 Закрываю {len(all_clients_used)} использованных клиентов...")
         await cleanup_clients(all_clients_used)
         logger.success("✅ Все клиенты корректно закрыты")
@@ -449,13 +607,13 @@ async def new_message_in_channel(telegram_channel_id: int, telegram_message_id:
             )
             return
 
-        # Получаем группы канала
-        groups = await group_db.get_all_groups_by_channel_guid(channel_guid=str(channel.guid))
+        # Получаем группы канала: без карантина и медленного режима, крупные первыми
+        groups, _ = await group_selection.select_groups_for_channel(str(channel.guid))
         if not groups:
-            logger.warning(f"⚠️ У канала {channel.url} нет привязанных групп")
+            logger.warning(f"⚠️ У канала {channel.url} нет доступных групп")
             await telegram_utils.send_message(
                 chat_id=settings.admin_chat_id, 
-                text=f"⚠️ У канала {channel.url} нет привязанных групп для репостинга."
+                text=f"⚠️ У канала {channel.url} нет доступных групп для репостинга (не привязаны или на карантине)."
             )
             return
 
@@ -498,35 +656,184 @@ async def new_message_in_channel(telegram_channel_id: int, telegram_message_id:
             )
         except Exception as notification_error:
             logger.error(f"Не удалось отправить уведомление об ошибке: {notification_error}")
+    finally:
+        await account_scorer.save()
+
+
+class FastRepostServer:
+    """
+    Резидентный воркер быстрого режима: забирает задания из шины и держит движок БД,
+    оценки аккаунтов и залогиненные клиенты между ними.
+    Посты разных каналов обрабатываются параллельно, посты одного канала - по очереди.
+    """
+
+    def __init__(self, max_jobs: int = DEFAULT_MAX_JOBS):
+        self.slots = asyncio.Semaphore(max_jobs)
+        # Задания, дошедшие до начала очереди своего канала. Ждущие за постом того же канала
+        # не считаются: один загруженный канал не останавливает шину для остальных
+        self.max_active = max_jobs * PENDING_JOBS_PER_SLOT
+        self.active = 0
+        self.capacity = asyncio.Condition()
+        self.channel_locks: Dict[int, asyncio.Lock] = {}
+        self.channel_jobs: Dict[int, int] = {}
+        self.jobs: Set[asyncio.Task] = set()
+
+    async def handle_job(self, payload: dict) -> asyncio.Task:
+        # Ждем прямо в обработчике шины: пока активных каналов слишком много, новые задания не забираются
+        async with self.capacity:
+            await self.capacity.wait_for(lambda: self.active < self.max_active)
+        job = asyncio.create_task(self._run_job(payload["channel_id"], payload["message_id"]))
+        self.jobs.add(job)
+        job.add_done_callback(self.jobs.discard)
+        await asyncio.sleep(0)  # задание свободного канала сразу становится активным
+        return job  # шина подтвердит событие, когда задание завершится
+
+    async def _set_active(self, delta: int) -> None:
+        async with self.capacity:
+            self.active += delta
+            self.capacity.notify_all()
+
+    async def _run_job(self, telegram_channel_id: int, telegram_message_id: int) -> None:
+        self.channel_jobs[telegram_channel_id] = self.channel_jobs.get(telegram_channel_id, 0) + 1
+        lock = self.channel_locks.setdefault(telegram_channel_id, asyncio.Lock())
+        try:
+            async with lock:
+                await self._set_active(1)
+                key = fast_channel_lease_key(telegram_channel_id)
+                try:
+                    # Посты канала по очереди и между узлами: задания без ключа забирает любой узел
+                    while not await lease_manager.try_acquire(key):
+                        logger.debug(f"🔒 Канал {telegram_channel_id} обрабатывает другой узел, жду")
+                        await clock.sleep(FAST_CHANNEL_LEASE_RETRY)
+                    try:
+                        # Слот занимается, только когда до задания дошла очередь его канала:
+                        # посты одного канала, ждущие друг друга, не отнимают слоты у других каналов
+                        async with self.slots:
+                            await new_message_in_channel(
+                                telegram_channel_id=telegram_channel_id,
+                                telegram_message_id=telegram_message_id
+                            )
+                    finally:
+                        await lease_manager.release(key)
+                finally:
+                    await self._set_active(-1)
+        except Exception as e:
+            logger.exception(f"💥 Ошибка задания {telegram_channel_id}/{telegram_message_id}: {e}")
+        finally:
+            self.channel_jobs[telegram_channel_id] -= 1
+            if not self.channel_jobs[telegram_channel_id]:
+                del self.channel_jobs[telegram_channel_id]
+                self.channel_locks.pop(telegram_channel_id, None)
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        if not self.jobs:
+            return
+        done, pending = await asyncio.wait(set(self.jobs), timeout=timeout)
+        for job in pending:
+            job.cancel()
+        if pending:
+            logger.warning(f"Прервано {len(pending)} незавершенных заданий")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def serve() -> None:
+    """Резидентный режим: python process_post3.py --serve"""
+    try:
+        max_jobs = await json_settings.async_get_attribute("fast_repost_concurrency")
+    except:
+        max_jobs = DEFAULT_MAX_JOBS
+
+    await account_scorer.load()
+    server = FastRepostServer(max_jobs=max_jobs)
+    # batch_size=1: следующее задание забирается, только когда для него есть место
+    event_bus = bus.EventBus(owner=f"{settings.get_node_id()}:process_post", batch_size=1)
+    event_bus.subscribe(bus.FAST_REPOST, server.handle_job)
+    # Аренды каналов и аккаунтов быстрого режима продлеваются, пока идут долгие задания
+    heartbeat_task = asyncio.create_task(lease_manager.run_heartbeat())
+    logger.info(f"🚀 Воркер быстрого режима запущен: до {max_jobs} заданий параллельно")
+
+    try:
+        await event_bus.run()
+    finally:
+        logger.info("🧹 Остановка воркера быстрого режима...")
+        event_bus.stop()
+        await server.drain(timeout=60.0)
+        heartbeat_task.cancel()
+        await lease_manager.release_all()
+        try:
+            await event_bus.flush()
+        except Exception as e:
+            logger.error(f"Ошибка подтверждения заданий: {e}")
+        await reaction_fanout.close()
+        await job_clients.close()
+        await account_scorer.save()
+
+
+async def enqueue_message(telegram_channel_id: int, telegram_message_id: int) -> None:
+    """Ставит пост в очередь резидентного воркера"""
+    await outbox_db.publish_event(
+        topic=bus.FAST_REPOST,
+        payload={"channel_id": telegram_channel_id, "message_id": telegram_message_id}
+    )
+
+
+async def process_inline(telegram_channel_id: int, telegram_message_id: int) -> None:
+    """Обработка поста в этом процессе, без резидентного воркера"""
+    await account_scorer.load()
+    try:
+        await new_message_in_channel(
+            telegram_channel_id=telegram_channel_id,
+            telegram_message_id=telegram_message_id
+        )
+    finally:
+        # Фоновые реакции должны успеть до выхода процесса
+        await reaction_fanout.close()
+        await job_clients.close()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Быстрый репостинг: резидентный воркер или постановка поста в очередь")
+    parser.add_argument('--serve', action='store_true', help='Run the resident worker that takes jobs from the bus')
+    parser.add_argument('--telegram_message_id', type=int, help='The ID of the message')
+    parser.add_argument('--telegram_channel_id', type=int, help='The ID of the channel')
+    parser.add_argument('--inline', action='store_true', help='Process the message in this process instead of enqueueing it')
+    parser.add_argument('--log_filename', type=str, default='process_post.log', help='The log filename (--inline)')
+
+    args = parser.parse_args(argv)
+    if not args.serve and (args.telegram_message_id is None or args.telegram_channel_id is None):
+        parser.error("--telegram_message_id and --telegram_channel_id are required without --serve")
+    return args
 
 
-# Точка входа для subprocess (сохраняем для обратной совместимости)
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--telegram_message_id', type=int, required=True, help='The ID of the message')
-    parser.add_argument('--telegram_channel_id', type=int, required=True, help='The ID of the channel')
-    parser.add_argument('--log_filename', type=str, required=True, help='The log filename')
+    args = parse_args()
+
+    if args.serve:
+        run_service(serve, "process_post")
+        exit(0)
 
-    args = parser.parse_args()
     telegram_channel_id = args.telegram_channel_id
     telegram_message_id = args.telegram_message_id
 
-    # Настраиваем логирование для subprocess
-    logger.add(
-        f"logs/{args.log_filename.replace('.log', '')}/{telegram_channel_id}-{telegram_message_id}.log", 
-        rotation="1 day", 
-        retention="10 days", 
-        compression="zip"
+    if not args.inline:
+        # Тонкий клиент: задание уходит резидентному воркеру, процесс сразу завершается
+        asyncio.run(enqueue_message(telegram_channel_id, telegram_message_id))
+        logger.info(f"📨 Сообщение {telegram_message_id} из канала {telegram_channel_id} поставлено в очередь")
+        exit(0)
+
+    # Настраиваем логирование для обработки в этом процессе
+    setup_logging(
+        "process_post",
+        f"logs/{args.log_filename.replace('.log', '')}/{telegram_channel_id}-{telegram_message_id}.log",
+        level=settings.log_level,
+        json_logs=settings.log_json
     )
     
     logger.info(f"🚀 БЫСТРАЯ ОБРАБОТКА сообщения ID {telegram_message_id} из канала ID {telegram_channel_id}")
 
     try:
-        asyncio.run(new_message_in_channel(
-            telegram_channel_id=telegram_channel_id, 
-            telegram_message_id=telegram_message_id
-        ))
+        asyncio.run(process_inline(telegram_channel_id, telegram_message_id))
         logger.info("✅ Subprocess обработка завершена успешно")
     except Exception as e:
         logger.exception(f"💥 SUBPROCESS ЗАВЕРШИЛСЯ С ОШИБКОЙ: {e.__class__.__name__}: {e}")
-        exit(1)
\ No newline at end of file
+        exit(1)